@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+End-to-end crawl benchmark against the local mock Instagram server.
+
+Runs the real InstagramSavedPostsScraper.get_saved_posts, with requests to
+www.instagram.com routed to mock_instagram.py, and reports posts per second,
+pages and bytes fetched. Scenarios:
+
+  throughput   Full first download of the feed
+  early-stop   Full download, then new posts are saved and an incremental sync
+               must fetch only them (checks the watermark early stop)
+  resume       A download that fails halfway, continued with resume=True
+               (checks that the checkpoint skips pages already fetched)
+
+iPhone API lookups (used for full-resolution images) and instaloader's random
+per-request sleeps are disabled, since neither is part of the mock.
+
+Usage:
+  python benchmarks/crawl_benchmark.py [throughput|early-stop|resume|all] [--posts 500] [--workers 4]
+      [--async-media] [--latency-ms 50] [--media-latency-ms 20] [--throttle-every 25]
+"""
+
+import contextlib
+import io
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import instaloader
+import instaloader.instaloadercontext
+from requests.adapters import HTTPAdapter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from insta_scraper import SAVED_PAGE_SIZE, InstagramSavedPostsScraper  # noqa: E402
+from mock_instagram import MockInstagram  # noqa: E402
+
+
+INSTAGRAM_URL = "https://www.instagram.com"
+
+
+class _MockAdapter(HTTPAdapter):
+    """Sends requests for www.instagram.com to the mock server instead."""
+
+    def __init__(self, mock_url):
+        super().__init__()
+        self.mock_url = mock_url
+
+    def send(self, request, **kwargs):
+        request.url = self.mock_url + request.url[len(INSTAGRAM_URL):]
+        return super().send(request, **kwargs)
+
+
+def _route_to_mock(mock_url):
+    """Make every instaloader session, including per-query copies, use the mock server."""
+    adapter = _MockAdapter(mock_url)
+    copy_session = instaloader.instaloadercontext.copy_session
+
+    def copy_session_to_mock(session, request_timeout=None):
+        new = copy_session(session, request_timeout)
+        new.mount(INSTAGRAM_URL, adapter)
+        return new
+
+    instaloader.instaloadercontext.copy_session = copy_session_to_mock
+    return adapter
+
+
+def _make_scraper(adapter, args):
+    scraper = InstagramSavedPostsScraper(username="bench", requests_per_minute=args.rate)
+    context = scraper.loader.context
+    context.username = "bench"
+    context.sleep = False
+    context.quiet = not args.verbose
+    context.iphone_support = False
+    context._session.mount(INSTAGRAM_URL, adapter)
+    context._session.cookies.set("ds_user_id", "1")
+    scraper.rate_controller.rate = args.rate
+    scraper.rate_controller.backoff = args.backoff
+    scraper.rate_controller.log_interval = 0
+    return scraper
+
+
+def _crawl(scraper, output_dir, args, resume=False):
+    """Run one crawl; returns (seconds, output)."""
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        scraper.get_saved_posts(output_dir=str(output_dir), workers=args.workers,
+                                async_media=args.async_media, resume=resume)
+    elapsed = time.perf_counter() - start
+    if args.verbose:
+        print(output.getvalue())
+    return elapsed, output.getvalue()
+
+
+def _post_files(output_dir):
+    return sum(1 for p in Path(output_dir).glob("*.json") if not p.name.startswith("."))
+
+
+def _report(name, mock, elapsed, posts, pages_before=0):
+    pages = mock.graphql_requests - pages_before
+    print(f"  {name:<24} {posts:>6} posts in {elapsed:7.2f}s  ({posts / elapsed if elapsed else 0:7.1f} posts/s, "
+          f"{pages} API requests)")
+
+
+def _new_mock(args, posts=None):
+    return MockInstagram(posts=posts or args.posts, page_size=args.page_size, latency_ms=args.latency_ms,
+                         media_latency_ms=args.media_latency_ms, media_kb=args.media_kb,
+                         throttle_every=args.throttle_every, throttle_style=args.throttle_style)
+
+
+def scenario_throughput(args, work_dir):
+    print("\nthroughput")
+    with _new_mock(args) as mock:
+        scraper = _make_scraper(_route_to_mock(mock.url), args)
+        output_dir = work_dir / "throughput"
+        elapsed, _ = _crawl(scraper, output_dir, args)
+        downloaded = _post_files(output_dir)
+        _report("full download", mock, elapsed, downloaded)
+        print(f"  {'media':<24} {mock.bytes_served / 1e6:9.1f} MB served "
+              f"({mock.bytes_served / 1e6 / elapsed:.1f} MB/s), {mock.throttled} throttled responses")
+        return downloaded == args.posts
+
+
+def scenario_early_stop(args, work_dir):
+    print("\nearly-stop")
+    new_posts = 5
+    with _new_mock(args) as mock:
+        adapter = _route_to_mock(mock.url)
+        output_dir = work_dir / "early-stop"
+        _crawl(_make_scraper(adapter, args), output_dir, args)
+
+        mock.prepend_posts(new_posts)
+        requests_before = mock.graphql_requests
+        elapsed, output = _crawl(_make_scraper(adapter, args), output_dir, args)
+        downloaded = _post_files(output_dir) - args.posts
+        _report("incremental sync", mock, elapsed, downloaded, requests_before)
+
+        # New posts plus the confirming watermark posts fit on the first page(s)
+        expected_pages = -(-(new_posts + 2) // args.page_size)
+        pages = mock.graphql_requests - requests_before - mock.throttled
+        ok = downloaded == new_posts and pages <= expected_pages + 1
+        print(f"  {'✓' if ok else '✗'} downloaded {downloaded}/{new_posts} new posts with {pages} page requests "
+              f"(expected {expected_pages})")
+        return ok
+
+
+def scenario_resume(args, work_dir):
+    print("\nresume")
+    with _new_mock(args) as mock:
+        adapter = _route_to_mock(mock.url)
+        output_dir = work_dir / "resume"
+        half = (args.posts // 2 // args.page_size) * args.page_size
+        mock.fail_from_offset = half
+        elapsed, output = _crawl(_make_scraper(adapter, args), output_dir, args)
+        first = _post_files(output_dir)
+        _report("interrupted download", mock, elapsed, first)
+        checkpointed = "Saved crawl checkpoint" in output
+
+        mock.fail_from_offset = None
+        requests_before = mock.graphql_requests
+        elapsed, output = _crawl(_make_scraper(adapter, args), output_dir, args, resume=True)
+        total = _post_files(output_dir)
+        _report("resumed download", mock, elapsed, total - first, requests_before)
+
+        # Thawing refetches the first page once, then continues after the checkpoint
+        remaining_pages = -(-(args.posts - half) // args.page_size) + 1
+        pages = mock.graphql_requests - requests_before - mock.throttled
+        ok = checkpointed and total == args.posts and pages <= remaining_pages + 1
+        print(f"  {'✓' if ok else '✗'} {total}/{args.posts} posts, resumed with {pages} page requests "
+              f"(about {remaining_pages} expected), checkpoint {'written' if checkpointed else 'missing'}")
+        return ok
+
+
+SCENARIOS = {
+    "throughput": scenario_throughput,
+    "early-stop": scenario_early_stop,
+    "resume": scenario_resume,
+}
+
+
+def main():
+    """Run crawl benchmarks from the command line"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the scraper against a mock Instagram")
+    parser.add_argument("scenario", nargs="?", default="all", choices=[*SCENARIOS, "all"])
+    parser.add_argument("--posts", type=int, default=500, help="Saved posts in the mock feed (default: 500)")
+    parser.add_argument("--page-size", type=int, default=SAVED_PAGE_SIZE, help="Posts per page")
+    parser.add_argument("--workers", type=int, default=4, help="Download workers (default: 4)")
+    parser.add_argument("--async-media", action="store_true", help="Use the async media fetcher")
+    parser.add_argument("--latency-ms", type=int, default=50, help="GraphQL response delay (default: 50)")
+    parser.add_argument("--media-latency-ms", type=int, default=20, help="Media response delay (default: 20)")
+    parser.add_argument("--media-kb", type=int, default=64, help="Size of each media file (default: 64)")
+    parser.add_argument("--throttle-every", type=int, default=0, help="Throttle every Nth GraphQL request")
+    parser.add_argument("--throttle-style", choices=("429", "wait"), default="429")
+    parser.add_argument("--rate", type=int, default=6000,
+                        help="Scraper's starting and maximum requests per minute (default: 6000)")
+    parser.add_argument("--backoff", type=float, default=1.0,
+                        help="Scraper's first backoff after a throttle, in seconds (default: 1)")
+    parser.add_argument("--keep", action="store_true", help="Keep the downloaded files")
+    parser.add_argument("--verbose", action="store_true", help="Show the scraper's output")
+    args = parser.parse_args()
+
+    work_dir = Path(tempfile.mkdtemp(prefix="crawl-benchmark-"))
+    names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    try:
+        results = {name: SCENARIOS[name](args, work_dir) for name in names}
+    finally:
+        if args.keep:
+            print(f"\nFiles kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print()
+    for name, ok in results.items():
+        print(f"  {'✓' if ok else '✗'} {name}")
+    sys.exit(0 if all(results.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Generate a synthetic saved_posts/<user>/ archive for benchmarks.
+
+Posts are written the way instaloader saves them: one {base_id}.json per post
+(GraphImage, GraphVideo or GraphSidecar nodes with captions, hashtags,
+locations, tagged users and engagement counts) next to placeholder media,
+{base_id}.jpg/.mp4 or {base_id}_{n}.jpg/.mp4 for carousel children, either
+in the account directory or, with --layout bucketed, in <YYYY>/<MM>/
+subdirectories as insta_scraper.py --layout bucketed arranges them. The
+placeholders are a few bytes with a valid JPEG/MP4 structure (they pass
+media_verify.py), so file counts and directory sizes match a real archive
+without its disk usage. The output
+is deterministic for a given seed.
+
+Usage:
+  python benchmarks/generate_archive.py <base_dir> --posts 10000 [--account bench] [--seed 1] [--layout bucketed]
+"""
+
+import json
+import random
+import string
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+
+# SOI, JFIF header, an 8x8 frame header, a scan header, one byte of scan data, EOI
+JPEG_PLACEHOLDER = (b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+                    b"\xff\xc0\x00\x0b\x08\x00\x08\x00\x08\x01\x01\x11\x00"
+                    b"\xff\xda\x00\x08\x01\x01\x00\x00\x3f\x00" + b"\x00\xff\xd9")
+# ftyp, moov and mdat boxes
+MP4_PLACEHOLDER = (b"\x00\x00\x00\x18ftypisom\x00\x00\x02\x00isomiso2"
+                   b"\x00\x00\x00\x08moov" + b"\x00\x00\x00\x08mdat")
+
+
+def placeholder_media(suffix, size=0):
+    """Placeholder .jpg or .mp4 contents padded to size bytes, keeping the file structure valid."""
+    if suffix == ".mp4":
+        pad = max(0, size - len(MP4_PLACEHOLDER))
+        return MP4_PLACEHOLDER[:-8] + (8 + pad).to_bytes(4, "big") + b"mdat" + b"\0" * pad
+    pad = max(0, size - len(JPEG_PLACEHOLDER))
+    # Zero bytes are valid scan data
+    return JPEG_PLACEHOLDER[:-2] + b"\0" * pad + b"\xff\xd9"
+
+WORDS = ("pasta", "sunset", "recipe", "travel", "coffee", "morning", "mountain", "design", "vintage",
+         "weekend", "garden", "city", "beach", "friends", "homemade", "street", "photo", "light", "café",
+         "autumn", "minimal", "studio", "night", "market", "bread", "ocean", "hiking", "inspiration")
+LOCATIONS = [(str(100000 + i), name, name.lower().replace(" ", "-"))
+             for i, name in enumerate(("Berlin", "Lisbon", "Kyoto", "New York", "Mexico City", "Oslo",
+                                       "Cape Town", "Buenos Aires", "Seoul", "Marseille"))]
+TYPES = ("GraphImage", "GraphVideo", "GraphSidecar")
+TYPE_WEIGHTS = (0.6, 0.15, 0.25)
+CDN_URL = "https://scontent.cdninstagram.com/v/t51.2885-15"
+
+
+def _shortcode(rng):
+    return "".join(rng.choice(string.ascii_letters + string.digits + "-_") for _ in range(11))
+
+
+def _caption(rng):
+    words = rng.choices(WORDS, k=rng.randint(3, 40))
+    tags = [f"#{rng.choice(WORDS)}" for _ in range(rng.randint(0, 8))]
+    return " ".join(words).capitalize() + ".\n\n" + " ".join(tags)
+
+
+def _media_node(rng, typename, url_base, name):
+    width, height = rng.choice(((1080, 1080), (1080, 1350), (1080, 608), (1440, 1800)))
+    node = {
+        "__typename": typename,
+        "id": str(rng.randrange(10 ** 18, 10 ** 19)),
+        "dimensions": {"height": height, "width": width},
+        "display_url": f"{url_base}/{name}.jpg",
+        "is_video": typename == "GraphVideo",
+        "accessibility_caption": f"Photo by someone. May be an image of {rng.choice(WORDS)}.",
+    }
+    if typename == "GraphVideo":
+        node["video_url"] = f"{url_base}/{name}.mp4"
+        node["video_view_count"] = rng.randint(0, 500000)
+    return node
+
+
+def make_post_node(rng, owners, taken, url_base=CDN_URL):
+    """
+    Build one saved post's GraphQL node, as returned in edge_saved_media and
+    saved by instaloader. Media URLs are {url_base}/{shortcode}.jpg/.mp4 and
+    {url_base}/{shortcode}_{n}.jpg/.mp4 for carousel children.
+    """
+    typename = rng.choices(TYPES, TYPE_WEIGHTS)[0]
+    shortcode = _shortcode(rng)
+    node = _media_node(rng, typename, url_base, shortcode)
+    location = rng.choice(LOCATIONS) if rng.random() < 0.3 else None
+    node.update({
+        "shortcode": shortcode,
+        "owner": {"id": str(rng.randrange(10 ** 9)), "username": rng.choice(owners)},
+        "taken_at_timestamp": int(taken.timestamp()),
+        "edge_media_to_caption": {"edges": [{"node": {"text": _caption(rng)}}]},
+        "edge_liked_by": {"count": rng.randint(0, 200000)},
+        "edge_media_preview_like": {"count": rng.randint(0, 200000)},
+        "edge_media_to_comment": {"count": rng.randint(0, 3000)},
+        "edge_media_to_tagged_user": {"edges": [
+            {"node": {"user": {"username": rng.choice(owners), "full_name": "Tagged User"}}}
+            for _ in range(rng.choice((0, 0, 0, 1, 2)))
+        ]},
+        "location": {"id": location[0], "name": location[1], "slug": location[2],
+                     "has_public_page": True} if location else None,
+    })
+    if typename == "GraphSidecar":
+        children = [_media_node(rng, rng.choices(TYPES[:2], (0.85, 0.15))[0], url_base, f"{shortcode}_{idx}")
+                    for idx in range(1, rng.randint(2, 10) + 1)]
+        node["edge_sidecar_to_children"] = {"edges": [{"node": child} for child in children]}
+    return node
+
+
+def make_owners(posts):
+    """Usernames the posts are spread over, about one per 20 posts."""
+    return [f"creator_{i:04d}" for i in range(max(10, posts // 20))]
+
+
+def generate_archive(base_dir, posts, account="bench", seed=1, layout="flat"):
+    """
+    Write `posts` synthetic posts to base_dir/account/, in the "flat" or
+    "bucketed" layout.
+
+    Returns:
+        Path of the account directory
+    """
+    rng = random.Random(seed)
+    account_dir = Path(base_dir) / account
+    account_dir.mkdir(parents=True, exist_ok=True)
+
+    owners = make_owners(posts)
+    taken = datetime(2019, 1, 1, tzinfo=timezone.utc)
+    used = set()
+    for _ in range(posts):
+        taken += timedelta(seconds=rng.randint(60, 2 * 3600))
+        base_id = taken.strftime("%Y-%m-%d_%H-%M-%S_UTC")
+        if base_id in used:
+            continue
+        used.add(base_id)
+
+        post_dir = account_dir / taken.strftime("%Y/%m") if layout == "bucketed" else account_dir
+        post_dir.mkdir(parents=True, exist_ok=True)
+        node = make_post_node(rng, owners, taken)
+        if node["__typename"] == "GraphSidecar":
+            for idx, edge in enumerate(node["edge_sidecar_to_children"]["edges"], 1):
+                (post_dir / f"{base_id}_{idx}.jpg").write_bytes(JPEG_PLACEHOLDER)
+                if edge["node"]["is_video"]:
+                    (post_dir / f"{base_id}_{idx}.mp4").write_bytes(MP4_PLACEHOLDER)
+        else:
+            (post_dir / f"{base_id}.jpg").write_bytes(JPEG_PLACEHOLDER)
+            if node["is_video"]:
+                (post_dir / f"{base_id}.mp4").write_bytes(MP4_PLACEHOLDER)
+
+        with open(post_dir / f"{base_id}.json", 'w', encoding='utf-8') as f:
+            json.dump({"node": node, "instaloader": {"version": "4.13", "node_type": "Post"}}, f,
+                      ensure_ascii=False, indent=4)
+
+    if layout == "bucketed":
+        with open(account_dir / "layout.json", 'w', encoding='utf-8') as f:
+            json.dump({"layout": layout}, f)
+    return account_dir
+
+
+def main():
+    """Generate an archive from the command line"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic saved posts archive")
+    parser.add_argument("base_dir", help="Directory to create the account directory in")
+    parser.add_argument("--posts", type=int, default=1000, help="Number of posts (default: 1000)")
+    parser.add_argument("--account", default="bench", help="Account directory name (default: bench)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed (default: 1)")
+    parser.add_argument("--layout", choices=("flat", "bucketed"), default="flat",
+                        help="Post files in the account directory, or in <YYYY>/<MM>/ subdirectories")
+    args = parser.parse_args()
+
+    account_dir = generate_archive(args.base_dir, args.posts, args.account, args.seed, args.layout)
+    files = sum(1 for path in account_dir.rglob("*") if path.is_file())
+    print(f"✓ Generated {account_dir} ({files} files)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for Instagram's saved-posts GraphQL endpoint and media CDN.
+
+Serves a synthetic saved feed (see generate_archive.make_post_node):
+
+  GET /graphql/query/?query_hash=<saved posts hash>&variables={"id":..,"first":..,"after":..}
+      One page of edge_saved_media, newest first; end_cursor is the offset of the next page.
+  GET /media/<shortcode>[_<n>].jpg|.mp4
+      Fixture media of a fixed size with a valid JPEG/MP4 structure.
+
+Latency, page size and injected throttling (429s, or "Please wait a few
+minutes" failures) are configurable, and the feed can be changed while the
+server runs (prepend_posts) to exercise incremental syncs. Media requests can
+fail with HTTP 503 on a schedule, and the peak number of media requests in
+flight is tracked per Host header, to check transfer retries and per-host
+concurrency caps. crawl_benchmark.py runs the real scraper against it and
+test_media_fetcher.py the async media fetcher.
+
+Usage:
+  python benchmarks/mock_instagram.py [--port 8765] [--posts 1000] [--page-size 12] [--latency-ms 50]
+"""
+
+import json
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from generate_archive import make_owners, make_post_node, placeholder_media  # noqa: E402
+from insta_scraper import SAVED_POSTS_QUERY_HASH  # noqa: E402
+
+
+class MockInstagram:
+    def __init__(self, posts=1000, page_size=12, latency_ms=0, media_latency_ms=0, media_kb=64,
+                 throttle_every=0, throttle_style="429", seed=1, host="127.0.0.1", port=0):
+        """
+        Initialize the mock server
+
+        Args:
+            posts: Number of saved posts in the feed
+            page_size: Posts per GraphQL page
+            latency_ms: Delay before each GraphQL response
+            media_latency_ms: Delay before each media response
+            media_kb: Size of every media file
+            throttle_every: Throttle every Nth GraphQL request (0 to never throttle)
+            throttle_style: "429" for HTTP 429, "wait" for a "Please wait a few minutes" failure
+            seed: Random seed of the synthetic feed
+            host: Interface to listen on
+            port: Port to listen on (0 picks a free one)
+        """
+        self.page_size = page_size
+        self.latency = latency_ms / 1000
+        self.media_latency = media_latency_ms / 1000
+        self.media_size = media_kb * 1024
+        self.throttle_every = throttle_every
+        self.throttle_style = throttle_style
+        # GraphQL pages from this offset on fail with HTTP 500 (None: never), to simulate a network drop
+        self.fail_from_offset = None
+        # Every Nth media request fails with HTTP 503 (0: never)
+        self.media_fail_every = 0
+        # Media requests in flight, and the most seen at once, per Host header
+        self.media_in_flight = {}
+        self.media_peak = {}
+
+        self.graphql_requests = 0
+        self.media_requests = 0
+        self.throttled = 0
+        self.bytes_served = 0
+
+        self._rng = random.Random(seed)
+        self._owners = make_owners(posts)
+        self._taken = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self._lock = threading.Lock()
+        self.feed = []
+
+        handler = type("Handler", (_Handler,), {"mock": self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+        self._thread = None
+        self.prepend_posts(posts)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        """Serve requests on a background thread."""
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self._thread.join()
+
+    def prepend_posts(self, count):
+        """Save `count` new posts, newest first, at the top of the feed."""
+        new_posts = []
+        for _ in range(count):
+            self._taken -= timedelta(seconds=self._rng.randint(60, 2 * 3600))
+            new_posts.append(make_post_node(self._rng, self._owners, self._taken, f"{self.url}/media"))
+        with self._lock:
+            self.feed[:0] = new_posts
+
+    def page(self, after):
+        """One page of edge_saved_media starting at cursor `after`."""
+        offset = int(after) if after else 0
+        with self._lock:
+            edges = [{"node": node} for node in self.feed[offset:offset + self.page_size]]
+            has_next = offset + self.page_size < len(self.feed)
+            count = len(self.feed)
+        return {
+            "data": {"user": {"edge_saved_media": {
+                "count": count,
+                "page_info": {"has_next_page": has_next, "end_cursor": str(offset + self.page_size) if has_next else None},
+                "edges": edges,
+            }}},
+            "status": "ok",
+        }
+
+    def media(self, name):
+        return placeholder_media(".mp4" if name.endswith(".mp4") else ".jpg", self.media_size)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    mock = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json"):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with self.mock._lock:
+            self.mock.bytes_served += len(body)
+
+    def do_GET(self):
+        mock = self.mock
+        url = urlsplit(self.path)
+        if url.path.startswith("/media/"):
+            host = (self.headers.get("Host") or "").rsplit(":", 1)[0]
+            with mock._lock:
+                mock.media_requests += 1
+                fail = mock.media_fail_every and mock.media_requests % mock.media_fail_every == 0
+                mock.media_in_flight[host] = mock.media_in_flight.get(host, 0) + 1
+                mock.media_peak[host] = max(mock.media_peak.get(host, 0), mock.media_in_flight[host])
+            try:
+                time.sleep(mock.media_latency)
+                if fail:
+                    self._send(503, {"message": "mock media failure", "status": "fail"})
+                else:
+                    self._send(200, mock.media(url.path), "video/mp4" if url.path.endswith(".mp4") else "image/jpeg")
+            finally:
+                with mock._lock:
+                    mock.media_in_flight[host] -= 1
+            return
+
+        if url.path.rstrip("/") != "/graphql/query":
+            self._send(404, {"message": f"mock has no {url.path}", "status": "fail"})
+            return
+
+        time.sleep(mock.latency)
+        params = parse_qs(url.query)
+        with mock._lock:
+            mock.graphql_requests += 1
+            throttle = mock.throttle_every and mock.graphql_requests % mock.throttle_every == 0
+            if throttle:
+                mock.throttled += 1
+        if params.get("query_hash", [None])[0] != SAVED_POSTS_QUERY_HASH:
+            self._send(400, {"message": "unknown query", "status": "fail"})
+            return
+        if throttle:
+            body = {"message": "Please wait a few minutes before you try again.", "status": "fail"}
+            self._send(429 if mock.throttle_style == "429" else 200, body)
+            return
+
+        variables = json.loads(params.get("variables", ["{}"])[0])
+        after = variables.get("after")
+        if mock.fail_from_offset is not None and int(after or 0) >= mock.fail_from_offset:
+            self._send(500, {"message": "mock network failure", "status": "fail"})
+            return
+        self._send(200, mock.page(after))
+
+
+def main():
+    """Run the mock server from the command line"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mock Instagram saved-posts API and media CDN")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on (default: 8765)")
+    parser.add_argument("--posts", type=int, default=1000, help="Saved posts in the feed (default: 1000)")
+    parser.add_argument("--page-size", type=int, default=12, help="Posts per page (default: 12)")
+    parser.add_argument("--latency-ms", type=int, default=0, help="Delay per GraphQL response")
+    parser.add_argument("--media-latency-ms", type=int, default=0, help="Delay per media response")
+    parser.add_argument("--media-kb", type=int, default=64, help="Size of each media file (default: 64)")
+    parser.add_argument("--throttle-every", type=int, default=0, help="Throttle every Nth GraphQL request")
+    parser.add_argument("--throttle-style", choices=("429", "wait"), default="429",
+                        help="HTTP 429, or a 'Please wait a few minutes' failure")
+    args = parser.parse_args()
+
+    mock = MockInstagram(posts=args.posts, page_size=args.page_size, latency_ms=args.latency_ms,
+                         media_latency_ms=args.media_latency_ms, media_kb=args.media_kb,
+                         throttle_every=args.throttle_every, throttle_style=args.throttle_style,
+                         port=args.port)
+    print(f"Mock Instagram serving {args.posts} saved posts at {mock.url} (Ctrl-C to stop)")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the indexing and shortcode-ledger hot paths.
+
+Generates (or reuses) synthetic archives of each requested size with
+generate_archive.py and times:
+
+  index_cold            build_index with no posts-index.json or manifest
+  index_warm            build_index again with nothing changed
+  index_incremental     build_index after 1% of the post files changed
+  shortcodes_cold       _load_existing_shortcodes with no ledger
+  shortcodes_warm       _load_existing_shortcodes with an up-to-date ledger
+  update_accounts_list  update_accounts_list over the archive's base directory
+  query_json            load posts-index.json and find one owner's 20 most liked posts
+  query_columnar        the same query against posts-index.col (see index_columnar.py)
+
+Each benchmark runs --repeat times and the best and median wall times are
+reported. Results are appended to benchmarks/results.jsonl together with the
+git commit, so a run can be compared against an earlier commit.
+
+With --layout bucketed the archives keep their post files in <YYYY>/<MM>/
+subdirectories instead of one flat account directory.
+
+Usage:
+  python benchmarks/run_benchmarks.py [--sizes 1000,10000] [--repeat 3] [--layout bucketed] [--compare REV]
+"""
+
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+from generate_archive import generate_archive  # noqa: E402
+from index_columnar import INDEX_COLUMNAR, ColumnarIndex, write_index_columnar  # noqa: E402
+from insta_scraper import INDEX_MANIFEST, NON_POST_FILES, SHORTCODE_LEDGER, InstagramSavedPostsScraper  # noqa: E402
+
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DATA_DIR = BENCH_DIR / "data"
+RESULTS_FILE = BENCH_DIR / "results.jsonl"
+
+# Slower than the compared run by more than this fraction (and by more than
+# REGRESSION_MIN_SECONDS, to ignore noise on tiny timings) counts as a regression
+REGRESSION_THRESHOLD = 0.10
+REGRESSION_MIN_SECONDS = 0.005
+
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=BENCH_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _archive(size, layout="flat"):
+    """Return the account directory of a cached archive of `size` posts, generating it if needed."""
+    base_dir = DATA_DIR / (f"posts-{size}" if layout == "flat" else f"posts-{size}-{layout}")
+    account_dir = base_dir / "bench"
+    marker = base_dir / ".complete"
+    if not marker.exists():
+        print(f"Generating {size} post archive in {base_dir}...")
+        generate_archive(base_dir, size, layout=layout)
+        marker.touch()
+    return account_dir
+
+
+def _time(func, setup=None, repeat=3):
+    """Run setup() then time func(), `repeat` times, with the scraper's output silenced."""
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+    return {"best": round(min(timings), 4), "median": round(statistics.median(timings), 4)}
+
+
+def _remove(*paths):
+    for path in paths:
+        if path.exists():
+            path.unlink()
+
+
+def run_size(size, repeat, workers, layout="flat"):
+    """Run every benchmark against one archive size."""
+    account_dir = _archive(size, layout)
+    scraper = InstagramSavedPostsScraper()
+    index_file = account_dir / "posts-index.json"
+    manifest_file = account_dir / INDEX_MANIFEST
+    ledger_file = account_dir / SHORTCODE_LEDGER
+    post_files = sorted(account_dir / path for name, (path, _) in scraper._scan_account(account_dir).items()
+                        if name.endswith(".json") and name not in NON_POST_FILES)
+
+    def build():
+        scraper.build_index(account_dir, workers=workers)
+
+    def touch_some():
+        # Rewrite 1% of the post files so their size/mtime no longer match the manifest
+        for path in post_files[::100]:
+            path.write_bytes(path.read_bytes())
+
+    results = {
+        "index_cold": _time(build, lambda: _remove(index_file, manifest_file), repeat),
+        "index_warm": _time(build, None, repeat),
+        "index_incremental": _time(build, touch_some, repeat),
+        "shortcodes_cold": _time(lambda: scraper._load_existing_shortcodes(account_dir),
+                                 lambda: _remove(ledger_file), repeat),
+        "shortcodes_warm": _time(lambda: scraper._load_existing_shortcodes(account_dir), None, repeat),
+        "update_accounts_list": _time(lambda: scraper.update_accounts_list(account_dir.parent), None, repeat),
+    }
+
+    columnar_file = account_dir / INDEX_COLUMNAR
+    write_index_columnar(scraper._iter_index(index_file), columnar_file)
+    with open(index_file, encoding="utf-8") as f:
+        owner = json.load(f)[0]["owner"]
+
+    def query_json():
+        with open(index_file, encoding="utf-8") as f:
+            posts = [post for post in json.load(f) if post["owner"] == owner]
+        return sorted(posts, key=lambda post: post["engagement"]["likes"], reverse=True)[:20]
+
+    def query_columnar():
+        with ColumnarIndex(columnar_file) as index:
+            return index.query(sort="likes", limit=20, owner=owner)
+
+    results["query_json"] = _time(query_json, None, repeat)
+    results["query_columnar"] = _time(query_columnar, None, repeat)
+    return results
+
+
+def _compare(record, rev):
+    """
+    Print the change against the latest stored result for git revision rev.
+    Called before record is appended, so it never compares a run with itself.
+    """
+    commit = _git("rev-parse", rev) or rev
+    previous = None
+    if RESULTS_FILE.exists():
+        with open(RESULTS_FILE, 'r', encoding='utf-8') as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry.get("commit") == commit and entry.get("layout", "flat") == record["layout"]:
+                    previous = entry
+    if previous is None:
+        print(f"\nNo stored results for {rev} to compare with")
+        return False
+
+    print(f"\nCompared with {commit[:10]} ({previous['date']}):")
+    regressions = 0
+    for size, benchmarks in record["results"].items():
+        for name, timing in benchmarks.items():
+            old = previous["results"].get(size, {}).get(name)
+            if not old or not old["best"]:
+                continue
+            change = (timing["best"] - old["best"]) / old["best"]
+            flag = ""
+            if change > REGRESSION_THRESHOLD and timing["best"] - old["best"] > REGRESSION_MIN_SECONDS:
+                flag = "  ✗ regression"
+                regressions += 1
+            print(f"  {size:>7} {name:<22} {old['best']:>9.4f}s -> {timing['best']:>9.4f}s  {change:+7.1%}{flag}")
+    return regressions > 0
+
+
+def main():
+    """Run the benchmark suite from the command line"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark index building and shortcode loading")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma-separated archive sizes in posts (default: 1000,10000,100000)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark (default: 3)")
+    parser.add_argument("--index-workers", type=int, default=1,
+                        help="Processes used by build_index (default: 1)")
+    parser.add_argument("--compare", metavar="REV", default=None,
+                        help="Compare with the stored results of this git revision, e.g. HEAD~1")
+    parser.add_argument("--layout", choices=("flat", "bucketed"), default="flat",
+                        help="On-disk layout of the generated archives (default: flat)")
+    parser.add_argument("--no-save", action="store_true", help="Don't append the results to results.jsonl")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    dirty = bool(_git("status", "--porcelain", "--untracked-files=no"))
+    record = {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": dirty,
+        "date": datetime.now().isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "repeat": args.repeat,
+        "indexWorkers": args.index_workers,
+        "layout": args.layout,
+        "results": {},
+    }
+
+    for size in sizes:
+        print(f"\nBenchmarking {size} posts...")
+        results = run_size(size, args.repeat, args.index_workers, args.layout)
+        record["results"][str(size)] = results
+        for name, timing in results.items():
+            print(f"  {name:<22} best {timing['best']:>9.4f}s   median {timing['median']:>9.4f}s")
+
+    regressed = args.compare and _compare(record, args.compare)
+
+    if not args.no_save:
+        with open(RESULTS_FILE, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + "\n")
+        print(f"\n✓ Results appended to {RESULTS_FILE}")
+
+    if regressed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
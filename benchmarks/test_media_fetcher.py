@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+MediaFetcher against the mock media CDN (mock_instagram.py): per-host
+concurrency caps, host_limits overrides, and retries of failed transfers.
+
+Requests to 127.0.0.1 and localhost reach the same mock server but count as
+different hosts, both for the fetcher and for the mock's in-flight tracking.
+
+Usage:
+  python -m pytest benchmarks/test_media_fetcher.py   (or run this file directly; needs aiohttp)
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+import aiohttp
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from media_fetcher import MediaFetcher  # noqa: E402
+from mock_instagram import MockInstagram  # noqa: E402
+
+
+def _jobs(base_url, out_dir, names):
+    return [(f"{base_url}/media/{name}", Path(out_dir) / name, None) for name in names]
+
+
+def test_per_host_caps_and_overrides():
+    with MockInstagram(posts=1, media_latency_ms=150, media_kb=4) as mock, tempfile.TemporaryDirectory() as out:
+        port = mock.server.server_address[1]
+        jobs = (_jobs(f"http://127.0.0.1:{port}", out, [f"a{i}.jpg" for i in range(12)])
+                + _jobs(f"http://localhost:{port}", out, [f"b{i}.jpg" for i in range(6)]))
+        with MediaFetcher(max_per_host=3, host_limits={"localhost": 1}) as fetcher:
+            assert fetcher.download(jobs) == len(jobs)
+            # Existing files are skipped
+            assert fetcher.download(jobs) == 0
+        assert mock.media_peak == {"127.0.0.1": 3, "localhost": 1}
+        assert all(path.stat().st_size == 4 * 1024 for _, path, _ in jobs)
+
+
+def test_failed_transfers_are_retried():
+    with MockInstagram(posts=1, media_kb=4) as mock, tempfile.TemporaryDirectory() as out:
+        mock.media_fail_every = 3
+        jobs = _jobs(mock.url, out, [f"c{i}.jpg" for i in range(10)])
+        with MediaFetcher(max_per_host=2, retries=3, retry_backoff=0.01) as fetcher:
+            assert fetcher.download(jobs) == len(jobs)
+        assert mock.media_requests > len(jobs)
+        assert not list(Path(out).glob("*.part"))
+
+
+def test_gives_up_after_retries():
+    with MockInstagram(posts=1, media_kb=4) as mock, tempfile.TemporaryDirectory() as out:
+        mock.media_fail_every = 1
+        jobs = _jobs(mock.url, out, ["d.jpg"])
+        with MediaFetcher(retries=3, retry_backoff=0.01) as fetcher:
+            try:
+                fetcher.download(jobs)
+            except aiohttp.ClientResponseError as e:
+                assert e.status == 503
+            else:
+                raise AssertionError("download of an always-failing file succeeded")
+        assert mock.media_requests == 3
+        assert not list(Path(out).iterdir())
+
+
+if __name__ == "__main__":
+    for test in (test_per_host_caps_and_overrides, test_failed_transfers_are_retried, test_gives_up_after_retries):
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Manifest-based delta sync of saved_posts to cloud storage.
+
+Instead of listing every remote object like `rclone sync`, a local manifest
+(saved_posts/.sync-manifest.json) remembers the size, mtime and SHA-256 of
+every file already uploaded to or pulled from the target, plus the remote
+object's ETag (the mtime, for a local directory target), so a pull can tell
+which objects changed remotely. Each run uploads only new or
+changed files, concurrently, and deletes remote copies of files removed
+locally. Index files are uploaded after the media they point to and
+accounts.json goes last, so readers never see an index referencing missing
+media.
+
+The manifest is only right while this sync is the one changing the target.
+The web app's delete, merge and auto-clean endpoints remove objects and
+rewrite the account's posts-index.json, so each run first compares the remote
+size of every posts-index.json with the manifest. On a mismatch (or with
+full=True) the manifest is reconciled against a listing of the target, and
+files missing remotely are uploaded again before any index.
+
+Targets (SYNC_TARGET):
+  /path/to/dir or file:///path/to/dir   A local directory (e.g. for testing)
+  s3://bucket/prefix                    S3-compatible storage such as R2 (requires boto3;
+                                        set S3_ENDPOINT_URL and the usual AWS_* credentials)
+"""
+
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+
+
+SYNC_MANIFEST = ".sync-manifest.json"
+
+# Files below this size are uploaded to S3 in one part, so their ETag is the MD5 of the contents
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+
+# Uploaded after everything else, in this order: derived indexes, then the
+# per-account index, then the account list
+DERIVED_INDEX_PREFIXES = ("posts-index/", "posts-facets/", "duplicates.json", "posts-index.db", "posts-index.col")
+INDEX_FILES = ("posts-index.json",)
+ACCOUNTS_FILE = "accounts.json"
+
+
+class LocalTarget:
+    """Sync target backed by a local directory."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def __str__(self):
+        return str(self.root)
+
+    def upload(self, local_path, key):
+        """Upload a file and return the new object's ETag."""
+        dest = self.root / key
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_name(dest.name + ".part")
+        shutil.copy2(local_path, tmp)
+        os.replace(tmp, dest)
+        return str(dest.stat().st_mtime_ns)
+
+    def local_etag(self, path):
+        """The ETag a local file would have as an object here (copies keep their mtime)."""
+        return str(path.stat().st_mtime_ns)
+
+    def download(self, key, local_path):
+        local_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = local_path.with_name(local_path.name + ".part")
+        shutil.copy2(self.root / key, tmp)
+        os.replace(tmp, local_path)
+
+    def delete(self, key):
+        try:
+            (self.root / key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def size(self, key):
+        """Size of the object at key, or None if there is none."""
+        try:
+            return (self.root / key).stat().st_size
+        except FileNotFoundError:
+            return None
+
+    def list(self):
+        """Yield (key, size, etag) for every object in the target."""
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = Path(dirpath) / name
+                stat = path.stat()
+                yield path.relative_to(self.root).as_posix(), stat.st_size, str(stat.st_mtime_ns)
+
+
+class S3Target:
+    """Sync target backed by an S3-compatible bucket (requires boto3)."""
+
+    def __init__(self, bucket, prefix=""):
+        import boto3
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.client = boto3.client("s3", endpoint_url=os.environ.get("S3_ENDPOINT_URL") or None)
+
+    def __str__(self):
+        return f"s3://{self.bucket}/{self.prefix}"
+
+    def upload(self, local_path, key):
+        """Upload a file and return the new object's ETag."""
+        from boto3.s3.transfer import TransferConfig
+
+        content_type = mimetypes.guess_type(str(local_path))[0] or "application/octet-stream"
+        self.client.upload_file(str(local_path), self.bucket, self.prefix + key,
+                                ExtraArgs={"ContentType": content_type},
+                                Config=TransferConfig(multipart_threshold=MULTIPART_THRESHOLD))
+        etag = self.local_etag(local_path)
+        if etag is None:
+            etag = self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)["ETag"].strip('"')
+        return etag
+
+    def local_etag(self, path):
+        """The ETag a local file would have as an object here, or None if it would be uploaded in parts."""
+        if Path(path).stat().st_size >= MULTIPART_THRESHOLD:
+            return None
+        digest = hashlib.md5()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def download(self, key, local_path):
+        local_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = local_path.with_name(local_path.name + ".part")
+        self.client.download_file(self.bucket, self.prefix + key, str(tmp))
+        os.replace(tmp, local_path)
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+    def size(self, key):
+        """Size of the object at key, or None if there is none."""
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)["ContentLength"]
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def list(self):
+        """Yield (key, size, etag) for every object under the prefix."""
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for obj in page.get("Contents", []):
+                yield obj["Key"][len(self.prefix):], obj["Size"], obj["ETag"].strip('"')
+
+
+def open_target(spec):
+    """Create a sync target from a SYNC_TARGET string."""
+    parts = urlsplit(spec)
+    if parts.scheme == "s3":
+        return S3Target(parts.netloc, parts.path)
+    if parts.scheme == "file":
+        return LocalTarget(parts.path)
+    return LocalTarget(spec)
+
+
+def hash_file(path):
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _sync_phase(key):
+    """Upload phase of a file: 0 media/posts, 1 derived indexes, 2 posts-index.json, 3 accounts.json."""
+    name = key.rsplit("/", 1)[-1]
+    if key == ACCOUNTS_FILE:
+        return 3
+    if name in INDEX_FILES:
+        return 2
+    account_relative = key.split("/", 1)[-1]
+    if account_relative.startswith(DERIVED_INDEX_PREFIXES):
+        return 1
+    return 0
+
+
+def _local_files(local_dir):
+    """Yield (key, path) for every syncable file; dotfiles are local caches and stay local."""
+    for dirpath, dirnames, filenames in os.walk(local_dir):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for name in sorted(filenames):
+            if name.startswith(".") or name.endswith((".tmp", ".part")):
+                continue
+            path = Path(dirpath) / name
+            yield path.relative_to(local_dir).as_posix(), path
+
+
+def _load_manifest(manifest_file, target):
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    # A manifest for another target says nothing about what this one holds
+    return manifest.get("files", {}) if manifest.get("target") == str(target) else {}
+
+
+def _save_manifest(manifest_file, target, files):
+    tmp = manifest_file.with_name(manifest_file.name + ".tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({"target": str(target), "files": files}, f)
+    os.replace(tmp, manifest_file)
+
+
+def _remote_changed(target, uploaded_files):
+    """Whether a posts-index.json on the target differs in size from the one last uploaded."""
+    for key, record in uploaded_files.items():
+        if key.rsplit("/", 1)[-1] in INDEX_FILES and target.size(key) != record["size"]:
+            return True
+    return False
+
+
+def _reconcile(target, uploaded_files):
+    """Drop manifest records of files that are missing from the target or differ there."""
+    remote = {key: (size, etag) for key, size, etag in target.list()}
+
+    def unchanged(key, record):
+        size, etag = remote.get(key, (None, None))
+        return size == record["size"] and record.get("etag", etag) == etag
+
+    return {key: record for key, record in uploaded_files.items() if unchanged(key, record)}
+
+
+def delta_sync(local_dir, target, transfers=8, full=False):
+    """
+    Upload new and changed files under local_dir to target and delete remote
+    copies of removed files, using the local manifest to skip unchanged files.
+
+    Args:
+        local_dir: Local saved_posts directory
+        target: Sync target (see open_target)
+        transfers: Concurrent uploads
+        full: If True, reconcile the manifest against a listing of the target
+            even if no remote change was detected
+
+    Returns:
+        (uploaded, deleted, failed) counts
+    """
+    local_dir = Path(local_dir)
+    manifest_file = local_dir / SYNC_MANIFEST
+    uploaded_files = _load_manifest(manifest_file, target)
+    if uploaded_files and (full or _remote_changed(target, uploaded_files)):
+        if not full:
+            print("  The target changed outside this sync (e.g. posts deleted in the web app), "
+                  "reconciling with a full listing")
+        reconciled = _reconcile(target, uploaded_files)
+        if len(reconciled) < len(uploaded_files):
+            print(f"  {len(uploaded_files) - len(reconciled)} files missing or changed remotely, uploading them again")
+        uploaded_files = reconciled
+
+    phases = ([], [], [], [])
+    current = set()
+    for key, path in _local_files(local_dir):
+        stat = path.stat()
+        record = uploaded_files.get(key)
+        current.add(key)
+        if record and record["size"] == stat.st_size and record["mtime"] == stat.st_mtime_ns:
+            continue
+        phases[_sync_phase(key)].append((key, path, stat))
+
+    uploaded = 0
+    failed = 0
+
+    def upload(job):
+        key, path, stat = job
+        digest = hash_file(path)
+        record = uploaded_files.get(key)
+        if not (record and record["size"] == stat.st_size and record["sha256"] == digest):
+            etag = target.upload(path, key)
+            changed = True
+        else:
+            etag = record.get("etag")
+            changed = False  # touched but identical: just refresh the manifest
+        record = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "sha256": digest}
+        if etag is not None:
+            record["etag"] = etag
+        return key, record, changed
+
+    with ThreadPoolExecutor(max_workers=transfers) as pool:
+        for jobs in phases:
+            futures = [pool.submit(upload, job) for job in jobs]
+            for future in futures:
+                try:
+                    key, record, changed = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"  ✗ Upload failed: {e}")
+                    continue
+                uploaded_files[key] = record
+                uploaded += changed
+            # Checkpoint after each phase so an interrupted run keeps its progress
+            _save_manifest(manifest_file, target, uploaded_files)
+            if failed:
+                # Don't publish indexes that may point at media which failed to upload
+                print("  Stopping before index upload because of failed transfers")
+                return uploaded, 0, failed
+
+    deleted = 0
+    for key in sorted(set(uploaded_files) - current):
+        try:
+            target.delete(key)
+        except Exception as e:
+            print(f"  ✗ Delete failed for {key}: {e}")
+            continue
+        del uploaded_files[key]
+        deleted += 1
+    _save_manifest(manifest_file, target, uploaded_files)
+
+    return uploaded, deleted, failed
+
+
+def _record(path, etag):
+    stat = path.stat()
+    return {"size": stat.st_size, "mtime": stat.st_mtime_ns, "sha256": hash_file(path), "etag": etag}
+
+
+def delta_pull(local_dir, target, transfers=8):
+    """
+    Download objects from target that are missing locally or differ from the
+    local copy, and record them in the sync manifest so the next delta_sync
+    doesn't upload them back.
+
+    An object is skipped when the manifest shows neither it nor the local file
+    changed since the last sync or pull (same ETag, size and mtime), or when
+    the local file has the object's ETag.
+
+    Returns:
+        (downloaded, failed) counts
+    """
+    local_dir = Path(local_dir)
+    manifest_file = local_dir / SYNC_MANIFEST
+    files = _load_manifest(manifest_file, target)
+    jobs = []
+    for key, size, etag in target.list():
+        if key.rsplit("/", 1)[-1].startswith(".") or key.endswith(".part"):
+            continue
+        path = local_dir / key
+        if path.exists():
+            stat = path.stat()
+            record = files.get(key)
+            if (record and record.get("etag") == etag and record["size"] == stat.st_size == size
+                    and record["mtime"] == stat.st_mtime_ns):
+                continue
+            if stat.st_size == size and target.local_etag(path) == etag:
+                files[key] = _record(path, etag)  # already identical, just not in the manifest yet
+                continue
+        jobs.append((key, path, etag))
+
+    downloaded = 0
+    failed = 0
+
+    def download(job):
+        key, path, etag = job
+        target.download(key, path)
+        return key, _record(path, etag)
+
+    # Same ordering as uploads, so a half-finished pull never has an index ahead of its media
+    with ThreadPoolExecutor(max_workers=transfers) as pool:
+        for phase in range(4):
+            futures = [pool.submit(download, job) for job in jobs if _sync_phase(job[0]) == phase]
+            for future in futures:
+                try:
+                    key, record = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"  ✗ Download failed: {e}")
+                    continue
+                files[key] = record
+                downloaded += 1
+            _save_manifest(manifest_file, target, files)
+    return downloaded, failed
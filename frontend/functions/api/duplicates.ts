@@ -1,4 +1,4 @@
-// GET /api/duplicates — detect duplicate posts using the index
+// GET /api/duplicates — serve precomputed duplicates.json, or detect duplicates using the index
 interface Env {
   R2_BUCKET: R2Bucket;
 }
@@ -15,12 +15,27 @@ export const onRequestGet: PagesFunction<Env> = async (context) => {
 
   const bucket = context.env.R2_BUCKET;
 
-  const indexObj = await bucket.get(`${account}/posts-index.json`);
+  const [indexObj, duplicatesObj] = await Promise.all([
+    bucket.get(`${account}/posts-index.json`),
+    bucket.get(`${account}/duplicates.json`),
+  ]);
   if (!indexObj) {
     return Response.json([], { headers: corsHeaders() });
   }
 
   const posts = await indexObj.json<any[]>();
+
+  // Fast path: serve matches precomputed by the crawler's build_duplicates,
+  // skipping pairs where a post has been deleted since the file was built.
+  // Rebuilding the index deletes duplicates.json unless build_duplicates runs
+  // again, and the sync removes it here too, so a stale file isn't served.
+  if (duplicatesObj) {
+    const precomputed = await duplicatesObj.json<{ matches: any[] }>();
+    const ids = new Set(posts.map((p: any) => p.id));
+    const matches = precomputed.matches.filter((m: any) => m.postIds.every((id: string) => ids.has(id)));
+    return Response.json(matches, { headers: corsHeaders() });
+  }
+
   const duplicates = detectDuplicates(posts);
   return Response.json(duplicates, { headers: corsHeaders() });
 };
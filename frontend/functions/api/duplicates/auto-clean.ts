@@ -19,6 +19,29 @@ async function writeMetadata(bucket: R2Bucket, account: string, metadata: any) {
   });
 }
 
+// Layout recorded by insta_scraper.py --layout ("flat" or "bucketed")
+async function readLayout(bucket: R2Bucket, account: string): Promise<string> {
+  const obj = await bucket.get(`${account}/layout.json`);
+  if (!obj) return "flat";
+  try {
+    return (await obj.json<{ layout?: string }>()).layout || "flat";
+  } catch {
+    return "flat";
+  }
+}
+
+// Key prefix of a post's files: "YYYY/MM/" in the bucketed layout, "" in the
+// flat one. Taken from the index entry's media paths when it has any, so it
+// matches where the files were actually synced
+function postPrefix(id: string, post: any, layout: string): string {
+  const mediaPath = post
+    ? [post.displayUrl, post.videoUrl, ...(post.carouselItems || []).map((item: any) => item.displayUrl)].find(Boolean)
+    : "";
+  if (mediaPath) return mediaPath.slice(0, mediaPath.lastIndexOf("/") + 1);
+  const match = id.match(/^(\d{4})-(\d{2})-\d{2}_/);
+  return layout === "bucketed" && match ? `${match[1]}/${match[2]}/` : "";
+}
+
 export const onRequestPost: PagesFunction<Env> = async (context) => {
   const account = getAccount(context.request);
   if (!account) {
@@ -34,13 +57,15 @@ export const onRequestPost: PagesFunction<Env> = async (context) => {
 
   const posts = await indexObj.json<any[]>();
   const exactDuplicates = detectExactDuplicates(posts);
+  const postsById = new Map<string, any>(posts.map((p: any) => [p.id, p] as [string, any]));
+  const layout = await readLayout(bucket, account);
   const deletedIds: string[] = [];
 
   for (const dup of exactDuplicates) {
     const idToDelete = dup.postIds[1];
     if (deletedIds.includes(idToDelete)) continue;
 
-    await deletePostFiles(bucket, account, idToDelete);
+    await deletePostFiles(bucket, account, idToDelete, postPrefix(idToDelete, postsById.get(idToDelete), layout));
     deletedIds.push(idToDelete);
   }
 
@@ -81,14 +106,14 @@ function corsHeaders(): HeadersInit {
 
 // --- helpers ---
 
-async function deletePostFiles(bucket: R2Bucket, account: string, id: string) {
+async function deletePostFiles(bucket: R2Bucket, account: string, id: string, prefix: string) {
   const keysToDelete: string[] = [];
   for (const ext of [".json", ".jpg", ".mp4"]) {
-    keysToDelete.push(`${account}/${id}${ext}`);
+    keysToDelete.push(`${account}/${prefix}${id}${ext}`);
   }
   for (let i = 1; i <= 20; i++) {
-    keysToDelete.push(`${account}/${id}_${i}.jpg`);
-    keysToDelete.push(`${account}/${id}_${i}.mp4`);
+    keysToDelete.push(`${account}/${prefix}${id}_${i}.jpg`);
+    keysToDelete.push(`${account}/${prefix}${id}_${i}.mp4`);
   }
   await Promise.all(keysToDelete.map((key) => bucket.delete(key)));
 }
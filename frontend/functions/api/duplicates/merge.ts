@@ -19,6 +19,29 @@ async function writeMetadata(bucket: R2Bucket, account: string, metadata: any) {
   });
 }
 
+// Layout recorded by insta_scraper.py --layout ("flat" or "bucketed")
+async function readLayout(bucket: R2Bucket, account: string): Promise<string> {
+  const obj = await bucket.get(`${account}/layout.json`);
+  if (!obj) return "flat";
+  try {
+    return (await obj.json<{ layout?: string }>()).layout || "flat";
+  } catch {
+    return "flat";
+  }
+}
+
+// Key prefix of a post's files: "YYYY/MM/" in the bucketed layout, "" in the
+// flat one. Taken from the index entry's media paths when it has any, so it
+// matches where the files were actually synced
+function postPrefix(id: string, post: any, layout: string): string {
+  const mediaPath = post
+    ? [post.displayUrl, post.videoUrl, ...(post.carouselItems || []).map((item: any) => item.displayUrl)].find(Boolean)
+    : "";
+  if (mediaPath) return mediaPath.slice(0, mediaPath.lastIndexOf("/") + 1);
+  const match = id.match(/^(\d{4})-(\d{2})-\d{2}_/);
+  return layout === "bucketed" && match ? `${match[1]}/${match[2]}/` : "";
+}
+
 export const onRequestPost: PagesFunction<Env> = async (context) => {
   const account = getAccount(context.request);
   if (!account) {
@@ -47,14 +70,18 @@ export const onRequestPost: PagesFunction<Env> = async (context) => {
 
   metadata.posts[keepId] = { categories: mergedCategories, notes: mergedNotes };
 
+  const indexObj = await bucket.get(`${account}/posts-index.json`);
+  const posts = indexObj ? await indexObj.json<any[]>() : null;
+  const prefix = postPrefix(deleteId, posts?.find((p: any) => p.id === deleteId), await readLayout(bucket, account));
+
   // Delete the duplicate post's files from R2
   const keysToDelete: string[] = [];
   for (const ext of [".json", ".jpg", ".mp4"]) {
-    keysToDelete.push(`${account}/${deleteId}${ext}`);
+    keysToDelete.push(`${account}/${prefix}${deleteId}${ext}`);
   }
   for (let i = 1; i <= 20; i++) {
-    keysToDelete.push(`${account}/${deleteId}_${i}.jpg`);
-    keysToDelete.push(`${account}/${deleteId}_${i}.mp4`);
+    keysToDelete.push(`${account}/${prefix}${deleteId}_${i}.jpg`);
+    keysToDelete.push(`${account}/${prefix}${deleteId}_${i}.mp4`);
   }
   await Promise.all(keysToDelete.map((key) => bucket.delete(key)));
 
@@ -62,9 +89,7 @@ export const onRequestPost: PagesFunction<Env> = async (context) => {
   await writeMetadata(bucket, account, metadata);
 
   // Remove deleted post from index
-  const indexObj = await bucket.get(`${account}/posts-index.json`);
-  if (indexObj) {
-    const posts = await indexObj.json<any[]>();
+  if (posts) {
     const filtered = posts.filter((p: any) => p.id !== deleteId);
     await bucket.put(`${account}/posts-index.json`, JSON.stringify(filtered), {
       httpMetadata: { contentType: "application/json" },
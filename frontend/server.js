@@ -48,6 +48,39 @@ function writeMetadata(account, metadata) {
   }
 }
 
+// Subdirectory holding a post's files: '' in the flat layout, 'YYYY/MM/' in the
+// crawler's bucketed layout (see --layout in insta_scraper.py)
+function postSubdir(postsDir, id) {
+  const match = id.match(/^(\d{4})-(\d{2})-\d{2}_/);
+  if (!match || fs.existsSync(path.join(postsDir, `${id}.json`))) return '';
+  return `${match[1]}/${match[2]}/`;
+}
+
+// Post JSON files are named after the post's UTC time; everything else in an
+// account directory (metadata.json, the indexes, the crawler's caches and
+// state files) is not a post
+const POST_FILE_RE = /^\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}_UTC\.json$/;
+
+// Post JSON files in an account directory, as paths relative to it: flat
+// names plus 'YYYY/MM/' ones from the bucketed layout
+function listPostFiles(postsDir) {
+  const files = [];
+  for (const entry of fs.readdirSync(postsDir, { withFileTypes: true })) {
+    if (entry.isFile() && POST_FILE_RE.test(entry.name)) {
+      files.push(entry.name);
+    } else if (entry.isDirectory() && /^\d{4}$/.test(entry.name)) {
+      for (const month of fs.readdirSync(path.join(postsDir, entry.name), { withFileTypes: true })) {
+        if (!month.isDirectory() || !/^\d{2}$/.test(month.name)) continue;
+        const bucket = `${entry.name}/${month.name}`;
+        for (const name of fs.readdirSync(path.join(postsDir, bucket))) {
+          if (POST_FILE_RE.test(name)) files.push(`${bucket}/${name}`);
+        }
+      }
+    }
+  }
+  return files;
+}
+
 // Serve images/videos from saved_posts directory (subdirs resolve naturally)
 app.use('/media', express.static(SAVED_POSTS_BASE));
 
@@ -110,8 +143,7 @@ app.get('/api/posts', (req, res) => {
 
     // Slow path: scan all JSON files (no index yet)
     if (!fs.existsSync(postsDir)) return res.json([]);
-    const files = fs.readdirSync(postsDir);
-    const jsonFiles = files.filter(file => file.endsWith('.json') && file !== 'metadata.json' && file !== 'posts-index.json');
+    const jsonFiles = listPostFiles(postsDir);
     const metadata = readMetadata(account);
 
     const posts = jsonFiles.map(file => {
@@ -119,11 +151,12 @@ app.get('/api/posts', (req, res) => {
       const content = fs.readFileSync(filePath, 'utf-8');
       const postData = JSON.parse(content);
 
-      const baseId = file.replace('.json', '');
+      const baseId = path.basename(file, '.json');
+      const subdir = file.slice(0, file.length - path.basename(file).length);
 
       // Check if local media files exist
-      const jpgPath = path.join(postsDir, `${baseId}.jpg`);
-      const mp4Path = path.join(postsDir, `${baseId}.mp4`);
+      const jpgPath = path.join(postsDir, `${subdir}${baseId}.jpg`);
+      const mp4Path = path.join(postsDir, `${subdir}${baseId}.mp4`);
       const hasLocalImage = fs.existsSync(jpgPath);
       const hasLocalVideo = fs.existsSync(mp4Path);
 
@@ -147,16 +180,16 @@ app.get('/api/posts', (req, res) => {
           const itemIsVideo = itemNode.__typename === 'GraphVideo';
 
           // Check for local carousel media files
-          const carouselJpgPath = path.join(postsDir, `${baseId}_${index + 1}.jpg`);
-          const carouselMp4Path = path.join(postsDir, `${baseId}_${index + 1}.mp4`);
+          const carouselJpgPath = path.join(postsDir, `${subdir}${baseId}_${index + 1}.jpg`);
+          const carouselMp4Path = path.join(postsDir, `${subdir}${baseId}_${index + 1}.mp4`);
           const hasCarouselImage = fs.existsSync(carouselJpgPath);
           const hasCarouselVideo = fs.existsSync(carouselMp4Path);
 
           carouselItems.push({
             id: `${baseId}_${index + 1}`,
-            displayUrl: hasCarouselImage ? `/media/${account}/${baseId}_${index + 1}.jpg` : '',
+            displayUrl: hasCarouselImage ? `/media/${account}/${subdir}${baseId}_${index + 1}.jpg` : '',
             isVideo: itemIsVideo,
-            videoUrl: hasCarouselVideo ? `/media/${account}/${baseId}_${index + 1}.mp4` : '',
+            videoUrl: hasCarouselVideo ? `/media/${account}/${subdir}${baseId}_${index + 1}.mp4` : '',
             altText: itemNode.accessibility_caption || '',
             dimensions: itemNode.dimensions || { width: 0, height: 0 },
             taggedUsers: extractTaggedUsers(itemNode.edge_media_to_tagged_user)
@@ -166,14 +199,14 @@ app.get('/api/posts', (req, res) => {
 
       return {
         id: baseId,
-        filename: file,
-        timestamp: file.split('_UTC')[0],
+        filename: path.basename(file),
+        timestamp: baseId.split('_UTC')[0],
         data: postData,
         caption: node?.edge_media_to_caption?.edges[0]?.node?.text || '',
         postUrl,
-        displayUrl: hasLocalImage ? `/media/${account}/${baseId}.jpg` : '',
+        displayUrl: hasLocalImage ? `/media/${account}/${subdir}${baseId}.jpg` : '',
         isVideo,
-        videoUrl: hasLocalVideo ? `/media/${account}/${baseId}.mp4` : '',
+        videoUrl: hasLocalVideo ? `/media/${account}/${subdir}${baseId}.mp4` : '',
         owner: node?.owner?.username || 'unknown',
         location: node?.location?.name || null,
         hashtags: extractHashtags(node?.edge_media_to_caption?.edges[0]?.node?.text || ''),
@@ -209,7 +242,8 @@ app.get('/api/posts/:id', (req, res) => {
 
   const { id } = req.params;
   const postsDir = getAccountDir(account);
-  const filePath = path.join(postsDir, `${id}.json`);
+  const subdir = postSubdir(postsDir, id);
+  const filePath = path.join(postsDir, subdir, `${id}.json`);
 
   try {
     if (!fs.existsSync(filePath)) {
@@ -228,8 +262,8 @@ app.get('/api/posts/:id', (req, res) => {
     const baseId = id;
 
     // Check if image or video exists
-    const jpgPath = path.join(postsDir, `${baseId}.jpg`);
-    const mp4Path = path.join(postsDir, `${baseId}.mp4`);
+    const jpgPath = path.join(postsDir, subdir, `${baseId}.jpg`);
+    const mp4Path = path.join(postsDir, subdir, `${baseId}.mp4`);
     const hasImage = fs.existsSync(jpgPath);
     const hasVideo = fs.existsSync(mp4Path);
 
@@ -244,16 +278,16 @@ app.get('/api/posts/:id', (req, res) => {
       node.edge_sidecar_to_children.edges.forEach((edge, index) => {
         const itemNode = edge.node;
         const itemIsVideo = itemNode.__typename === 'GraphVideo';
-        const carouselJpgPath = path.join(postsDir, `${baseId}_${index + 1}.jpg`);
-        const carouselMp4Path = path.join(postsDir, `${baseId}_${index + 1}.mp4`);
+        const carouselJpgPath = path.join(postsDir, subdir, `${baseId}_${index + 1}.jpg`);
+        const carouselMp4Path = path.join(postsDir, subdir, `${baseId}_${index + 1}.mp4`);
         const hasCarouselImage = fs.existsSync(carouselJpgPath);
         const hasCarouselVideo = fs.existsSync(carouselMp4Path);
 
         carouselItems.push({
           id: `${baseId}_${index + 1}`,
-          displayUrl: hasCarouselImage ? `/media/${account}/${baseId}_${index + 1}.jpg` : '',
+          displayUrl: hasCarouselImage ? `/media/${account}/${subdir}${baseId}_${index + 1}.jpg` : '',
           isVideo: itemIsVideo,
-          videoUrl: hasCarouselVideo ? `/media/${account}/${baseId}_${index + 1}.mp4` : '',
+          videoUrl: hasCarouselVideo ? `/media/${account}/${subdir}${baseId}_${index + 1}.mp4` : '',
           altText: itemNode.accessibility_caption || '',
           dimensions: itemNode.dimensions || { width: 0, height: 0 },
           taggedUsers: extractTaggedUsers(itemNode.edge_media_to_tagged_user)
@@ -268,9 +302,9 @@ app.get('/api/posts/:id', (req, res) => {
       data: postData,
       caption,
       postUrl: `https://www.instagram.com/p/${node.shortcode}/`,
-      displayUrl: hasImage ? `/media/${account}/${baseId}.jpg` : '',
+      displayUrl: hasImage ? `/media/${account}/${subdir}${baseId}.jpg` : '',
       isVideo: node.__typename === 'GraphVideo',
-      videoUrl: hasVideo ? `/media/${account}/${baseId}.mp4` : '',
+      videoUrl: hasVideo ? `/media/${account}/${subdir}${baseId}.mp4` : '',
       owner: node.owner?.username || 'unknown',
       location: node.location?.name || null,
       hashtags,
@@ -377,28 +411,29 @@ app.delete('/api/posts/:id', (req, res) => {
   try {
     const { id } = req.params;
     const postsDir = getAccountDir(account);
+    const postDir = path.join(postsDir, postSubdir(postsDir, id));
 
     // Delete JSON file
-    const jsonPath = path.join(postsDir, `${id}.json`);
+    const jsonPath = path.join(postDir, `${id}.json`);
     if (fs.existsSync(jsonPath)) {
       fs.unlinkSync(jsonPath);
     }
 
     // Delete main image/video files
-    const jpgPath = path.join(postsDir, `${id}.jpg`);
+    const jpgPath = path.join(postDir, `${id}.jpg`);
     if (fs.existsSync(jpgPath)) {
       fs.unlinkSync(jpgPath);
     }
 
-    const mp4Path = path.join(postsDir, `${id}.mp4`);
+    const mp4Path = path.join(postDir, `${id}.mp4`);
     if (fs.existsSync(mp4Path)) {
       fs.unlinkSync(mp4Path);
     }
 
     // Delete carousel media files (up to 20 items should be enough)
     for (let i = 1; i <= 20; i++) {
-      const carouselJpg = path.join(postsDir, `${id}_${i}.jpg`);
-      const carouselMp4 = path.join(postsDir, `${id}_${i}.mp4`);
+      const carouselJpg = path.join(postDir, `${id}_${i}.jpg`);
+      const carouselMp4 = path.join(postDir, `${id}_${i}.mp4`);
 
       if (fs.existsSync(carouselJpg)) {
         fs.unlinkSync(carouselJpg);
@@ -441,7 +476,8 @@ app.get('/api/posts/:id/suggest-categories', (req, res) => {
 
   try {
     const { id } = req.params;
-    const filePath = path.join(getAccountDir(account), `${id}.json`);
+    const postsDir = getAccountDir(account);
+    const filePath = path.join(postsDir, postSubdir(postsDir, id), `${id}.json`);
 
     if (!fs.existsSync(filePath)) {
       return res.status(404).json({ error: 'Post not found' });
@@ -484,20 +520,31 @@ app.get('/api/duplicates', (req, res) => {
   try {
     const postsDir = getAccountDir(account);
     if (!fs.existsSync(postsDir)) return res.json([]);
-    const files = fs.readdirSync(postsDir);
-    const jsonFiles = files.filter(file => file.endsWith('.json') && file !== 'metadata.json' && file !== 'posts-index.json');
+
+    // Fast path: serve matches precomputed by the crawler's build_duplicates,
+    // unless the index was rebuilt after them and they miss the new posts
+    const duplicatesPath = path.join(postsDir, 'duplicates.json');
+    const indexPath = path.join(postsDir, 'posts-index.json');
+    if (fs.existsSync(duplicatesPath) &&
+        !(fs.existsSync(indexPath) && fs.statSync(indexPath).mtimeMs > fs.statSync(duplicatesPath).mtimeMs)) {
+      const { matches } = JSON.parse(fs.readFileSync(duplicatesPath, 'utf-8'));
+      // Skip pairs where a post has been deleted since the file was built
+      return res.json(matches.filter(m => m.postIds.every(id => fs.existsSync(path.join(postsDir, postSubdir(postsDir, id), `${id}.json`)))));
+    }
+
+    const jsonFiles = listPostFiles(postsDir);
 
     const posts = jsonFiles.map(file => {
       const filePath = path.join(postsDir, file);
       const content = fs.readFileSync(filePath, 'utf-8');
       const postData = JSON.parse(content);
-      const baseId = file.replace('.json', '');
+      const baseId = path.basename(file, '.json');
 
       return {
         id: baseId,
         owner: postData.node?.owner?.username || '',
         caption: postData.node?.edge_media_to_caption?.edges[0]?.node?.text || '',
-        timestamp: file.split('_UTC')[0]
+        timestamp: baseId.split('_UTC')[0]
       };
     });
 
@@ -517,20 +564,19 @@ app.post('/api/duplicates/auto-clean', (req, res) => {
   try {
     const postsDir = getAccountDir(account);
     if (!fs.existsSync(postsDir)) return res.json({ deletedCount: 0, deletedIds: [] });
-    const files = fs.readdirSync(postsDir);
-    const jsonFiles = files.filter(file => file.endsWith('.json') && file !== 'metadata.json' && file !== 'posts-index.json');
+    const jsonFiles = listPostFiles(postsDir);
 
     const posts = jsonFiles.map(file => {
       const filePath = path.join(postsDir, file);
       const content = fs.readFileSync(filePath, 'utf-8');
       const postData = JSON.parse(content);
-      const baseId = file.replace('.json', '');
+      const baseId = path.basename(file, '.json');
 
       return {
         id: baseId,
         owner: postData.node?.owner?.username || '',
         caption: postData.node?.edge_media_to_caption?.edges[0]?.node?.text || '',
-        timestamp: file.split('_UTC')[0]
+        timestamp: baseId.split('_UTC')[0]
       };
     });
 
@@ -601,28 +647,29 @@ app.post('/api/duplicates/merge', (req, res) => {
 // Helper function to delete post by ID within an account
 function deletePostById(account, id) {
   const postsDir = getAccountDir(account);
+  const postDir = path.join(postsDir, postSubdir(postsDir, id));
 
   // Delete JSON file
-  const jsonPath = path.join(postsDir, `${id}.json`);
+  const jsonPath = path.join(postDir, `${id}.json`);
   if (fs.existsSync(jsonPath)) {
     fs.unlinkSync(jsonPath);
   }
 
   // Delete main media files
-  const jpgPath = path.join(postsDir, `${id}.jpg`);
+  const jpgPath = path.join(postDir, `${id}.jpg`);
   if (fs.existsSync(jpgPath)) {
     fs.unlinkSync(jpgPath);
   }
 
-  const mp4Path = path.join(postsDir, `${id}.mp4`);
+  const mp4Path = path.join(postDir, `${id}.mp4`);
   if (fs.existsSync(mp4Path)) {
     fs.unlinkSync(mp4Path);
   }
 
   // Delete carousel media files
   for (let i = 1; i <= 20; i++) {
-    const carouselJpg = path.join(postsDir, `${id}_${i}.jpg`);
-    const carouselMp4 = path.join(postsDir, `${id}_${i}.mp4`);
+    const carouselJpg = path.join(postDir, `${id}_${i}.jpg`);
+    const carouselMp4 = path.join(postDir, `${id}_${i}.mp4`);
 
     if (fs.existsSync(carouselJpg)) {
       fs.unlinkSync(carouselJpg);
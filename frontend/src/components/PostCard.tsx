@@ -30,6 +30,10 @@ const PostCard: React.FC<PostCardProps> = ({ post, viewMode, availableCategories
 
   const displayUrl = getMediaUrl(post.displayUrl);
   const videoUrl = getMediaUrl(post.videoUrl);
+  // Posts indexed by a metadata-first crawl have no media paths until their files are downloaded
+  const mediaPending = post.isCarousel && post.carouselItems.length > 0
+    ? !post.carouselItems[0].displayUrl
+    : !post.displayUrl && !post.videoUrl;
 
   const handleCategoryToggle = (category: string) => {
     setSelectedCategories(prev =>
@@ -115,7 +119,9 @@ const PostCard: React.FC<PostCardProps> = ({ post, viewMode, availableCategories
     <>
       <div className={`post-card ${viewMode}`} onClick={handleCardClick}>
         <div className="post-media">
-          {post.isCarousel && post.carouselItems.length > 0 ? (
+          {mediaPending ? (
+            <div className="media-pending">Media still downloading…</div>
+          ) : post.isCarousel && post.carouselItems.length > 0 ? (
             <div className="carousel-container">
               <img
                 src={getMediaUrl(post.carouselItems[0].displayUrl)}
@@ -0,0 +1,532 @@
+#!/usr/bin/env python3
+"""
+Compact columnar copy of an account's posts index.
+
+build_index(..., columnar=True) writes saved_posts/<user>/posts-index.col next
+to posts-index.json. Instead of one JSON object per post it stores:
+
+  fixed-width columns   post time, likes, comments, type flags, and owner and
+                        location ids into small dictionaries
+  hashtag lists         per-post runs of hashtag dictionary ids
+  string heaps          ids, captions, alt texts, shortcodes and media paths,
+                        each an offset array plus the UTF-8 bytes
+  carousel items        per-post runs of rows in an item table (type flags,
+                        dimensions, alt text and media paths)
+  extras                per-post JSON for the rest (tagged users, thumbnails),
+                        empty for most posts
+
+Field names appear once per file instead of once per post, and repeated
+owners, locations and hashtags are stored once. ColumnarIndex memory-maps the
+file, so filtering and sorting touch only the columns involved and posts are
+decoded only when asked for; entry() rebuilds exactly the posts-index.json
+entry, so the JSON index can be recreated from the columnar one.
+
+Layout (little-endian): an 8-byte magic, then version, post count and section
+count (uint32 each, plus 4 bytes padding), then one directory record per
+section (16-byte name, uint64 offset, uint64 length), then the sections,
+each aligned to 8 bytes.
+
+Usage:
+  python index_columnar.py <account_dir> [text] [--owner USER] [--hashtag TAG] [--location NAME]
+                           [--videos | --photos] [--sort time|likes|comments] [--limit N] [--to-json FILE]
+"""
+
+import calendar
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from pathlib import Path
+
+
+INDEX_COLUMNAR = "posts-index.col"
+
+MAGIC = b"IGCOLIDX"
+VERSION = 1
+HEADER = struct.Struct("<8sIII4x")
+SECTION = struct.Struct("<16sQQ")
+
+# Bits of the flags column
+FLAG_VIDEO = 1
+FLAG_CAROUSEL = 2
+FLAG_MEDIA = 4  # the post's media is on disk (displayUrl is set)
+
+# Bits of the item_flags column
+ITEM_VIDEO = 1
+ITEM_HEIGHT_FIRST = 2  # dimensions are {"height": .., "width": ..}, as Instagram sends them
+
+# Owner or location id of a post that has none
+NO_ID = 0xFFFFFFFF
+
+# Fixed-width columns and their array typecodes (fixed sizes on every supported platform)
+FIXED_COLUMNS = {"time": "q", "likes": "i", "comments": "i", "flags": "B", "owner": "I", "location": "I"}
+STRING_COLUMNS = ("id", "caption", "alt", "shortcode", "display", "video", "extra")
+# Carousel item table, indexed through item_offsets
+ITEM_COLUMNS = {"item_flags": "B", "item_width": "I", "item_height": "I"}
+ITEM_STRING_COLUMNS = ("item_alt", "item_display", "item_video")
+ITEM_KEYS = ["id", "displayUrl", "isVideo", "videoUrl", "altText", "dimensions"]
+
+# Keys of a posts-index.json entry in the order build_index writes them
+ENTRY_KEYS = ("id", "filename", "timestamp", "caption", "postUrl", "displayUrl", "isVideo", "videoUrl",
+              "owner", "location", "hashtags", "isCarousel", "carouselItems", "altText", "taggedUsers",
+              "engagement", "locationDetails")
+POST_URL_PREFIX = "https://www.instagram.com/p/"
+
+INT32_MAX = 2 ** 31 - 1
+
+
+def _post_time(post_id):
+    """Unix time of a post from its id (e.g. "2024-01-01_07-51-26_UTC"), or 0 if it has none."""
+    try:
+        return calendar.timegm(time.strptime(post_id[:19], "%Y-%m-%d_%H-%M-%S"))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _is_count(value):
+    return type(value) is int and -INT32_MAX <= value <= INT32_MAX
+
+
+def _is_carousel_native(items, post_id):
+    """Whether carousel items have exactly the shape build_index gives them, so the item table can rebuild them."""
+    if not isinstance(items, list):
+        return False
+    for n, item in enumerate(items, 1):
+        if not isinstance(item, dict) or list(item) != ITEM_KEYS or item["id"] != f"{post_id}_{n}":
+            return False
+        dimensions = item["dimensions"]
+        if not (isinstance(item["displayUrl"], str) and type(item["isVideo"]) is bool
+                and isinstance(item["videoUrl"], str) and isinstance(item["altText"], str)
+                and isinstance(dimensions, dict) and sorted(dimensions) == ["height", "width"]
+                and all(type(v) is int and 0 <= v <= 0xFFFFFFFF for v in dimensions.values())):
+            return False
+    return True
+
+
+class _StringColumn:
+    """Offsets plus a UTF-8 heap, the heap spooled to a temporary file while writing."""
+
+    def __init__(self):
+        self.offsets = array("Q", [0])
+        self.heap = tempfile.TemporaryFile()
+
+    def append(self, text):
+        data = text.encode("utf-8")
+        self.heap.write(data)
+        self.offsets.append(self.offsets[-1] + len(data))
+
+
+def write_index_columnar(posts, path):
+    """
+    Write posts (the posts-index.json entries, in index order) to a fresh
+    columnar index at path. The file is written next to the target and renamed
+    into place, so readers never see a half-written file.
+    """
+    path = Path(path)
+    columns = {name: array(typecode) for name, typecode in FIXED_COLUMNS.items()}
+    strings = {name: _StringColumn() for name in (*STRING_COLUMNS, *ITEM_STRING_COLUMNS)}
+    items = {name: array(typecode) for name, typecode in ITEM_COLUMNS.items()}
+    item_offsets = array("I", [0])
+    tag_offsets = array("I", [0])
+    tags = array("I")
+    owners, hashtags, locations = {}, {}, {}
+
+    count = 0
+    for post in posts:
+        count += 1
+        post_id = post["id"]
+        details = post.get("locationDetails")
+        engagement = post.get("engagement")
+        # Each field is stored in its column when it can be rebuilt from it exactly,
+        # otherwise verbatim in the post's extras
+        native = {
+            "id": True,
+            "filename": post.get("filename") == f"{post_id}.json",
+            "timestamp": post.get("timestamp") == post_id,
+            "caption": isinstance(post.get("caption"), str),
+            "postUrl": (isinstance(post.get("postUrl"), str) and post["postUrl"].startswith(POST_URL_PREFIX)
+                        and post["postUrl"].endswith("/")),
+            "displayUrl": isinstance(post.get("displayUrl"), str),
+            "isVideo": type(post.get("isVideo")) is bool,
+            "videoUrl": isinstance(post.get("videoUrl"), str),
+            "owner": isinstance(post.get("owner"), str),
+            "location": post.get("location") == (details.get("name") if isinstance(details, dict) else None),
+            "hashtags": isinstance(post.get("hashtags"), list) and all(isinstance(t, str) for t in post["hashtags"]),
+            "isCarousel": type(post.get("isCarousel")) is bool,
+            "carouselItems": _is_carousel_native(post.get("carouselItems"), post_id),
+            "altText": isinstance(post.get("altText"), str),
+            # Tagged users are rare; an empty list is the only form rebuilt without extras
+            "taggedUsers": post.get("taggedUsers") == [],
+            "engagement": (isinstance(engagement, dict) and list(engagement) == ["likes", "comments"]
+                           and _is_count(engagement["likes"]) and _is_count(engagement["comments"])),
+            "locationDetails": details is None or isinstance(details, dict),
+        }
+        native = {key for key, ok in native.items() if ok and key in post}
+        extra = {key: value for key, value in post.items() if key not in native}
+        # Key order is only stored for entries that don't follow build_index's
+        if list(post) != [*ENTRY_KEYS, *(key for key in post if key not in ENTRY_KEYS)]:
+            extra["__keys__"] = list(post)
+
+        flags = 0
+        if "isVideo" in native and post["isVideo"]:
+            flags |= FLAG_VIDEO
+        if "isCarousel" in native and post["isCarousel"]:
+            flags |= FLAG_CAROUSEL
+        if post.get("displayUrl"):
+            flags |= FLAG_MEDIA
+        location = NO_ID
+        if "locationDetails" in native and details is not None:
+            location = locations.setdefault(json.dumps(details, ensure_ascii=False), len(locations))
+        counts = engagement if "engagement" in native else {"likes": 0, "comments": 0}
+
+        columns["time"].append(_post_time(post_id))
+        columns["likes"].append(counts["likes"])
+        columns["comments"].append(counts["comments"])
+        columns["flags"].append(flags)
+        columns["owner"].append(owners.setdefault(post["owner"], len(owners)) if "owner" in native
+                                else NO_ID)
+        columns["location"].append(location)
+        if "hashtags" in native:
+            tags.extend(hashtags.setdefault(tag, len(hashtags)) for tag in post["hashtags"])
+        tag_offsets.append(len(tags))
+
+        strings["id"].append(post_id)
+        strings["caption"].append(post["caption"] if "caption" in native else "")
+        strings["alt"].append(post["altText"] if "altText" in native else "")
+        strings["shortcode"].append(post["postUrl"][len(POST_URL_PREFIX):-1] if "postUrl" in native else "")
+        strings["display"].append(post["displayUrl"] if "displayUrl" in native else "")
+        strings["video"].append(post["videoUrl"] if "videoUrl" in native else "")
+        strings["extra"].append(json.dumps(extra, ensure_ascii=False, separators=(",", ":")) if extra else "")
+        for item in post["carouselItems"] if "carouselItems" in native else ():
+            dimensions = item["dimensions"]
+            items["item_flags"].append((ITEM_VIDEO if item["isVideo"] else 0)
+                                       | (ITEM_HEIGHT_FIRST if next(iter(dimensions)) == "height" else 0))
+            items["item_width"].append(dimensions["width"])
+            items["item_height"].append(dimensions["height"])
+            strings["item_alt"].append(item["altText"])
+            strings["item_display"].append(item["displayUrl"])
+            strings["item_video"].append(item["videoUrl"])
+        item_offsets.append(len(items["item_flags"]))
+
+    dictionaries = {
+        "owners": list(owners),
+        "hashtags": list(hashtags),
+        "locations": [json.loads(details) for details in locations],
+    }
+
+    # (name, bytes or spooled heap) in file order
+    sections = [(name, columns[name]) for name in FIXED_COLUMNS]
+    sections += [("tag_offsets", tag_offsets), ("tags", tags), ("item_offsets", item_offsets)]
+    sections += list(items.items())
+    for name, column in strings.items():
+        sections += [(f"{name}.off", column.offsets), (name, column.heap)]
+    sections.append(("dicts", json.dumps(dictionaries, ensure_ascii=False).encode("utf-8")))
+
+    def payload_size(data):
+        if isinstance(data, array):
+            return len(data) * data.itemsize
+        if isinstance(data, bytes):
+            return len(data)
+        return data.seek(0, os.SEEK_END)
+
+    offset = HEADER.size + SECTION.size * len(sections)
+    directory = []
+    for name, data in sections:
+        offset += -offset % 8
+        size = payload_size(data)
+        directory.append((name, offset, size))
+        offset += size
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, count, len(sections)))
+            for name, section_offset, size in directory:
+                f.write(SECTION.pack(name.encode("ascii"), section_offset, size))
+            for (name, data), (_, section_offset, _) in zip(sections, directory):
+                f.write(b"\0" * (section_offset - f.tell()))
+                if isinstance(data, array):
+                    if sys.byteorder != "little":
+                        data = array(data.typecode, data)
+                        data.byteswap()
+                    data.tofile(f)
+                elif isinstance(data, bytes):
+                    f.write(data)
+                else:
+                    data.seek(0)
+                    while chunk := data.read(1024 * 1024):
+                        f.write(chunk)
+        os.replace(tmp_path, path)
+    finally:
+        for column in strings.values():
+            column.heap.close()
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+class ColumnarIndex:
+    def __init__(self, path):
+        """
+        Open a columnar index read-only, memory-mapped
+
+        Args:
+            path: Path to posts-index.col
+        """
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        magic, version, self.count, section_count = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{self.path} is not a version {VERSION} columnar posts index")
+        self._sections = {}
+        for i in range(section_count):
+            name, offset, size = SECTION.unpack_from(self._mmap, HEADER.size + i * SECTION.size)
+            self._sections[name.rstrip(b"\0").decode("ascii")] = (offset, size)
+
+        self.times = self._array("time", "q")
+        self.likes = self._array("likes", "i")
+        self.comments = self._array("comments", "i")
+        self.flags = self._array("flags", "B")
+        self.owner_ids = self._array("owner", "I")
+        self.location_ids = self._array("location", "I")
+        self._tag_offsets = self._array("tag_offsets", "I")
+        self._tags = self._array("tags", "I")
+        self._item_offsets = self._array("item_offsets", "I")
+        self._items = {name: self._array(name, typecode) for name, typecode in ITEM_COLUMNS.items()}
+        self._string_offsets = {name: self._array(f"{name}.off", "Q")
+                                for name in (*STRING_COLUMNS, *ITEM_STRING_COLUMNS)}
+
+        dictionaries = json.loads(str(self._bytes("dicts"), "utf-8"))
+        self.owners = dictionaries["owners"]
+        self.hashtags = dictionaries["hashtags"]
+        self.locations = dictionaries["locations"]
+        self._owner_ids = {owner: i for i, owner in enumerate(self.owners)}
+        self._hashtag_ids = {tag: i for i, tag in enumerate(self.hashtags)}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        """Release the memory map. Columns taken from this index are invalid afterwards."""
+        columns = [getattr(self, name, None) for name in ("times", "likes", "comments", "flags", "owner_ids",
+                                                          "location_ids", "_tag_offsets", "_tags", "_item_offsets")]
+        columns += [*getattr(self, "_items", {}).values(), *getattr(self, "_string_offsets", {}).values()]
+        for column in columns:
+            if isinstance(column, memoryview):
+                column.release()
+        if getattr(self, "_view", None) is not None:
+            self._view.release()
+            self._view = None
+        self._mmap.close()
+
+    def _bytes(self, name):
+        offset, size = self._sections[name]
+        return self._view[offset:offset + size]
+
+    def _array(self, name, typecode):
+        """A column as a zero-copy memoryview, or a byte-swapped copy on big-endian hosts."""
+        data = self._bytes(name)
+        if sys.byteorder == "little":
+            return data.cast(typecode)
+        column = array(typecode, data.tobytes())
+        column.byteswap()
+        return column
+
+    def _string(self, column, row):
+        offsets = self._string_offsets[column]
+        offset, _ = self._sections[column]
+        return str(self._view[offset + offsets[row]:offset + offsets[row + 1]], "utf-8")
+
+    def post_id(self, row):
+        return self._string("id", row)
+
+    def caption(self, row):
+        return self._string("caption", row)
+
+    def post_hashtags(self, row):
+        return [self.hashtags[tag] for tag in self._tags[self._tag_offsets[row]:self._tag_offsets[row + 1]]]
+
+    def carousel_items(self, row):
+        post_id = self.post_id(row)
+        result = []
+        for n, item in enumerate(range(self._item_offsets[row], self._item_offsets[row + 1]), 1):
+            flags = self._items["item_flags"][item]
+            width, height = self._items["item_width"][item], self._items["item_height"][item]
+            result.append({
+                "id": f"{post_id}_{n}",
+                "displayUrl": self._string("item_display", item),
+                "isVideo": bool(flags & ITEM_VIDEO),
+                "videoUrl": self._string("item_video", item),
+                "altText": self._string("item_alt", item),
+                "dimensions": ({"height": height, "width": width} if flags & ITEM_HEIGHT_FIRST
+                               else {"width": width, "height": height}),
+            })
+        return result
+
+    def entry(self, row):
+        """Rebuild the posts-index.json entry of a row."""
+        extra = self._string("extra", row)
+        extra = json.loads(extra) if extra else {}
+        keys = extra.pop("__keys__", None) or [*ENTRY_KEYS, *(key for key in extra if key not in ENTRY_KEYS)]
+        post_id = self.post_id(row)
+        location = self.location_ids[row]
+        details = dict(self.locations[location]) if location != NO_ID else None
+        flags = self.flags[row]
+        derived = {
+            "id": lambda: post_id,
+            "filename": lambda: f"{post_id}.json",
+            "timestamp": lambda: post_id,
+            "caption": lambda: self.caption(row),
+            "postUrl": lambda: f"{POST_URL_PREFIX}{self._string('shortcode', row)}/",
+            "displayUrl": lambda: self._string("display", row),
+            "isVideo": lambda: bool(flags & FLAG_VIDEO),
+            "videoUrl": lambda: self._string("video", row),
+            "owner": lambda: self.owners[self.owner_ids[row]],
+            "location": lambda: details.get("name") if details else None,
+            "hashtags": lambda: self.post_hashtags(row),
+            "isCarousel": lambda: bool(flags & FLAG_CAROUSEL),
+            "carouselItems": lambda: self.carousel_items(row),
+            "altText": lambda: self._string("alt", row),
+            "taggedUsers": lambda: [],
+            "engagement": lambda: {"likes": self.likes[row], "comments": self.comments[row]},
+            "locationDetails": lambda: details,
+        }
+        return {key: extra[key] if key in extra else derived[key]() for key in keys}
+
+    def entries(self, rows=None):
+        """Yield the entries of the given rows (all rows, in index order, if None)."""
+        for row in range(self.count) if rows is None else rows:
+            yield self.entry(row)
+
+    def filter(self, owner=None, hashtag=None, location=None, is_video=None, is_carousel=None,
+               has_media=None, since=None, until=None, min_likes=None, text=None):
+        """
+        Rows matching every given condition, in index order. Conditions on
+        fixed-width columns are checked first; captions are only decoded for
+        rows that pass them.
+
+        Args:
+            owner: Exact owner username
+            hashtag: Hashtag, with or without the leading '#'
+            location: Exact location name
+            is_video: Only videos (True) or only non-videos (False)
+            is_carousel: Only carousels (True) or only single posts (False)
+            has_media: Only posts whose media is on disk (True) or still missing (False)
+            since: Only posts taken at or after this Unix time
+            until: Only posts taken before this Unix time
+            min_likes: Only posts with at least this many likes
+            text: Case-insensitive substring of the caption
+        """
+        rows = range(self.count)
+        if owner is not None:
+            owner_id = self._owner_ids.get(owner)
+            if owner_id is None:
+                return []
+            owner_ids = self.owner_ids
+            rows = [row for row in rows if owner_ids[row] == owner_id]
+        if location is not None:
+            location_ids = {i for i, details in enumerate(self.locations) if details.get("name") == location}
+            rows = [row for row in rows if self.location_ids[row] in location_ids]
+        for flag, wanted in ((FLAG_VIDEO, is_video), (FLAG_CAROUSEL, is_carousel), (FLAG_MEDIA, has_media)):
+            if wanted is not None:
+                flags = self.flags
+                rows = [row for row in rows if bool(flags[row] & flag) == wanted]
+        if since is not None:
+            rows = [row for row in rows if self.times[row] >= since]
+        if until is not None:
+            rows = [row for row in rows if self.times[row] < until]
+        if min_likes is not None:
+            rows = [row for row in rows if self.likes[row] >= min_likes]
+        if hashtag is not None:
+            tag = hashtag.lower() if hashtag.startswith("#") else f"#{hashtag.lower()}"
+            tag_id = self._hashtag_ids.get(tag)
+            if tag_id is None:
+                return []
+            offsets, tags = self._tag_offsets, self._tags
+            rows = [row for row in rows if tag_id in tags[offsets[row]:offsets[row + 1]].tolist()]
+        if text:
+            needle = text.casefold()
+            rows = [row for row in rows if needle in self.caption(row).casefold()]
+        return list(rows)
+
+    def sort(self, rows, key="time", reverse=True):
+        """Sort rows by a fixed-width column ("time", "likes" or "comments"), newest or largest first by default."""
+        column = {"time": self.times, "likes": self.likes, "comments": self.comments}[key]
+        return sorted(rows, key=column.__getitem__, reverse=reverse)
+
+    def query(self, sort="time", reverse=True, limit=50, offset=0, **conditions):
+        """Filter (see filter()), sort and page, returning the matching entries."""
+        rows = self.sort(self.filter(**conditions), sort, reverse)
+        return list(self.entries(rows[offset:offset + limit]))
+
+    def write_json(self, path):
+        """Write the entries back out as a posts-index.json file, atomically, byte for byte as build_index would."""
+        from insta_scraper import _index_json_encoder  # insta_scraper imports this module
+
+        dumps, separator = _index_json_encoder()
+        path = Path(path)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("[")
+            for row, entry in enumerate(self.entries()):
+                f.write((separator if row else "") + dumps(entry))
+            f.write("]")
+        os.replace(tmp_path, path)
+
+
+def main():
+    """Command-line queries over an account's posts-index.col"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Query an account's columnar posts index")
+    parser.add_argument("account_dir", help="Account directory, e.g. saved_posts/<username>")
+    parser.add_argument("text", nargs="?", default=None, help="Only posts whose caption contains this text")
+    parser.add_argument("--owner", help="Only posts by this username")
+    parser.add_argument("--hashtag", help="Only posts with this hashtag")
+    parser.add_argument("--location", help="Only posts at this location name")
+    media = parser.add_mutually_exclusive_group()
+    media.add_argument("--videos", action="store_true", help="Only videos")
+    media.add_argument("--photos", action="store_true", help="Only non-video posts")
+    parser.add_argument("--sort", choices=("time", "likes", "comments"), default="time",
+                        help="Sort order, largest first (default: time)")
+    parser.add_argument("--limit", type=int, default=20, help="Maximum number of results")
+    parser.add_argument("--to-json", metavar="FILE", default=None,
+                        help="Write the whole index back out as posts-index.json to FILE instead")
+    args = parser.parse_args()
+
+    path = Path(args.account_dir) / INDEX_COLUMNAR
+    if not path.exists():
+        print(f"Error: {path} not found")
+        print("  Build it with: python insta_scraper.py --index-columnar")
+        sys.exit(1)
+
+    with ColumnarIndex(path) as index:
+        if args.to_json:
+            index.write_json(args.to_json)
+            print(f"Wrote {len(index)} posts to {args.to_json}")
+            return
+        is_video = True if args.videos else False if args.photos else None
+        results = index.query(sort=args.sort, limit=args.limit, owner=args.owner, hashtag=args.hashtag,
+                              location=args.location, is_video=is_video, text=args.text)
+    for post in results:
+        caption = " ".join(post["caption"].split())
+        if len(caption) > 80:
+            caption = caption[:77] + "..."
+        print(f"{post['id']}  @{post['owner']}  ♥ {post['engagement']['likes']}  {caption}")
+    print(f"\n{len(results)} result(s)")
+
+
+if __name__ == "__main__":
+    main()
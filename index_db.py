@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+SQLite store for an account's posts index.
+
+build_index(..., sqlite_db=True) writes saved_posts/<user>/posts-index.db with
+normalized tables for posts, hashtags, tagged users, carousel items and
+locations, plus an FTS5 table over captions, alt text, hashtags and owners,
+so searches are indexed lookups instead of scans over posts-index.json.
+
+Usage:
+  python index_db.py <account_dir> [query] [--hashtag TAG] [--owner USER] [--location NAME] [--limit N]
+"""
+
+import os
+import re
+import sqlite3
+import sys
+from pathlib import Path
+
+
+INDEX_DB = "posts-index.db"
+
+SCHEMA = """
+CREATE TABLE locations (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    slug TEXT
+);
+CREATE TABLE posts (
+    ordinal INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    shortcode TEXT,
+    timestamp TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    caption TEXT NOT NULL,
+    alt_text TEXT NOT NULL,
+    is_video INTEGER NOT NULL,
+    is_carousel INTEGER NOT NULL,
+    likes INTEGER NOT NULL,
+    comments INTEGER NOT NULL,
+    location_id TEXT REFERENCES locations(id),
+    display_url TEXT NOT NULL,
+    video_url TEXT NOT NULL
+);
+CREATE TABLE hashtags (
+    post INTEGER NOT NULL REFERENCES posts(ordinal),
+    tag TEXT NOT NULL
+);
+CREATE TABLE tagged_users (
+    post INTEGER NOT NULL REFERENCES posts(ordinal),
+    username TEXT NOT NULL,
+    full_name TEXT NOT NULL
+);
+CREATE TABLE carousel_items (
+    post INTEGER NOT NULL REFERENCES posts(ordinal),
+    position INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    is_video INTEGER NOT NULL,
+    display_url TEXT NOT NULL,
+    video_url TEXT NOT NULL,
+    alt_text TEXT NOT NULL,
+    width INTEGER,
+    height INTEGER
+);
+CREATE VIRTUAL TABLE posts_fts USING fts5(
+    caption, alt_text, hashtags, owner,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE INDEX posts_owner ON posts(owner);
+CREATE INDEX posts_timestamp ON posts(timestamp);
+CREATE INDEX posts_location ON posts(location_id);
+CREATE INDEX hashtags_tag ON hashtags(tag);
+CREATE INDEX tagged_users_username ON tagged_users(username);
+CREATE INDEX carousel_items_post ON carousel_items(post);
+"""
+
+SHORTCODE_RE = re.compile(r'/p/([^/]+)/')
+
+
+def write_index_db(posts, db_path):
+    """
+    Write posts (the posts-index.json entries, in index order) to a fresh
+    SQLite database at db_path. The database is built next to the target and
+    renamed into place, so readers never see a half-written file.
+    """
+    db_path = Path(db_path)
+    tmp_path = db_path.with_name(db_path.name + ".tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(SCHEMA)
+        for ordinal, post in enumerate(posts):
+            location = post.get("locationDetails")
+            if location:
+                conn.execute(
+                    "INSERT OR IGNORE INTO locations (id, name, slug) VALUES (?, ?, ?)",
+                    (str(location["id"]), location["name"], location.get("slug")),
+                )
+
+            match = SHORTCODE_RE.search(post.get("postUrl", ""))
+            conn.execute(
+                "INSERT INTO posts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    ordinal, post["id"], match.group(1) if match else None, post["timestamp"],
+                    post["owner"], post["caption"], post["altText"] or "",
+                    int(post["isVideo"]), int(post["isCarousel"]),
+                    post["engagement"]["likes"], post["engagement"]["comments"],
+                    str(location["id"]) if location else None,
+                    post["displayUrl"], post["videoUrl"],
+                ),
+            )
+            conn.executemany(
+                "INSERT INTO hashtags (post, tag) VALUES (?, ?)",
+                [(ordinal, tag) for tag in post["hashtags"]],
+            )
+            conn.executemany(
+                "INSERT INTO tagged_users (post, username, full_name) VALUES (?, ?, ?)",
+                [(ordinal, user["username"], user["fullName"]) for user in post["taggedUsers"]],
+            )
+            conn.executemany(
+                "INSERT INTO carousel_items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        ordinal, position, item["id"], int(item["isVideo"]),
+                        item["displayUrl"], item["videoUrl"], item["altText"] or "",
+                        (item.get("dimensions") or {}).get("width"),
+                        (item.get("dimensions") or {}).get("height"),
+                    )
+                    for position, item in enumerate(post["carouselItems"], 1)
+                ],
+            )
+
+            alt_texts = [post["altText"] or ""] + [item["altText"] or "" for item in post["carouselItems"]]
+            conn.execute(
+                "INSERT INTO posts_fts (rowid, caption, alt_text, hashtags, owner) VALUES (?, ?, ?, ?, ?)",
+                (ordinal, post["caption"], "\n".join(t for t in alt_texts if t),
+                 " ".join(post["hashtags"]), post["owner"]),
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, db_path)
+
+
+def _fts_query(text):
+    """Turn free text into an FTS5 query matching all words (prefix match on each)."""
+    words = re.findall(r'\w+', text, re.UNICODE)
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def search(db_path, text=None, hashtag=None, owner=None, location=None, limit=50, offset=0):
+    """
+    Search the posts index database.
+
+    Args:
+        db_path: Path to posts-index.db
+        text: Free text matched against captions, alt text, hashtags and owners
+        hashtag: Exact hashtag filter (with or without leading '#')
+        owner: Exact owner username filter
+        location: Exact location name filter
+        limit: Maximum number of results
+        offset: Number of results to skip
+
+    Returns:
+        List of dicts with id, owner, timestamp and caption, best text
+        matches first when text is given, otherwise newest first
+    """
+    clauses = []
+    params = []
+    joins = ""
+    order = "p.timestamp DESC"
+
+    if text and _fts_query(text):
+        joins += " JOIN posts_fts f ON f.rowid = p.ordinal"
+        clauses.append("posts_fts MATCH ?")
+        params.append(_fts_query(text))
+        order = "bm25(posts_fts), p.timestamp DESC"
+    if hashtag:
+        tag = hashtag.lower() if hashtag.startswith("#") else f"#{hashtag.lower()}"
+        clauses.append("p.ordinal IN (SELECT post FROM hashtags WHERE tag = ?)")
+        params.append(tag)
+    if owner:
+        clauses.append("p.owner = ?")
+        params.append(owner)
+    if location:
+        clauses.append("p.location_id IN (SELECT id FROM locations WHERE name = ?)")
+        params.append(location)
+
+    sql = "SELECT p.id, p.owner, p.timestamp, p.caption FROM posts p" + joins
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += f" ORDER BY {order} LIMIT ? OFFSET ?"
+    params += [limit, offset]
+
+    conn = sqlite3.connect(f"file:{Path(db_path)}?mode=ro", uri=True)
+    try:
+        conn.row_factory = sqlite3.Row
+        return [dict(row) for row in conn.execute(sql, params)]
+    finally:
+        conn.close()
+
+
+def main():
+    """Command-line search over an account's posts-index.db"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Search an account's posts index database")
+    parser.add_argument("account_dir", help="Account directory, e.g. saved_posts/<username>")
+    parser.add_argument("query", nargs="?", default=None, help="Free text to search for")
+    parser.add_argument("--hashtag", help="Only posts with this hashtag")
+    parser.add_argument("--owner", help="Only posts by this username")
+    parser.add_argument("--location", help="Only posts at this location name")
+    parser.add_argument("--limit", type=int, default=20, help="Maximum number of results")
+    args = parser.parse_args()
+
+    db_path = Path(args.account_dir) / INDEX_DB
+    if not db_path.exists():
+        print(f"Error: {db_path} not found")
+        print("  Build it with: python insta_scraper.py --index-db")
+        sys.exit(1)
+
+    results = search(db_path, text=args.query, hashtag=args.hashtag, owner=args.owner,
+                     location=args.location, limit=args.limit)
+    for post in results:
+        caption = " ".join(post["caption"].split())
+        if len(caption) > 80:
+            caption = caption[:77] + "..."
+        print(f"{post['id']}  @{post['owner']}  {caption}")
+    print(f"\n{len(results)} result(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,25 +5,338 @@ Scrapes saved posts from your Instagram account
 """
 
 import instaloader
+import gzip
+import hashlib
+import itertools
 import json
 import os
+import queue
+import random
 import re
 import shutil
+import signal
 import subprocess
+from collections import deque
 from pathlib import Path
 from datetime import datetime
 import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from cloud_sync import delta_pull, delta_sync, hash_file, open_target
+from index_columnar import INDEX_COLUMNAR, write_index_columnar
+from index_db import INDEX_DB, write_index_db
+from media_queue import MEDIA_QUEUE, MediaQueue
+from media_verify import verify_file
+from rate_control import MAX_RATE, AdaptiveRateController
+from run_metrics import RunMetrics, write_prometheus
+from status_server import StatusServer
+
+
+# Per-file cache of index entries used to rebuild posts-index.json incrementally
+INDEX_MANIFEST = ".index-manifest.jsonl"
+INDEX_MANIFEST_VERSION = 1
+
+# Append-only log of downloaded shortcodes, used to skip known posts when crawling
+SHORTCODE_LEDGER = ".shortcodes.jsonl"
+
+# Media download threads used by get_saved_posts
+DEFAULT_DOWNLOAD_WORKERS = 4
+
+# Concurrent transfers per CDN host for the async media fetcher
+MEDIA_MAX_PER_HOST = 8
+
+# Subdirectory of an account holding the paginated copy of posts-index.json
+INDEX_SHARD_DIR = "posts-index"
+
+# Subdirectory of an account holding the inverted facet indexes
+FACETS_DIR = "posts-facets"
+
+# Thumbnails generated by build_thumbnails, and their content-hash cache
+THUMB_DIR = "thumbs"
+THUMB_CACHE = ".thumbs.json"
+THUMB_MAX_SIZE = 480
+THUMB_QUALITY = 80
+
+# Precomputed duplicate matches and the perceptual hash cache behind them
+DUPLICATES_FILE = "duplicates.json"
+PHASH_CACHE = ".phash.json"
+PHASH_MAX_DISTANCE = 6
+
+# GraphQL query behind the saved-media feed, and its page size
+SAVED_POSTS_QUERY_HASH = 'f883d95537fbcd400f466f63d42bd8a1'
+SAVED_PAGE_SIZE = 12
+
+# Per-account JSON report of the last run's metrics (see run_metrics.py)
+RUN_REPORT = ".run-report.json"
+# Where --profile saves cProfile stats
+PROFILE_DIR = "profiles"
+
+# Pagination state of an interrupted crawl, for --resume
+CRAWL_CHECKPOINT = ".crawl-checkpoint.json"
+CRAWL_CHECKPOINT_VERSION = 1
+# Posts checked between checkpoints
+CHECKPOINT_EVERY = SAVED_PAGE_SIZE
+
+# Newest saved posts seen by the last complete crawl, where the next one can stop
+SYNC_WATERMARK = ".sync-watermark.json"
+WATERMARK_SIZE = 5
+# Consecutive watermark posts, in their saved order, that confirm the crawl caught up
+WATERMARK_CONFIRMATIONS = 2
+
+# Media integrity results keyed by size and mtime, and the last verify run's report
+VERIFY_CACHE = ".verify-cache.json"
+VERIFY_CACHE_VERSION = 1
+VERIFY_REPORT = ".verify-report.json"
+
+# On-disk layout of an account: "flat" keeps every post file in the account
+# directory, "bucketed" puts each post's files in <YYYY>/<MM>/ subdirectories.
+# Recorded per account (see migrate_layout); accounts without it are flat.
+LAYOUT_FILE = "layout.json"
+LAYOUTS = ("flat", "bucketed")
+# Post filenames start with the post's UTC date, which picks its bucket
+BUCKET_DATE_RE = re.compile(r'^(\d{4})-(\d{2})-\d{2}_')
+
+# Non-post JSON files that live alongside the posts in an account directory
+NON_POST_FILES = ("metadata.json", "posts-index.json", THUMB_CACHE, DUPLICATES_FILE, PHASH_CACHE,
+                  CRAWL_CHECKPOINT, SYNC_WATERMARK, RUN_REPORT, VERIFY_CACHE, VERIFY_REPORT, LAYOUT_FILE)
+
+# Below this many files to (re)parse, process startup costs more than it saves
+PARALLEL_INDEX_MIN_FILES = 500
+
+# Post files build_index holds in memory at once while streaming the index
+INDEX_WINDOW = 2000
+
+# Whitespace and separators between entries of a JSON array
+INDEX_GAP_RE = re.compile(r'[\s,]*')
+
+HASHTAG_RE = re.compile(r'#[\w\u00C0-\u024F\u1E00-\u1EFF]+')
+
+# Carousel position suffix of a media filename stem, e.g. "_2" in "..._UTC_2.jpg"
+CAROUSEL_SUFFIX_RE = re.compile(r'_\d+$')
+
+# Seconds between index refreshes while queued media downloads (--metadata-first)
+MEDIA_INDEX_INTERVAL = 60
+
+# Default number of accounts crawled at once with --all-accounts
+DEFAULT_PARALLEL_ACCOUNTS = 2
+
+# Daemon mode: minutes between polls of the saved feed, the random spread
+# around that (as a fraction of the interval) and the local status port
+DAEMON_INTERVAL = 30
+DAEMON_JITTER = 0.2
+DAEMON_STATUS_PORT = 8790
+# Failed polls in a row stretch the interval, up to this factor
+DAEMON_MAX_BACKOFF = 8
+# Failed polls in a row after which /health reports an account as unhealthy
+DAEMON_UNHEALTHY_FAILURES = 3
+# Recent errors listed by the status endpoint
+DAEMON_RECENT_ERRORS = 20
+
+
+def _build_index_entry(json_file):
+    """
+    Parse one post JSON file into its posts-index.json entry.
+    Media fields are left empty; _resolve_index_media fills them in.
+    Returns None if the file is not a valid post.
+
+    Module-level so build_index can run it in worker processes.
+    """
+    json_file = Path(json_file)
+    try:
+        with open(json_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, KeyError):
+        return None
+
+    node = data.get("node", {}) if isinstance(data, dict) else {}
+    if not node:
+        return None
+
+    base_id = json_file.stem  # e.g. "2024-01-01_07-51-26_UTC"
+    caption = ""
+    caption_edges = node.get("edge_media_to_caption", {}).get("edges", [])
+    if caption_edges:
+        caption = caption_edges[0].get("node", {}).get("text", "")
+
+    hashtags = [t.lower() for t in HASHTAG_RE.findall(caption)]
+    is_video = node.get("__typename") == "GraphVideo"
+    is_carousel = node.get("__typename") == "GraphSidecar"
+
+    # Carousel items
+    carousel_items = []
+    if is_carousel:
+        edges = node.get("edge_sidecar_to_children", {}).get("edges", [])
+        for idx, edge in enumerate(edges):
+            item = edge.get("node", {})
+            item_id = f"{base_id}_{idx + 1}"
+            item_is_video = item.get("__typename") == "GraphVideo"
+            carousel_items.append({
+                "id": item_id,
+                "displayUrl": "",
+                "isVideo": item_is_video,
+                "videoUrl": "",
+                "altText": item.get("accessibility_caption", ""),
+                "dimensions": item.get("dimensions", {"width": 0, "height": 0}),
+            })
+
+    # Tagged users
+    tagged_users = []
+    for edge in node.get("edge_media_to_tagged_user", {}).get("edges", []):
+        user = edge.get("node", {}).get("user", {})
+        tagged_users.append({
+            "username": user.get("username", ""),
+            "fullName": user.get("full_name", ""),
+        })
+
+    return {
+        "id": base_id,
+        "filename": json_file.name,
+        "timestamp": base_id,
+        "caption": caption,
+        "postUrl": f"https://www.instagram.com/p/{node.get('shortcode', '')}/",
+        "displayUrl": "",
+        "isVideo": is_video,
+        "videoUrl": "",
+        "owner": node.get("owner", {}).get("username", "unknown"),
+        "location": (node.get("location") or {}).get("name"),
+        "hashtags": hashtags,
+        "isCarousel": is_carousel,
+        "carouselItems": carousel_items,
+        "altText": node.get("accessibility_caption", ""),
+        "taggedUsers": tagged_users,
+        "engagement": {
+            "likes": node.get("edge_liked_by", {}).get("count", 0),
+            "comments": node.get("edge_media_to_comment", {}).get("count", 0),
+        },
+        "locationDetails": {
+            "id": node["location"]["id"],
+            "name": node["location"]["name"],
+            "slug": node["location"].get("slug"),
+        } if node.get("location") else None,
+    }
+
+
+
+def _post_bucket(name):
+    """<YYYY>/<MM> subdirectory of a post file in the bucketed layout, or None if its name has no date."""
+    match = BUCKET_DATE_RE.match(name)
+    return f"{match.group(1)}/{match.group(2)}" if match else None
+
+
+def _index_json_encoder():
+    """
+    Return (dumps, separator) for writing index entries: orjson when it is
+    installed, otherwise the json module with json.dump's own separator, so
+    the streamed file matches what json.dump(posts) would have written.
+    """
+    try:
+        import orjson
+    except ImportError:
+        return (lambda obj: json.dumps(obj, ensure_ascii=False)), ", "
+    return (lambda obj: orjson.dumps(obj).decode('utf-8')), ","
+
+
+def _render_thumbnail(src, dest, max_size):
+    """
+    Write a WebP thumbnail of src to dest, fitting within max_size pixels.
+    Returns (width, height) of the thumbnail, or None if src can't be decoded.
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(src) as img:
+            img.thumbnail((max_size, max_size))
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGB")
+            tmp = dest + ".tmp"
+            img.save(tmp, "WEBP", quality=THUMB_QUALITY)
+            os.replace(tmp, dest)
+            return img.size
+    except (OSError, ValueError):
+        return None
+
+
+
+def _perceptual_hash(path):
+    """
+    Return the 64-bit difference hash (dHash) of an image as 16 hex digits,
+    or None if the image can't be decoded. Near-identical images (recompressed,
+    resized, lightly edited) get hashes a few bits apart.
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(path) as img:
+            img.draft("L", (64, 64))  # let the JPEG decoder downscale cheaply
+            pixels = img.convert("L").resize((9, 8), Image.LANCZOS).tobytes()
+    except (OSError, ValueError):
+        return None
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f"{bits:016x}"
+
+
+class _BKTree:
+    """Burkhard-Keller tree over integer hashes, keyed by Hamming distance."""
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, value):
+        if self.root is None:
+            self.root = (value, {})
+            return
+        node = self.root
+        while True:
+            distance = bin(node[0] ^ value).count("1")
+            if distance == 0:
+                return
+            if distance not in node[1]:
+                node[1][distance] = (value, {})
+                return
+            node = node[1][distance]
+
+    def search(self, value, radius):
+        """Return [(match, distance)] for all values within radius of value."""
+        matches = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node_value, children = stack.pop()
+            distance = bin(node_value ^ value).count("1")
+            if distance <= radius:
+                matches.append((node_value, distance))
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return matches
 
 
 class InstagramSavedPostsScraper:
-    def __init__(self, username=None, session_file=None):
+    def __init__(self, username=None, session_file=None, requests_per_minute=None, metrics=None,
+                 stop_event=None):
         """
         Initialize the Instagram scraper
 
         Args:
             username: Instagram username
             session_file: Path to session file for authentication
+            requests_per_minute: Optional cap on Instagram API requests per minute for this account
+            metrics: RunMetrics collecting this run's counters and timings (a new one if None)
+            stop_event: Optional threading.Event; once set, a crawl stops after the
+                current post and saves its checkpoint as if interrupted
         """
+        self.stop_event = stop_event
+        # Created by Instaloader once it has a context; adapts the request rate to throttling
+        self.rate_controller = None
+
+        def make_rate_controller(context):
+            self.rate_controller = AdaptiveRateController(context, max_rate=requests_per_minute or MAX_RATE)
+            return self.rate_controller
+
         self.loader = instaloader.Instaloader(
             download_videos=True,
             download_video_thumbnails=True,
@@ -32,9 +345,13 @@ class InstagramSavedPostsScraper:
             save_metadata=True,
             compress_json=False,
             post_metadata_txt_pattern='',
+            rate_controller=make_rate_controller,
         )
         self.username = username
         self.session_file = session_file
+        # Optional MediaFetcher used instead of instaloader for media transfers
+        self.media_fetcher = None
+        self.metrics = metrics or RunMetrics(account=username)
 
     def _get_user_id(self):
         """Extract ds_user_id from session cookies or session file."""
@@ -61,30 +378,180 @@ class InstagramSavedPostsScraper:
                 pass
         return None
 
-    def _load_existing_shortcodes(self, output_dir):
+    def _scan_account(self, output_path):
         """
-        Scan existing post JSON files in the output directory and extract shortcodes.
-        Returns a set of shortcodes that have already been downloaded.
+        List the files of an account directory in either layout: the directory
+        itself plus its <YYYY>/<MM> buckets. Post filenames are unique within an
+        account, so the result is keyed by filename, which keeps caches and
+        lookups independent of the layout.
+
+        Returns:
+            Dict of filename -> (path relative to the account directory, os.DirEntry)
+        """
+        files = {}
+        years = []
+        with os.scandir(output_path) as it:
+            for e in it:
+                if e.is_file():
+                    files[e.name] = (e.name, e)
+                elif len(e.name) == 4 and e.name.isdigit() and e.is_dir():
+                    years.append(e.name)
+        for year in sorted(years):
+            with os.scandir(output_path / year) as it:
+                months = sorted(e.name for e in it if len(e.name) == 2 and e.name.isdigit() and e.is_dir())
+            for month in months:
+                with os.scandir(output_path / year / month) as it:
+                    for e in it:
+                        if e.is_file():
+                            files[e.name] = (f"{year}/{month}/{e.name}", e)
+        return files
+
+    def _load_layout(self, output_dir):
+        """Return the account's on-disk layout, "flat" unless migrate_layout recorded another."""
+        try:
+            with open(Path(output_dir) / LAYOUT_FILE, 'r', encoding='utf-8') as f:
+                layout = json.load(f).get("layout")
+        except (OSError, json.JSONDecodeError, AttributeError):
+            return "flat"
+        return layout if layout in LAYOUTS else "flat"
+
+    def _post_dir(self, output_dir, base_id, layout):
+        """Directory a post's files are written to under the given layout."""
+        bucket = _post_bucket(base_id) if layout == "bucketed" else None
+        return Path(output_dir) / bucket if bucket else Path(output_dir)
+
+    def migrate_layout(self, output_dir, layout):
+        """
+        Move an account's post files into the given layout and record it, so
+        new downloads follow it too. Files are renamed, keeping their size and
+        mtime, so the index manifest and the thumbnail, hash and verify caches
+        stay valid; build_index afterwards only updates the media paths.
+
+        Args:
+            output_dir: Account directory
+            layout: "flat" or "bucketed"
+
+        Returns:
+            Number of files moved
         """
-        existing = set()
         output_path = Path(output_dir)
         if not output_path.exists():
-            return existing
+            return 0
 
-        for json_file in output_path.glob("*.json"):
-            # Skip non-post files
-            if json_file.name in ("metadata.json", "posts-index.json"):
+        moved = 0
+        for name, (path, _) in sorted(self._scan_account(output_path).items()):
+            if name.startswith(".") or name in NON_POST_FILES or not name.endswith((".json", ".jpg", ".mp4")):
+                continue
+            bucket = _post_bucket(name) if layout == "bucketed" else None
+            target = f"{bucket}/{name}" if bucket else name
+            if target == path:
                 continue
+            (output_path / target).parent.mkdir(parents=True, exist_ok=True)
+            os.replace(output_path / path, output_path / target)
+            moved += 1
+
+        if layout == "flat":
+            # Drop the emptied buckets
+            for month_dir in sorted(output_path.glob("[0-9][0-9][0-9][0-9]/[0-9][0-9]")):
+                for path in (month_dir, month_dir.parent):
+                    try:
+                        path.rmdir()
+                    except OSError:
+                        pass
+
+        tmp_file = output_path / (LAYOUT_FILE + ".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({"layout": layout}, f)
+        os.replace(tmp_file, output_path / LAYOUT_FILE)
+        print(f"✓ {output_dir} uses the {layout} layout ({moved} files moved)")
+        return moved
+
+    def _load_existing_shortcodes(self, output_dir):
+        """
+        Return the set of shortcodes that have already been downloaded.
+
+        Shortcodes come from the on-disk ledger (see _record_shortcode) rather
+        than from parsing every post JSON file. The ledger is checked against a
+        listing of the post JSON files: entries whose file is gone are dropped,
+        and only files missing from the ledger are parsed. A missing ledger is
+        rebuilt from all post JSON files.
+        """
+        output_path = Path(output_dir)
+        if not output_path.exists():
+            return set()
+
+        post_files = {
+            name[:-len(".json")]: path for name, (path, _) in self._scan_account(output_path).items()
+            if name.endswith(".json") and name not in NON_POST_FILES
+        }
+        post_ids = post_files.keys()
+
+        ledger_file = output_path / SHORTCODE_LEDGER
+        ledger, torn = self._read_shortcode_ledger(ledger_file)
+        stale = len(ledger)
+        ledger = {base_id: record for base_id, record in ledger.items() if base_id in post_ids}
+        stale -= len(ledger)
+
+        missing = post_ids - ledger.keys()
+        for base_id in sorted(missing):
             try:
-                with open(json_file, 'r', encoding='utf-8') as f:
+                with open(output_path / post_files[base_id], 'r', encoding='utf-8') as f:
                     data = json.load(f)
                 shortcode = data.get("node", {}).get("shortcode")
-                if shortcode:
-                    existing.add(shortcode)
-            except (json.JSONDecodeError, KeyError):
+            except (json.JSONDecodeError, AttributeError, OSError):
                 continue
+            if shortcode:
+                ledger[base_id] = {"shortcode": shortcode, "base_id": base_id, "position": None, "run": None}
+
+        if missing or stale or torn:
+            if ledger_file.exists():
+                print(f"  Refreshed shortcode ledger ({len(missing)} added, {stale} removed)")
+            self._write_shortcode_ledger(ledger_file, ledger)
+
+        return {record["shortcode"] for record in ledger.values()}
+
+    def _read_shortcode_ledger(self, ledger_file):
+        """
+        Read the shortcode ledger into a dict of base_id -> record (later lines win).
+        Returns (ledger, number of unreadable lines).
+        """
+        ledger = {}
+        torn = 0
+        try:
+            with open(ledger_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        ledger[record["base_id"]] = record
+                    except (json.JSONDecodeError, KeyError, TypeError):
+                        # A torn final line from an interrupted append
+                        torn += 1
+        except OSError:
+            pass
+        return ledger, torn
+
+    def _write_shortcode_ledger(self, ledger_file, ledger):
+        """Rewrite the shortcode ledger compacted, one record per post."""
+        tmp_file = ledger_file.with_name(ledger_file.name + ".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            for base_id in sorted(ledger):
+                f.write(json.dumps(ledger[base_id]) + "\n")
+        os.replace(tmp_file, ledger_file)
+
+    def _record_shortcode(self, output_dir, shortcode, base_id, position, run):
+        """
+        Append a downloaded post to the shortcode ledger.
 
-        return existing
+        Args:
+            output_dir: Account directory
+            shortcode: Instagram shortcode of the post
+            base_id: Filename stem of the post files (e.g. "2024-01-01_07-51-26_UTC")
+            position: Index of the post in the saved feed during this run (0 = newest saved)
+            run: ISO timestamp identifying the crawl that downloaded the post
+        """
+        record = {"shortcode": shortcode, "base_id": base_id, "position": position, "run": run}
+        with open(Path(output_dir) / SHORTCODE_LEDGER, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + "\n")
 
     def update_accounts_list(self, base_dir="saved_posts"):
         """Update accounts.json with all account subdirectories."""
@@ -97,8 +564,38 @@ class InstagramSavedPostsScraper:
             json.dump(accounts, f)
         print(f"Updated accounts.json: {accounts}")
 
-    def sync_to_cloud(self, output_dir="saved_posts"):
-        """Push local saved_posts to cloud storage using rclone."""
+    def _open_sync_target(self):
+        """Open the delta sync target named by SYNC_TARGET, or return None."""
+        spec = os.environ.get('SYNC_TARGET', '')
+        if not spec:
+            return None
+        try:
+            return open_target(spec)
+        except ImportError:
+            print("\nWarning: SYNC_TARGET is an s3:// URL but boto3 is not installed (pip install boto3)")
+            return None
+
+    def sync_to_cloud(self, output_dir="saved_posts", full=False):
+        """
+        Push local saved_posts to cloud storage.
+
+        Uses the native delta sync (see cloud_sync.py) when SYNC_TARGET is set,
+        otherwise a full `rclone sync` to RCLONE_REMOTE. With full=True the
+        delta sync reconciles its manifest against a listing of the target first.
+        """
+        target = self._open_sync_target()
+        if target:
+            print(f"\nSyncing to {target} (delta)...")
+            uploaded, deleted, failed = delta_sync(output_dir, target, full=full)
+            self.metrics.count("sync_uploaded", uploaded)
+            self.metrics.count("sync_deleted", deleted)
+            self.metrics.count("sync_failed", failed)
+            if failed:
+                print(f"✗ Cloud sync incomplete ({uploaded} uploaded, {failed} failed)")
+            else:
+                print(f"✓ Cloud sync complete ({uploaded} uploaded, {deleted} deleted)")
+            return
+
         remote = os.environ.get('RCLONE_REMOTE', '')
         if not remote:
             return
@@ -115,9 +612,26 @@ class InstagramSavedPostsScraper:
             print("✓ Cloud sync complete")
         else:
             print("✗ Cloud sync failed")
+            self.metrics.error("sync", f"rclone exited with status {result.returncode}")
 
     def sync_from_cloud(self, output_dir="saved_posts"):
-        """Pull from cloud storage to local saved_posts using rclone."""
+        """
+        Pull from cloud storage to local saved_posts.
+
+        Downloads only missing or changed objects from SYNC_TARGET when set,
+        otherwise runs `rclone sync` from RCLONE_REMOTE.
+        """
+        target = self._open_sync_target()
+        if target:
+            Path(output_dir).mkdir(parents=True, exist_ok=True)
+            print(f"Pulling from {target} to {output_dir}/...")
+            downloaded, failed = delta_pull(output_dir, target)
+            if failed:
+                print(f"✗ Pull incomplete ({downloaded} downloaded, {failed} failed)")
+                return False
+            print(f"✓ Pull complete ({downloaded} downloaded)")
+            return True
+
         remote = os.environ.get('RCLONE_REMOTE', '')
         if not remote:
             print("Error: RCLONE_REMOTE environment variable not set")
@@ -141,104 +655,834 @@ class InstagramSavedPostsScraper:
             print("✗ Pull failed")
             return False
 
-    def build_index(self, output_dir="saved_posts"):
+    def _iter_index_manifest(self, manifest_file):
+        """
+        Stream the per-file manifest written by the previous build_index run as
+        (post JSON filename, {size, mtime, entry}) pairs in filename order.
+        Yields nothing if the manifest is missing or from another version.
+        """
+        try:
+            with open(manifest_file, 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline() or "{}")
+                if header.get("version") != INDEX_MANIFEST_VERSION:
+                    return
+                for line in f:
+                    record = json.loads(line)
+                    yield record.pop("file"), record
+        except (OSError, json.JSONDecodeError, KeyError):
+            # A damaged manifest only costs re-parsing the files after the damage
+            return
+
+    def _iter_index(self, index_file, chunk_size=1024 * 1024):
+        """Yield the entries of posts-index.json one at a time, without loading the whole file."""
+        decoder = json.JSONDecoder()
+        with open(index_file, 'r', encoding='utf-8') as f:
+            buf = f.read(chunk_size).lstrip()
+            if not buf.startswith("["):
+                raise ValueError(f"{index_file} is not a JSON array")
+            pos = 1
+            while True:
+                pos = INDEX_GAP_RE.match(buf, pos).end()
+                if buf.startswith("]", pos):
+                    return
+                try:
+                    # Entries are objects, so a truncated one never decodes successfully
+                    entry, pos = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        raise
+                    buf = buf[pos:] + chunk
+                    pos = 0
+                    continue
+                yield entry
+
+    def _resolve_index_media(self, entry, files, thumbnails=None):
+        """
+        Point an index entry's media fields at the files that exist locally.
+        files maps filenames to their path relative to the account directory,
+        from one listing of it (see _scan_account), so the paths follow either
+        layout; thumbnails maps image filenames to their thumbnail (see
+        build_thumbnails), or is None when no thumbnails have been generated.
+        Returns True if any field changed.
+        """
+        changed = False
+        for item in [entry] + entry["carouselItems"]:
+            item_id = item["id"]
+            display_url = files.get(f"{item_id}.jpg", "")
+            video_url = files.get(f"{item_id}.mp4", "")
+            if item["displayUrl"] != display_url or item["videoUrl"] != video_url:
+                item["displayUrl"] = display_url
+                item["videoUrl"] = video_url
+                changed = True
+            if thumbnails is not None:
+                thumbnail = thumbnails.get(f"{item_id}.jpg") if display_url else None
+                if item.get("thumbnail", False) != thumbnail:
+                    item["thumbnail"] = thumbnail
+                    changed = True
+            elif "thumbnail" in item:
+                del item["thumbnail"]
+                changed = True
+        return changed
+
+    def _load_thumbnails(self, output_path):
+        """
+        Map image filenames to {url, width, height} of their thumbnail, from the
+        cache written by build_thumbnails. Returns None if there is no cache.
+        """
+        try:
+            with open(output_path / THUMB_CACHE, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        thumbs = cache.get("thumbs", {})
+        thumbnails = {}
+        for name, record in cache.get("files", {}).items():
+            thumb = thumbs.get(record["sha256"])
+            if thumb and thumb["file"]:
+                thumbnails[name] = {"url": thumb["file"], "width": thumb["width"], "height": thumb["height"]}
+        return thumbnails
+
+    def build_thumbnails(self, output_dir="saved_posts", workers=None, max_size=THUMB_MAX_SIZE):
+        """
+        Generate resized WebP thumbnails for every image (post images, video
+        thumbnails and carousel children) in an account directory, using a
+        process pool. Thumbnails are keyed by the source's content hash, and
+        hashes are reused while a file's size and mtime are unchanged, so
+        unchanged media is never reprocessed. build_index picks the results up
+        from the cache and records them in each posts-index.json entry.
+
+        Args:
+            output_dir: Account directory
+            workers: Number of worker processes (None for one per CPU)
+            max_size: Longest edge of a thumbnail in pixels
+        """
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            print("Warning: thumbnails need Pillow (pip install Pillow), skipping")
+            return
+
+        output_path = Path(output_dir)
+        if not output_path.exists():
+            return
+
+        cache_file = output_path / THUMB_CACHE
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            cache = {}
+        old_files = cache.get("files", {})
+        # Thumbnails rendered at another size are stale; content hashes are still valid
+        thumbs = cache.get("thumbs", {}) if cache.get("maxSize") == max_size else {}
+
+        listing = {name: entry for name, entry in self._scan_account(output_path).items() if name.endswith(".jpg")}
+        paths = {name: path for name, (path, _) in listing.items()}
+        sources = {name: e.stat() for name, (_, e) in listing.items()}
+
+        files = {}
+        to_hash = []
+        for name in sorted(sources):
+            stat = sources[name]
+            cached = old_files.get(name)
+            if cached and cached["size"] == stat.st_size and cached["mtime"] == stat.st_mtime_ns:
+                files[name] = cached
+            else:
+                to_hash.append(name)
+
+        thumb_dir = output_path / THUMB_DIR
+        thumb_dir.mkdir(exist_ok=True)
+        rendered = 0
+        failed = 0
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            if to_hash:
+                digests = pool.map(hash_file, [str(output_path / paths[name]) for name in to_hash],
+                                   chunksize=max(1, len(to_hash) // 64))
+                for name, digest in zip(to_hash, digests):
+                    stat = sources[name]
+                    files[name] = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "sha256": digest}
+
+            # One render per distinct content hash that has no thumbnail yet
+            needed = {}
+            for name, record in files.items():
+                digest = record["sha256"]
+                thumb = thumbs.get(digest)
+                if thumb and (thumb["file"] is None or (output_path / thumb["file"]).exists()):
+                    continue
+                needed.setdefault(digest, name)
+
+            if needed:
+                digests = list(needed)
+                results = pool.map(
+                    _render_thumbnail,
+                    [str(output_path / paths[needed[d]]) for d in digests],
+                    [str(thumb_dir / f"{d[:24]}.webp") for d in digests],
+                    [max_size] * len(digests),
+                    chunksize=max(1, len(digests) // 64),
+                )
+                for digest, size in zip(digests, results):
+                    if size is None:
+                        # Remember undecodable content so it isn't retried until the file changes
+                        thumbs[digest] = {"file": None}
+                        failed += 1
+                        continue
+                    thumbs[digest] = {"file": f"{THUMB_DIR}/{digest[:24]}.webp", "width": size[0], "height": size[1]}
+                    rendered += 1
+
+        # Drop thumbnails whose source image is gone
+        referenced = {record["sha256"] for record in files.values()}
+        thumbs = {digest: thumb for digest, thumb in thumbs.items() if digest in referenced}
+        keep = {Path(thumb["file"]).name for thumb in thumbs.values() if thumb["file"]}
+        for thumb_file in thumb_dir.glob("*.webp"):
+            if thumb_file.name not in keep:
+                thumb_file.unlink()
+
+        tmp_file = cache_file.with_name(cache_file.name + ".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({"version": 1, "maxSize": max_size, "files": files, "thumbs": thumbs}, f)
+        os.replace(tmp_file, cache_file)
+
+        print(f"✓ Thumbnails up to date ({len(files)} images, {len(to_hash)} hashed, "
+              f"{rendered} generated{f', {failed} failed' if failed else ''})")
+
+    def build_index(self, output_dir="saved_posts", rebuild=False, workers=1, shard_size=None,
+                    sqlite_db=False, facets=False, columnar=False):
         """
         Build posts-index.json from all post JSON files in the output directory.
         Pre-computes everything the frontend needs so the hosted app loads instantly.
+
+        Index entries are cached in a per-file manifest keyed by size and mtime,
+        so only new or changed post files are re-parsed, deleted ones are dropped,
+        and posts-index.json is only rewritten when something actually changed.
+        Entries are streamed to a temporary file and renamed into place, so
+        memory use doesn't grow with the number of posts.
+
+        Args:
+            output_dir: Account directory containing the post JSON files
+            rebuild: If True, ignore the manifest and re-parse every post file
+            workers: Number of processes parsing post files; the output is identical
+                to a serial build since entries are merged in sorted filename order
+            shard_size: If set, also write newest-first paginated shards of this size
+                with precompressed copies (see _write_index_shards)
+            sqlite_db: If True, also write posts-index.db with full-text search (see index_db.py)
+            facets: If True, also write hashtag/owner/location/month facet indexes
+                (see _write_index_facets)
+            columnar: If True, also write posts-index.col, a compact memory-mappable
+                copy for server-side queries (see index_columnar.py)
         """
         output_path = Path(output_dir)
         if not output_path.exists():
             return
 
-        hashtag_re = re.compile(r'#[\w\u00C0-\u024F\u1E00-\u1EFF]+')
-        posts = []
+        index_file = output_path / "posts-index.json"
+        manifest_file = output_path / INDEX_MANIFEST
+        dumps, separator = _index_json_encoder()
+
+        # One listing of the account serves every media lookup, instead of a stat per file.
+        # Files the last verify run found broken count as missing until they change.
+        broken = self._load_broken_files(output_path)
+        files = {
+            name: path for name, (path, e) in self._scan_account(output_path).items()
+            if not (name in broken and broken[name] == (e.stat().st_size, e.stat().st_mtime_ns))
+        }
+        post_files = sorted(name for name in files if name.endswith(".json") and name not in NON_POST_FILES)
+
+        thumbnails = self._load_thumbnails(output_path)
+        parsed = 0
+        removed = 0
+
+        def cached_entries():
+            """Merge-join the sorted post files with the sorted manifest: (name, stat, entry or None, cached)."""
+            nonlocal removed
+            old_records = iter(()) if rebuild else self._iter_index_manifest(manifest_file)
+            old_name, old_record = next(old_records, (None, None))
+            for name in post_files:
+                while old_name is not None and old_name < name:
+                    removed += 1
+                    old_name, old_record = next(old_records, (None, None))
+                stat = (output_path / files[name]).stat()
+                if old_name != name:
+                    yield name, stat, None, False
+                    continue
+                if old_record["size"] == stat.st_size and old_record["mtime"] == stat.st_mtime_ns:
+                    yield name, stat, old_record["entry"], True
+                else:
+                    yield name, stat, None, False
+                old_name, old_record = next(old_records, (None, None))
+            if old_name is not None:
+                removed += 1 + sum(1 for _ in old_records)
+
+        def resolved_entries(pool):
+            """Fill in entries that need parsing, a window at a time, preserving filename order."""
+            nonlocal parsed
+            records = cached_entries()
+            while True:
+                window = list(itertools.islice(records, INDEX_WINDOW))
+                if not window:
+                    return
+                to_parse = [name for name, _, _, cached in window if not cached]
+                if pool is not None and len(to_parse) >= PARALLEL_INDEX_MIN_FILES:
+                    # Shard the window across processes; map() returns results in input order
+                    chunksize = max(1, len(to_parse) // (workers * 8))
+                    parsed_entries = dict(zip(to_parse, pool.map(
+                        _build_index_entry, [str(output_path / files[name]) for name in to_parse],
+                        chunksize=chunksize)))
+                else:
+                    parsed_entries = {name: _build_index_entry(output_path / files[name]) for name in to_parse}
+                parsed += len(to_parse)
+                for name, stat, entry, cached in window:
+                    yield name, stat, entry if cached else parsed_entries[name]
+
+        # Entries stream straight into temporary files, so memory stays flat however
+        # large the account is; they replace the real files only if something changed.
+        tmp_index = index_file.with_name(index_file.name + ".tmp")
+        tmp_manifest = manifest_file.with_name(manifest_file.name + ".tmp")
+        count = 0
+        changed = False
+        pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            with open(tmp_index, 'w', encoding='utf-8') as index_out, \
+                    open(tmp_manifest, 'w', encoding='utf-8') as manifest_out:
+                index_out.write("[")
+                manifest_out.write(json.dumps({"version": INDEX_MANIFEST_VERSION}) + "\n")
+                for name, stat, entry in resolved_entries(pool):
+                    if entry is not None:
+                        # Media can land (or vanish) without the post JSON changing
+                        if self._resolve_index_media(entry, files, thumbnails):
+                            changed = True
+                        index_out.write((separator if count else "") + dumps(entry))
+                        count += 1
+                    record = {"file": name, "size": stat.st_size, "mtime": stat.st_mtime_ns, "entry": entry}
+                    manifest_out.write(dumps(record) + "\n")
+                index_out.write("]")
+        except BaseException:
+            for tmp_file in (tmp_index, tmp_manifest):
+                if tmp_file.exists():
+                    tmp_file.unlink()
+            raise
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        # Gauges: the index may be rebuilt several times in one run (metadata-first crawls)
+        self.metrics.set("index_posts", count)
+        self.metrics.set("index_parsed", parsed)
+        self.metrics.set("index_removed", removed)
+        index_changed = parsed or removed or changed or not index_file.exists()
+        if index_changed:
+            os.replace(tmp_index, index_file)
+            os.replace(tmp_manifest, manifest_file)
+            print(f"✓ Built posts-index.json ({count} posts, {parsed} parsed, {removed} removed)")
+            # Precomputed matches miss the new posts; build_duplicates writes fresh ones,
+            # and without them the web app detects duplicates from the index itself
+            duplicates_file = output_path / DUPLICATES_FILE
+            if duplicates_file.exists():
+                duplicates_file.unlink()
+        else:
+            tmp_index.unlink()
+            tmp_manifest.unlink()
+            print(f"✓ posts-index.json is up to date ({count} posts)")
+
+        if shard_size:
+            # Pages are sorted newest-first, which needs every entry at once
+            self._write_index_shards(list(self._iter_index(index_file)), output_path, shard_size, index_changed)
+
+        if facets:
+            self._write_index_facets(self._iter_index(index_file), output_path, index_changed)
+
+        if sqlite_db:
+            db_path = output_path / INDEX_DB
+            if index_changed or not db_path.exists():
+                write_index_db(self._iter_index(index_file), db_path)
+                print(f"✓ Built {INDEX_DB} ({count} posts)")
+
+        if columnar:
+            columnar_path = output_path / INDEX_COLUMNAR
+            if index_changed or not columnar_path.exists():
+                write_index_columnar(self._iter_index(index_file), columnar_path)
+                print(f"✓ Built {INDEX_COLUMNAR} ({count} posts, {columnar_path.stat().st_size // 1024} KB "
+                      f"vs {index_file.stat().st_size // 1024} KB of JSON)")
+
+    def _caption_duplicates(self, posts):
+        """
+        Same-owner duplicates by caption and time, as the API used to compute per
+        request: identical caption within an hour, or >80% word overlap within a day.
+        """
+        def parse_time(post_id):
+            try:
+                return datetime.strptime(post_id[:19], "%Y-%m-%d_%H-%M-%S")
+            except ValueError:
+                return None
+
+        def similarity(a, b):
+            if not a or not b:
+                return 0
+            if a == b:
+                return 1
+            words1 = set(re.split(r'\s+', a.lower()))
+            words2 = set(re.split(r'\s+', b.lower()))
+            union = len(words1 | words2)
+            return len(words1 & words2) / union if union else 0
+
+        by_owner = {}
+        for post in posts:
+            by_owner.setdefault(post["owner"], []).append((post, parse_time(post["id"])))
+
+        matches = []
+        for owner_posts in by_owner.values():
+            for i, (p1, t1) in enumerate(owner_posts):
+                for p2, t2 in owner_posts[i + 1:]:
+                    if t1 is None or t2 is None:
+                        continue
+                    time_diff = abs((t1 - t2).total_seconds())
+                    if p1["caption"] == p2["caption"] and time_diff < 3600:
+                        matches.append({
+                            "postIds": [p1["id"], p2["id"]],
+                            "matchScore": 100,
+                            "reason": "Exact: same owner, caption, and time (within 1 hour)",
+                            "matchType": "exact",
+                        })
+                    elif time_diff < 86400:
+                        score = similarity(p1["caption"], p2["caption"])
+                        if score > 0.8:
+                            matches.append({
+                                "postIds": [p1["id"], p2["id"]],
+                                "matchScore": round(score * 100),
+                                "reason": "Similar: same owner, similar caption, within 24h",
+                                "matchType": "similar",
+                            })
+        return matches
+
+    def build_duplicates(self, output_dir="saved_posts", max_distance=PHASH_MAX_DISTANCE, workers=None):
+        """
+        Precompute duplicates.json next to posts-index.json.
 
-        for json_file in sorted(output_path.glob("*.json")):
-            if json_file.name in ("metadata.json", "posts-index.json"):
-                continue
+        Each post's primary image (its .jpg, or the first carousel image) gets a
+        perceptual hash, computed in a process pool and cached by file size and
+        mtime in .phash.json. Near-identical images are found with a BK-tree
+        lookup per distinct hash instead of comparing every pair, which also
+        catches reposts by different owners. The file holds the image clusters
+        plus pairwise matches in the shape /api/duplicates returns, merged with
+        the same-owner caption matches the API used to compute on every request.
 
+        Args:
+            output_dir: Account directory containing posts-index.json
+            max_distance: Largest Hamming distance between hashes counted as a duplicate
+            workers: Number of worker processes (None for one per CPU)
+        """
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            print("Warning: duplicate detection needs Pillow (pip install Pillow), skipping")
+            return
+
+        output_path = Path(output_dir)
+        index_file = output_path / "posts-index.json"
+        if not index_file.exists():
+            return
+        with open(index_file, 'r', encoding='utf-8') as f:
+            posts = json.load(f)
+
+        primary = {}
+        for post in posts:
+            image = post["displayUrl"] or next(
+                (item["displayUrl"] for item in post["carouselItems"] if item["displayUrl"]), "")
+            if image:
+                primary[post["id"]] = image
+
+        cache_file = output_path / PHASH_CACHE
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                old_cache = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            old_cache = {}
+
+        # Keyed by filename rather than path, so moving to another layout keeps the hashes
+        cache = {}
+        to_hash = []
+        for image in sorted(set(primary.values())):
             try:
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-            except (json.JSONDecodeError, KeyError):
+                stat = (output_path / image).stat()
+            except OSError:
                 continue
+            name = image.rsplit("/", 1)[-1]
+            cached = old_cache.get(name)
+            if cached and cached["size"] == stat.st_size and cached["mtime"] == stat.st_mtime_ns:
+                cache[name] = cached
+            else:
+                to_hash.append((image, stat))
+
+        if to_hash:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                hashes = pool.map(_perceptual_hash, [str(output_path / image) for image, _ in to_hash],
+                                  chunksize=max(1, len(to_hash) // 64))
+                for (image, stat), phash in zip(to_hash, hashes):
+                    cache[image.rsplit("/", 1)[-1]] = {"size": stat.st_size, "mtime": stat.st_mtime_ns,
+                                                       "phash": phash}
+
+        tmp_file = cache_file.with_name(cache_file.name + ".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        os.replace(tmp_file, cache_file)
+
+        # Group posts by hash, then look up each distinct hash's neighbours once
+        by_hash = {}
+        for post_id, image in primary.items():
+            phash = cache.get(image.rsplit("/", 1)[-1], {}).get("phash")
+            if phash:
+                by_hash.setdefault(int(phash, 16), []).append(post_id)
+
+        tree = _BKTree()
+        for value in by_hash:
+            tree.add(value)
+
+        parent = {post_id: post_id for ids in by_hash.values() for post_id in ids}
+
+        def find(post_id):
+            while parent[post_id] != post_id:
+                parent[post_id] = parent[parent[post_id]]
+                post_id = parent[post_id]
+            return post_id
+
+        matches = {}
+        for value, ids in by_hash.items():
+            for other, distance in tree.search(value, max_distance):
+                if other < value:
+                    continue  # each pair of hashes once
+                other_ids = ids if other == value else by_hash[other]
+                for a in ids:
+                    for b in other_ids:
+                        if a >= b and other == value:
+                            continue
+                        parent[find(a)] = find(b)
+                        pair = tuple(sorted((a, b)))
+                        matches[pair] = {
+                            "postIds": list(pair),
+                            "matchScore": round(100 * (1 - distance / 64)),
+                            "reason": "Same image (matching perceptual hash)" if distance == 0
+                                      else f"Similar image (hash distance {distance})",
+                            "matchType": "exact" if distance == 0 else "similar",
+                        }
+
+        # For a pair found both ways the higher score wins; on a tie the caption
+        # match replaces the image match, so its wording is the one shown
+        for match in self._caption_duplicates(posts):
+            pair = tuple(sorted(match["postIds"]))
+            if pair not in matches or matches[pair]["matchScore"] <= match["matchScore"]:
+                matches[pair] = match
+
+        clusters = {}
+        for post_id in parent:
+            clusters.setdefault(find(post_id), []).append(post_id)
+        clusters = sorted((sorted(ids) for ids in clusters.values() if len(ids) > 1),
+                          key=lambda ids: (-len(ids), ids[0]))
+
+        duplicates = {
+            "version": 1,
+            "maxDistance": max_distance,
+            "clusters": [{"postIds": ids} for ids in clusters],
+            "matches": sorted(matches.values(), key=lambda m: (-m["matchScore"], m["postIds"])),
+        }
+        duplicates_file = output_path / DUPLICATES_FILE
+        data = json.dumps(duplicates, ensure_ascii=False)
+        if not duplicates_file.exists() or duplicates_file.read_text(encoding='utf-8') != data:
+            duplicates_file.write_text(data, encoding='utf-8')
+
+        print(f"✓ Wrote {DUPLICATES_FILE} ({len(clusters)} image clusters, {len(matches)} matches, "
+              f"{len(to_hash)} images hashed)")
+
+    def _write_index_facets(self, posts, output_path, index_changed=True):
+        """
+        Write inverted facet indexes to posts-facets/: hashtags.json, owners.json,
+        locations.json and months.json. Each maps a facet value to its post count
+        and the sorted ordinals (positions in posts-index.json) of its posts,
+        ordered by count, so filters and facet counts never walk the full index.
+        """
+        facet_dir = output_path / FACETS_DIR
+        facet_names = ("hashtags", "owners", "locations", "months")
+        if not index_changed and all((facet_dir / f"{name}.json").exists() for name in facet_names):
+            return
 
-            node = data.get("node", {})
-            if not node:
-                continue
+        hashtags = {}
+        owners = {}
+        locations = {}
+        months = {}
+        location_names = {}
+        for ordinal, post in enumerate(posts):
+            for tag in dict.fromkeys(post["hashtags"]):
+                hashtags.setdefault(tag, []).append(ordinal)
+            owners.setdefault(post["owner"], []).append(ordinal)
+            if post["locationDetails"]:
+                location_id = str(post["locationDetails"]["id"])
+                locations.setdefault(location_id, []).append(ordinal)
+                location_names[location_id] = post["locationDetails"]["name"]
+            months.setdefault(post["id"][:7], []).append(ordinal)  # "2024-01-01_..." -> "2024-01"
+
+        def facet(index, extra=None):
+            ranked = sorted(index.items(), key=lambda kv: (-len(kv[1]), kv[0]))
+            return {
+                key: {**(extra(key) if extra else {}), "count": len(ordinals), "posts": ordinals}
+                for key, ordinals in ranked
+            }
+
+        facet_dir.mkdir(exist_ok=True)
+        outputs = {
+            "hashtags": facet(hashtags),
+            "owners": facet(owners),
+            "locations": facet(locations, lambda key: {"name": location_names[key]}),
+            # Months read naturally in date order rather than by count
+            "months": {key: {"count": len(months[key]), "posts": months[key]} for key in sorted(months)},
+        }
+        for name, data in outputs.items():
+            with open(facet_dir / f"{name}.json", 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+
+        print(f"✓ Wrote {FACETS_DIR}/ ({len(hashtags)} hashtags, {len(owners)} owners, "
+              f"{len(locations)} locations, {len(months)} months)")
+
+    def _write_index_shards(self, posts, output_path, shard_size, index_changed=True):
+        """
+        Write posts-index/ alongside posts-index.json: the same entries sorted
+        newest-first and split into fixed-size pages, each with precompressed
+        .gz (and .br, if brotli is installed) copies, plus a small manifest.json
+        listing counts, page boundaries and content hashes. Pages whose content
+        is unchanged are not rewritten, so their mtimes (and cloud copies) stay put.
+        """
+        shard_dir = output_path / INDEX_SHARD_DIR
+        shard_manifest_file = shard_dir / "manifest.json"
+        try:
+            with open(shard_manifest_file, 'r', encoding='utf-8') as f:
+                old_shard_manifest = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            old_shard_manifest = {}
+        if not index_changed and old_shard_manifest.get("shardSize") == shard_size:
+            return
 
-            base_id = json_file.stem  # e.g. "2024-01-01_07-51-26_UTC"
-            caption = ""
-            caption_edges = node.get("edge_media_to_caption", {}).get("edges", [])
-            if caption_edges:
-                caption = caption_edges[0].get("node", {}).get("text", "")
-
-            hashtags = [t.lower() for t in hashtag_re.findall(caption)]
-            is_video = node.get("__typename") == "GraphVideo"
-            is_carousel = node.get("__typename") == "GraphSidecar"
-
-            # Check which media files exist locally
-            has_jpg = (output_path / f"{base_id}.jpg").exists()
-            has_mp4 = (output_path / f"{base_id}.mp4").exists()
-
-            # Carousel items
-            carousel_items = []
-            if is_carousel:
-                edges = node.get("edge_sidecar_to_children", {}).get("edges", [])
-                for idx, edge in enumerate(edges):
-                    item = edge.get("node", {})
-                    item_id = f"{base_id}_{idx + 1}"
-                    item_is_video = item.get("__typename") == "GraphVideo"
-                    carousel_items.append({
-                        "id": item_id,
-                        "displayUrl": f"{item_id}.jpg" if (output_path / f"{item_id}.jpg").exists() else "",
-                        "isVideo": item_is_video,
-                        "videoUrl": f"{item_id}.mp4" if (output_path / f"{item_id}.mp4").exists() else "",
-                        "altText": item.get("accessibility_caption", ""),
-                        "dimensions": item.get("dimensions", {"width": 0, "height": 0}),
-                    })
-
-            # Tagged users
-            tagged_users = []
-            for edge in node.get("edge_media_to_tagged_user", {}).get("edges", []):
-                user = edge.get("node", {}).get("user", {})
-                tagged_users.append({
-                    "username": user.get("username", ""),
-                    "fullName": user.get("full_name", ""),
-                })
-
-            posts.append({
-                "id": base_id,
-                "filename": json_file.name,
-                "timestamp": base_id,
-                "caption": caption,
-                "postUrl": f"https://www.instagram.com/p/{node.get('shortcode', '')}/",
-                "displayUrl": f"{base_id}.jpg" if has_jpg else "",
-                "isVideo": is_video,
-                "videoUrl": f"{base_id}.mp4" if has_mp4 else "",
-                "owner": node.get("owner", {}).get("username", "unknown"),
-                "location": (node.get("location") or {}).get("name"),
-                "hashtags": hashtags,
-                "isCarousel": is_carousel,
-                "carouselItems": carousel_items,
-                "altText": node.get("accessibility_caption", ""),
-                "taggedUsers": tagged_users,
-                "engagement": {
-                    "likes": node.get("edge_liked_by", {}).get("count", 0),
-                    "comments": node.get("edge_media_to_comment", {}).get("count", 0),
-                },
-                "locationDetails": {
-                    "id": node["location"]["id"],
-                    "name": node["location"]["name"],
-                    "slug": node["location"].get("slug"),
-                } if node.get("location") else None,
-            })
+        try:
+            import brotli
+        except ImportError:
+            brotli = None
+
+        shard_dir.mkdir(exist_ok=True)
+        old_hashes = {shard["file"]: shard["sha256"] for shard in old_shard_manifest.get("shards", [])}
+        newest_first = sorted(posts, key=lambda p: p["id"], reverse=True)
+        shards = []
+        written = 0
+
+        for start in range(0, len(newest_first), shard_size):
+            page = newest_first[start:start + shard_size]
+            name = f"page-{len(shards):04d}.json"
+            data = json.dumps(page, ensure_ascii=False).encode('utf-8')
+            digest = hashlib.sha256(data).hexdigest()
+            shard = {
+                "file": name,
+                "count": len(page),
+                "offset": start,
+                "newest": page[0]["id"],
+                "oldest": page[-1]["id"],
+                "sha256": digest,
+                "bytes": len(data),
+                "gzip": f"{name}.gz",
+            }
+            if brotli:
+                shard["brotli"] = f"{name}.br"
+
+            missing = any(not (shard_dir / f).exists() for f in (name, shard["gzip"], shard.get("brotli", name)))
+            if old_hashes.get(name) != digest or missing:
+                (shard_dir / name).write_bytes(data)
+                (shard_dir / shard["gzip"]).write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+                if brotli:
+                    (shard_dir / shard["brotli"]).write_bytes(brotli.compress(data, quality=11))
+                written += 1
+            shards.append(shard)
+
+        # Remove pages (and compressed copies) beyond the new last page
+        current = {f for shard in shards for f in (shard["file"], shard["gzip"], shard.get("brotli"))}
+        for stale in shard_dir.glob("page-*"):
+            if stale.name not in current:
+                stale.unlink()
+
+        shard_manifest = {
+            "version": 1,
+            "total": len(newest_first),
+            "shardSize": shard_size,
+            "order": "newest-first",
+            "shards": shards,
+        }
+        with open(shard_manifest_file, 'w', encoding='utf-8') as f:
+            json.dump(shard_manifest, f, ensure_ascii=False, indent=2)
+
+        print(f"✓ Wrote {INDEX_SHARD_DIR}/ ({len(shards)} pages of {shard_size}, {written} updated)")
+
+    def _load_broken_files(self, output_path):
+        """Map filenames the last verify run found broken to their (size, mtime) at the time."""
+        try:
+            with open(output_path / VERIFY_CACHE, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+        if cache.get("version") != VERIFY_CACHE_VERSION:
+            return {}
+        return {name: (record["size"], record["mtime"])
+                for name, record in cache.get("files", {}).items() if record["status"] != "ok"}
+
+    def verify_media(self, output_dir="saved_posts", workers=None, deep=False):
+        """
+        Check every post JSON and media file in an account directory for
+        truncation and corruption (see media_verify.py), using a process pool.
+        Results and content hashes are cached by size and mtime, so later runs
+        only check new or changed files. Also reports media that a post's JSON
+        lists but that isn't on disk. Writes the findings to .verify-report.json.
 
-        index_file = output_path / "posts-index.json"
-        with open(index_file, 'w', encoding='utf-8') as f:
-            json.dump(posts, f, ensure_ascii=False)
+        Args:
+            output_dir: Account directory
+            workers: Number of worker processes (None for one per CPU)
+            deep: If True, re-check and re-hash every file; a file whose contents
+                changed while its size and mtime didn't is reported as corrupt
+
+        Returns:
+            Dict of post base_id -> {shortcode, problems} for every broken post
+            (shortcode is None when it can't be recovered)
+        """
+        output_path = Path(output_dir)
+        if not output_path.exists():
+            return {}
 
-        print(f"✓ Built posts-index.json ({len(posts)} posts)")
+        cache_file = output_path / VERIFY_CACHE
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            cache = {}
+        old_files = cache.get("files", {}) if cache.get("version") == VERIFY_CACHE_VERSION else {}
+
+        listing = {
+            name: entry for name, entry in self._scan_account(output_path).items()
+            if not name.startswith(".") and name not in NON_POST_FILES and name.endswith((".json", ".jpg", ".mp4"))
+        }
+        paths = {name: path for name, (path, _) in listing.items()}
+        sources = {name: e.stat() for name, (_, e) in listing.items()}
+
+        files = {}
+        to_check = []
+        for name in sorted(sources):
+            stat = sources[name]
+            cached = old_files.get(name)
+            if not deep and cached and cached["size"] == stat.st_size and cached["mtime"] == stat.st_mtime_ns:
+                files[name] = cached
+            else:
+                to_check.append(name)
+
+        if to_check:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = pool.map(verify_file, [str(output_path / paths[name]) for name in to_check],
+                                   chunksize=max(1, len(to_check) // 64))
+                for name, result in zip(to_check, results):
+                    stat = sources[name]
+                    cached = old_files.get(name)
+                    if (result["status"] == "ok" and cached and cached.get("sha256")
+                            and cached["size"] == stat.st_size and cached["mtime"] == stat.st_mtime_ns
+                            and cached["sha256"] != result["sha256"]):
+                        # Keep the known-good hash, so the file stays flagged until it is replaced
+                        result.update(status="corrupt", detail="contents changed without a new size or mtime",
+                                      sha256=cached["sha256"])
+                    files[name] = {"size": stat.st_size, "mtime": stat.st_mtime_ns, **result}
+
+        tmp_file = cache_file.with_name(cache_file.name + ".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({"version": VERIFY_CACHE_VERSION, "files": files}, f)
+        os.replace(tmp_file, cache_file)
+
+        # Group problems by post: media files belong to the post JSON they share a stem
+        # with. Problem files are paths relative to the account directory; missing
+        # files are expected next to the files of their post.
+        post_ids = {name[:-len(".json")] for name in files if name.endswith(".json")}
+        # Media still queued by a metadata-first crawl isn't missing, just not downloaded yet
+        queued = MediaQueue(output_path / MEDIA_QUEUE).files() if (output_path / MEDIA_QUEUE).exists() else set()
+        problems = {}
+        for name, record in files.items():
+            stem = name.rsplit(".", 1)[0]
+            base_id = stem if stem in post_ids else CAROUSEL_SUFFIX_RE.sub("", stem)
+            directory = paths[name][:-len(name)]
+            if base_id not in post_ids:
+                problems.setdefault(base_id, []).append({"file": f"{directory}{base_id}.json", "status": "missing",
+                                                         "detail": "media without a post JSON file"})
+                post_ids.add(base_id)
+            if record["status"] != "ok":
+                problems.setdefault(base_id, []).append(
+                    {"file": paths[name], "status": record["status"], "detail": record["detail"]})
+            for media in record.get("media", ()):
+                if media not in files and media not in queued:
+                    problems.setdefault(base_id, []).append({"file": f"{directory}{media}", "status": "missing",
+                                                             "detail": "listed in the post JSON but not on disk"})
+
+        # Shortcodes come from intact post JSON files, else from the shortcode ledger
+        ledger, _ = self._read_shortcode_ledger(output_path / SHORTCODE_LEDGER)
+        broken = {}
+        for base_id in sorted(problems):
+            record = files.get(f"{base_id}.json", {})
+            shortcode = record.get("shortcode") or ledger.get(base_id, {}).get("shortcode")
+            broken[base_id] = {"shortcode": shortcode, "problems": problems[base_id]}
+
+        report = {
+            "verified": datetime.now().isoformat(timespec='seconds'),
+            "deep": deep,
+            "files": len(files),
+            "checked": len(to_check),
+            "brokenPosts": len(broken),
+            "broken": [{"id": base_id, **post} for base_id, post in broken.items()],
+        }
+        tmp_file = output_path / (VERIFY_REPORT + ".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, output_path / VERIFY_REPORT)
+
+        self.metrics.count("media_verified", len(to_check))
+        self.metrics.count("media_broken", sum(len(p) for p in problems.values()))
+        print(f"✓ Verified {len(files)} files ({len(to_check)} checked, "
+              f"{len(files) - len(to_check)} unchanged since the last run)")
+        if broken:
+            print(f"✗ {len(broken)} posts have broken or missing files (see {output_path / VERIFY_REPORT}):")
+            for base_id, post in list(broken.items())[:20]:
+                for problem in post["problems"]:
+                    print(f"    {problem['file']}: {problem['status']} — {problem['detail']}")
+            if len(broken) > 20:
+                print(f"    ... and {len(broken) - 20} more posts")
+        return broken
+
+    def refetch_posts(self, output_dir, broken):
+        """
+        Re-download broken posts by shortcode, as found by verify_media.
+        Only the broken files are removed; instaloader keeps the intact ones.
+
+        Returns:
+            Number of posts re-downloaded
+        """
+        run = datetime.now().isoformat(timespec='seconds')
+        ledger_lock = threading.Lock()
+        layout = self._load_layout(output_dir)
+        refetched = 0
+        for base_id, post in broken.items():
+            if not post["shortcode"]:
+                print(f"  ✗ {base_id}: shortcode unknown, can't re-download")
+                continue
+            try:
+                instagram_post = instaloader.Post.from_shortcode(self.loader.context, post["shortcode"])
+                for problem in post["problems"]:
+                    path = Path(output_dir) / problem["file"]
+                    if problem["status"] != "missing" and path.exists():
+                        path.unlink()
+                self._download_post(instagram_post, output_dir, None, run, ledger_lock, layout)
+            except Exception as e:
+                self.metrics.error("refetch", f"{post['shortcode']}: {e}")
+                print(f"  ✗ {base_id} ({post['shortcode']}): {e}")
+                continue
+            refetched += 1
+            print(f"  ✓ Re-downloaded {base_id} ({post['shortcode']})")
+        self.metrics.count("posts_refetched", refetched)
+        return refetched
 
     def login(self, username=None, password=None):
         """
@@ -297,18 +1541,271 @@ class InstagramSavedPostsScraper:
             print(f"Error during login: {str(e)}")
             return False
 
-    def get_saved_posts(self, output_dir="saved_posts", limit=None, full_resync=False):
+    def _load_crawl_checkpoint(self, checkpoint_file):
+        """Return the saved crawl checkpoint, or None if missing, unreadable or expired."""
+        try:
+            with open(checkpoint_file, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+            frozen = instaloader.FrozenNodeIterator(**checkpoint["iterator"])
+        except (OSError, json.JSONDecodeError, KeyError, TypeError):
+            return None
+        if checkpoint.get("version") != CRAWL_CHECKPOINT_VERSION:
+            return None
+        if frozen.best_before and datetime.fromtimestamp(frozen.best_before) < datetime.now():
+            # The stored page holds media URLs that have expired by now
+            print("  Crawl checkpoint is too old to resume, starting over")
+            return None
+        checkpoint["iterator"] = frozen
+        return checkpoint
+
+    def _write_crawl_checkpoint(self, checkpoint_file, frozen, counters):
+        """Atomically write the frozen saved-posts iterator and run counters."""
+        tmp_file = checkpoint_file.with_name(checkpoint_file.name + ".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({"version": CRAWL_CHECKPOINT_VERSION, "iterator": frozen._asdict(), **counters}, f)
+        os.replace(tmp_file, checkpoint_file)
+
+    def _load_sync_watermark(self, watermark_file):
+        """Return the watermark entries ({shortcode, position}, newest first), or [] if there is none."""
+        try:
+            with open(watermark_file, 'r', encoding='utf-8') as f:
+                watermark = json.load(f)
+            return [entry for entry in watermark["entries"] if entry.get("shortcode")]
+        except (OSError, json.JSONDecodeError, KeyError, TypeError):
+            return []
+
+    def _write_sync_watermark(self, watermark_file, entries, run):
+        tmp_file = watermark_file.with_name(watermark_file.name + ".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({"run": run, "entries": entries}, f, indent=2)
+        os.replace(tmp_file, watermark_file)
+
+    def _post_media_jobs(self, post, base):
+        """
+        (url, path, mtime) for each media file of a post, in the file layout of
+        Instaloader.download_post: {base_id}.jpg/.mp4, and {base_id}_{n}.jpg/.mp4
+        for carousel children.
+        """
+        mtime = post.date_local
+        jobs = []
+        if post.typename == 'GraphSidecar':
+            for idx, node in enumerate(post.get_sidecar_nodes(), 1):
+                jobs.append((node.display_url, f"{base}_{idx}.jpg", mtime))
+                if node.is_video:
+                    jobs.append((node.video_url, f"{base}_{idx}.mp4", mtime))
+        else:
+            jobs.append((post.url, f"{base}.jpg", mtime))
+            if post.is_video:
+                jobs.append((post.video_url, f"{base}.mp4", mtime))
+        return jobs
+
+    def _fetch_post_media(self, post, output_dir):
+        """
+        Download a post's media through the async media fetcher (carousel
+        children concurrently), then save its JSON.
+        """
+        base = Path(output_dir) / self.loader.format_filename(post, target=Path(output_dir))
+        self.media_fetcher.download(self._post_media_jobs(post, base))
+        # JSON last, so a post only counts as downloaded once all its media is on disk
+        self.loader.save_metadata_json(str(base), post)
+
+    def _queue_post_media(self, post, base_id, media_queue):
+        """Queue a post's media files for download_queued_media instead of downloading them."""
+        taken = post.date_local.timestamp()
+        media_queue.add({"file": name, "url": url, "shortcode": post.shortcode, "taken": taken}
+                        for url, name, _ in self._post_media_jobs(post, base_id))
+
+    def _download_post(self, post, output_dir, position, run, ledger_lock, layout="flat", media_queue=None):
+        """
+        Download a single post, into its bucket when the account uses the
+        bucketed layout, and record it in the shortcode ledger. With a
+        media_queue only the post JSON is saved and the media is queued.
+        Returns the post summary dict. Safe to call from download worker threads.
+        """
+        base_id = self.loader.format_filename(post, target=Path(output_dir))
+        post_dir = self._post_dir(output_dir, base_id, layout)
+        if media_queue is not None:
+            post_dir.mkdir(parents=True, exist_ok=True)
+            # Queued before the JSON is saved, so a post on disk always has its media on disk or queued
+            self._queue_post_media(post, base_id, media_queue)
+            self.loader.save_metadata_json(str(post_dir / base_id), post)
+        elif self.media_fetcher:
+            post_dir.mkdir(parents=True, exist_ok=True)
+            self._fetch_post_media(post, post_dir)
+        else:
+            self.loader.download_post(post, target=post_dir)
+        with ledger_lock:
+            self._record_shortcode(output_dir, post.shortcode, base_id, position, run)
+
+        base = post_dir / base_id
+        paths = [Path(path) for _, path, _ in self._post_media_jobs(post, base)] + [Path(f"{base}.json")]
+        self.metrics.count("bytes_downloaded", sum(path.stat().st_size for path in paths if path.exists()))
+
+        return {
+            'shortcode': post.shortcode,
+            'url': f"https://www.instagram.com/p/{post.shortcode}/",
+            'owner_username': post.owner_username,
+            'caption': post.caption,
+            'date': post.date_utc.isoformat(),
+            'likes': post.likes,
+            'comments': post.comments,
+            'is_video': post.is_video,
+            'video_url': post.video_url if post.is_video else None,
+            'typename': post.typename
+        }
+
+    def _refresh_media_urls(self, output_dir, shortcode, media_queue):
+        """Look a post up again for fresh signed media URLs and update its queued files."""
+        post = instaloader.Post.from_shortcode(self.loader.context, shortcode)
+        base_id = self.loader.format_filename(post, target=Path(output_dir))
+        media_queue.update_urls({name: url for url, name, _ in self._post_media_jobs(post, base_id)})
+
+    def download_queued_media(self, output_dir, media_queue, workers=DEFAULT_DOWNLOAD_WORKERS, async_media=False,
+                              max_per_host=MEDIA_MAX_PER_HOST, host_limits=None, on_progress=None,
+                              progress_interval=MEDIA_INDEX_INTERVAL):
+        """
+        Download the media queued by a metadata-first crawl, newest post first.
+
+        A failed transfer goes back into the queue with a backoff (see
+        media_queue.py). Media whose signed URL is refused, usually because it
+        expired, is retried once right away with fresh URLs from the post.
+        Returns once the queue is drained, except for files waiting out a long
+        backoff, which stay queued for a later run.
+
+        Args:
+            output_dir: Account directory
+            media_queue: The account's MediaQueue
+            workers: Number of download threads
+            async_media: If True, transfer media through a pooled asyncio client (needs aiohttp)
+            max_per_host: Concurrent media transfers per host when async_media is set
+            host_limits: Dict of hostname -> concurrent transfers, overriding max_per_host
+            on_progress: Called on this thread every progress_interval seconds in which
+                files landed, and at the end if any landed since, e.g. to update the index
+            progress_interval: Seconds between progress reports
+
+        Returns:
+            Number of files downloaded
+        """
+        layout = self._load_layout(output_dir)
+        fetcher = None
+        if async_media:
+            try:
+                from media_fetcher import MediaFetcher
+                fetcher = MediaFetcher(max_per_host=max_per_host, host_limits=host_limits,
+                                       user_agent=self.loader.context.user_agent)
+                fetcher.start()
+            except ImportError:
+                print("Warning: --async-media needs aiohttp (pip install aiohttp), using instaloader downloads\n")
+                fetcher = None
+
+        lock = threading.Lock()
+        downloaded = 0
+        refreshed = set()
+
+        def fetch(record):
+            name = record["file"]
+            path = self._post_dir(output_dir, name, layout) / name
+            if path.exists():
+                return None
+            path.parent.mkdir(parents=True, exist_ok=True)
+            mtime = datetime.fromtimestamp(record["taken"])
+            if fetcher:
+                fetcher.download([(record["url"], path, mtime)])
+            else:
+                # Written to a temporary file and renamed, so a partial file never appears
+                self.loader.context.write_raw(self.loader.context.get_raw(record["url"]), str(path))
+                os.utime(path, (mtime.timestamp(), mtime.timestamp()))
+            return path.stat().st_size
+
+        def worker():
+            nonlocal downloaded
+            while True:
+                if self.stop_event is not None and self.stop_event.is_set():
+                    return
+                record = media_queue.claim()
+                if record is None:
+                    return
+                started = time.perf_counter()
+                try:
+                    size = fetch(record)
+                except Exception as e:
+                    refused = (isinstance(e, (instaloader.exceptions.QueryReturnedForbiddenException,
+                                              instaloader.exceptions.QueryReturnedNotFoundException))
+                               or getattr(e, "status", None) in (403, 404))
+                    with lock:
+                        refresh = refused and record["shortcode"] not in refreshed
+                        refreshed.add(record["shortcode"])
+                    if refresh:
+                        try:
+                            self._refresh_media_urls(output_dir, record["shortcode"], media_queue)
+                            media_queue.release(record)
+                            continue
+                        except Exception as refresh_error:
+                            e = refresh_error
+                    delay = media_queue.fail(record, e)
+                    self.metrics.count("media_failed")
+                    self.metrics.error("media", f"{record['file']}: {e}")
+                    print(f"    ✗ {record['file']}: {e} (retry in {round(delay)}s)")
+                    continue
+                media_queue.complete(record)
+                if size is not None:
+                    with lock:
+                        downloaded += 1
+                    self.metrics.count("media_downloaded")
+                    self.metrics.count("bytes_downloaded", size)
+                    self.metrics.observe("media_download_seconds", time.perf_counter() - started)
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, workers))]
+        for thread in threads:
+            thread.start()
+        reported = 0
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(progress_interval)
+                    if downloaded > reported and thread.is_alive():
+                        reported = downloaded
+                        stats = media_queue.stats()
+                        print(f"  Media: {downloaded} files downloaded, {stats['queued']} queued")
+                        if on_progress:
+                            on_progress()
+            if on_progress and downloaded > reported:
+                on_progress()
+        finally:
+            if fetcher:
+                fetcher.close()
+            media_queue.compact()
+
+        left = len(media_queue)
+        print(f"✓ Downloaded {downloaded} queued media files"
+              + (f" ({left} left in the queue for a later run)" if left else ""))
+        return downloaded
+
+    def get_saved_posts(self, output_dir="saved_posts", limit=None, full_resync=False,
+                        workers=DEFAULT_DOWNLOAD_WORKERS, async_media=False, max_per_host=MEDIA_MAX_PER_HOST,
+                        host_limits=None, resume=False, known_shortcodes=None, media_queue=None):
         """
         Fetch and download saved posts incrementally.
 
         On subsequent runs, only new posts (not already in the output directory)
-        are downloaded. Once enough consecutive already-downloaded posts are seen,
-        the crawler stops early since Instagram returns saved posts newest-first.
+        are downloaded. Since Instagram returns saved posts newest-first, the
+        crawler stops early once it reaches the newest posts of the last complete
+        crawl (the sync watermark) in their saved order, or after enough
+        consecutive already-downloaded posts when there is no usable watermark.
 
         Args:
             output_dir: Directory to save posts
             limit: Maximum number of *new* posts to download (None for all)
             full_resync: If True, skip early stopping and check every post
+            workers: Number of threads downloading media while the feed is paginated
+            async_media: If True, transfer media through a pooled asyncio client (needs aiohttp)
+            max_per_host: Concurrent media transfers per host when async_media is set
+            host_limits: Dict of hostname -> concurrent transfers, overriding max_per_host
+            resume: If True, continue an interrupted crawl from its last checkpoint
+            known_shortcodes: Set of already-downloaded shortcodes, kept up to date in
+                place across runs (None to load it from output_dir)
+            media_queue: If set, save only each post's JSON and queue its media here
+                (see download_queued_media)
         """
         # Number of consecutive already-downloaded posts before stopping early.
         EARLY_STOP_THRESHOLD = 20
@@ -322,13 +1819,21 @@ class InstagramSavedPostsScraper:
             Path(output_dir).mkdir(parents=True, exist_ok=True)
 
             # Load index of already-downloaded posts
-            existing_shortcodes = self._load_existing_shortcodes(output_dir)
+            if known_shortcodes is None:
+                known_shortcodes = self._load_existing_shortcodes(output_dir)
+            existing_shortcodes = known_shortcodes
+            layout = self._load_layout(output_dir)
 
             if existing_shortcodes:
                 print(f"\nFound {len(existing_shortcodes)} previously downloaded posts")
             else:
                 print("\nNo previous downloads found — performing full download")
 
+            # The rate controller lives as long as the scraper, so count this run's share
+            requests_before = self.rate_controller.requests
+            backoffs_before = self.rate_controller.backoffs
+            pages_before = self.rate_controller.requests_by_type.get(SAVED_POSTS_QUERY_HASH, 0)
+
             print(f"Fetching saved posts for {self.username}...")
             # Get user ID from session cookies to avoid any API calls for profile lookup.
             user_id = self._get_user_id()
@@ -337,7 +1842,7 @@ class InstagramSavedPostsScraper:
                 # Build saved posts iterator directly — avoids rate-limited profile endpoints
                 saved_posts = instaloader.NodeIterator(
                     self.loader.context,
-                    'f883d95537fbcd400f466f63d42bd8a1',
+                    SAVED_POSTS_QUERY_HASH,
                     lambda d: d['data']['user']['edge_saved_media'],
                     lambda n: instaloader.Post(self.loader.context, n),
                     {'id': user_id},
@@ -354,97 +1859,862 @@ class InstagramSavedPostsScraper:
                     print(f"  rm .session-{self.username}")
                     return
 
+            run_started = datetime.now().isoformat(timespec='seconds')
             new_posts = []
+            failed = 0
             skipped = 0
             consecutive_known = 0
             checked = 0
+            downloaded_before = 0
+            failed_before = 0
+            # Posts a resumed crawl already downloaded past its resume point
+            ahead = set()
 
             is_incremental = len(existing_shortcodes) > 0
-            mode = "Syncing new" if is_incremental else "Downloading"
-            print(f"{mode} posts to {output_dir}/\n")
 
-            for post in saved_posts:
-                # Stop if we've downloaded enough new posts
-                if limit and len(new_posts) >= limit:
-                    print(f"Reached download limit of {limit} new posts")
-                    break
+            # Checkpoints let an interrupted crawl continue from the page it reached
+            checkpoint_file = Path(output_dir) / CRAWL_CHECKPOINT
+            resumable = isinstance(saved_posts, instaloader.NodeIterator)
+            checkpoint = self._load_crawl_checkpoint(checkpoint_file) if resumable else None
+            if checkpoint and resume:
+                try:
+                    saved_posts.thaw(checkpoint["iterator"])
+                except instaloader.exceptions.InvalidArgumentException as e:
+                    print(f"  Can't resume from checkpoint ({e}), starting over")
+                else:
+                    run_started = checkpoint["run"]
+                    checked = checkpoint["checked"]
+                    skipped = checkpoint["skipped"]
+                    failed = failed_before = checkpoint["failed"]
+                    downloaded_before = checkpoint["downloaded"]
+                    ahead = set(checkpoint.get("ahead", []))
+                    is_incremental = checkpoint["incremental"]
+                    full_resync = full_resync or checkpoint["full_resync"]
+                    print(f"  Resuming crawl from post {checked + 1} "
+                          f"({downloaded_before} downloaded before the interruption)")
+            elif resume:
+                print("  No crawl checkpoint to resume from, starting from the newest post")
+            elif checkpoint:
+                print("  Found a checkpoint from an interrupted crawl (continue it with --resume)")
 
-                checked += 1
+            mode = "Syncing new" if is_incremental else "Downloading"
+            print(f"{mode} posts to {output_dir}/\n")
 
-                # Skip posts we already have
-                if post.shortcode in existing_shortcodes:
-                    skipped += 1
-                    consecutive_known += 1
+            watermark_file = Path(output_dir) / SYNC_WATERMARK
+            watermark = self._load_sync_watermark(watermark_file) if is_incremental else []
+            watermark_rank = {entry["shortcode"]: rank for rank, entry in enumerate(watermark)}
+            confirmations_needed = min(WATERMARK_CONFIRMATIONS, len(watermark))
+            confirmations = 0
+            last_rank = None
+            # Newest posts of this crawl, the next run's watermark
+            head = []
+            started_at = checked
+            caught_up = False
+
+            # Pagination runs on this thread and feeds new posts through a bounded
+            # queue to the download workers, so neither waits on the other.
+            work_queue = queue.Queue(maxsize=max(1, workers) * 2)
+            progress = threading.Condition()
+            in_flight = 0
+            queued = 0
+            # (frozen iterator state, skipped count) at each post still being downloaded, by position
+            pending = {}
+            # Positions of this process's downloads and failures, to split them at the resume point
+            downloaded_at = {}
+            failed_at = []
+            skipped_at_current = skipped
+
+            def download_worker():
+                nonlocal in_flight, failed
+                while True:
+                    job = work_queue.get()
+                    if job is None:
+                        return
+                    number, position, post = job
+                    started = time.perf_counter()
+                    try:
+                        post_info = self._download_post(post, output_dir, position, run_started, progress, layout,
+                                                        media_queue)
+                        with progress:
+                            new_posts.append(post_info)
+                            downloaded_at[position] = post.shortcode
+                        self.metrics.observe("post_download_seconds", time.perf_counter() - started)
+                        print(f"    ✓ [new {number}] Downloaded successfully\n")
+                    except Exception as e:
+                        with progress:
+                            failed += 1
+                            failed_at.append(position)
+                            # Not downloaded, so the next run tries it again
+                            existing_shortcodes.discard(post.shortcode)
+                        self.metrics.error("crawl", f"{post.shortcode}: {e}")
+                        print(f"    ✗ [new {number}] Error downloading post: {str(e)}\n")
+                    finally:
+                        with progress:
+                            in_flight -= 1
+                            pending.pop(position, None)
+                            progress.notify_all()
+
+            if async_media:
+                try:
+                    from media_fetcher import MediaFetcher
+                    self.media_fetcher = MediaFetcher(max_per_host=max_per_host, host_limits=host_limits,
+                                                      user_agent=self.loader.context.user_agent)
+                    self.media_fetcher.start()
+                except ImportError:
+                    print("Warning: --async-media needs aiohttp (pip install aiohttp), using instaloader downloads\n")
+                    self.media_fetcher = None
+
+            pool = [threading.Thread(target=download_worker, daemon=True) for _ in range(max(1, workers))]
+            for thread in pool:
+                thread.start()
+
+            def checkpoint_state():
+                """
+                Resume point: the earliest post not downloaded yet, else the current
+                one. Counters are as of that point, since the resumed crawl sees the
+                posts after it again; downloads past it are listed as "ahead" so they
+                aren't counted as known posts then, and failures past it are retried.
+                """
+                with progress:
+                    if pending:
+                        resume_at = min(pending)
+                        frozen, skipped_before = pending[resume_at]
+                    else:
+                        resume_at = max(checked - 1, 0)
+                        frozen, skipped_before = saved_posts.freeze(), skipped_at_current
+                    counters = {
+                        "run": run_started,
+                        "checked": resume_at,
+                        "skipped": skipped_before,
+                        "failed": failed_before + sum(1 for position in failed_at if position < resume_at),
+                        "downloaded": downloaded_before + len(new_posts),
+                        "ahead": sorted(ahead | {shortcode for position, shortcode in downloaded_at.items()
+                                                 if position >= resume_at}),
+                        "incremental": is_incremental,
+                        "full_resync": full_resync,
+                    }
+                return frozen, counters
 
-                    # Early stop: if we've seen many consecutive known posts,
-                    # we've caught up to the previous download boundary
-                    if not full_resync and is_incremental and consecutive_known >= EARLY_STOP_THRESHOLD:
-                        print(f"  Seen {EARLY_STOP_THRESHOLD} consecutive known posts — caught up!")
+            interrupted = True
+            stopped = False
+            reached_limit = False
+            try:
+                for post in saved_posts:
+                    # Another thread asked every crawl to stop (Ctrl-C with --all-accounts)
+                    if self.stop_event is not None and self.stop_event.is_set():
+                        stopped = True
                         break
 
-                    continue
-
-                # Reset consecutive counter when we find a new post
-                consecutive_known = 0
-
-                print(f"[new {len(new_posts)+1}] Downloading post from @{post.owner_username}")
-                print(f"    URL: https://www.instagram.com/p/{post.shortcode}/")
-
-                try:
-                    self.loader.download_post(post, target=Path(output_dir))
-
-                    post_info = {
-                        'shortcode': post.shortcode,
-                        'url': f"https://www.instagram.com/p/{post.shortcode}/",
-                        'owner_username': post.owner_username,
-                        'caption': post.caption,
-                        'date': post.date_utc.isoformat(),
-                        'likes': post.likes,
-                        'comments': post.comments,
-                        'is_video': post.is_video,
-                        'video_url': post.video_url if post.is_video else None,
-                        'typename': post.typename
-                    }
-                    new_posts.append(post_info)
+                    # Stop if we've downloaded enough new posts. While downloads are
+                    # still in flight we don't know yet whether they will succeed.
+                    with progress:
+                        while limit and in_flight and downloaded_before + len(new_posts) + in_flight >= limit:
+                            progress.wait()
+                        reached_limit = limit and downloaded_before + len(new_posts) >= limit
+                    if reached_limit:
+                        print(f"Reached download limit of {limit} new posts")
+                        break
 
-                    print(f"    ✓ Downloaded successfully\n")
+                    checked += 1
+                    skipped_at_current = skipped
+                    if resumable and checked % CHECKPOINT_EVERY == 0:
+                        self._write_crawl_checkpoint(checkpoint_file, *checkpoint_state())
+                    if len(head) < WATERMARK_SIZE:
+                        head.append({"shortcode": post.shortcode, "position": checked - 1})
+
+                    if post.shortcode in ahead:
+                        # Downloaded before the interruption: new to this crawl, not known
+                        ahead.discard(post.shortcode)
+                        consecutive_known = 0
+                        confirmations = 0
+                        last_rank = None
+                        continue
+
+                    # Skip posts we already have
+                    if post.shortcode in existing_shortcodes:
+                        skipped += 1
+                        consecutive_known += 1
+
+                        # Watermark: the last crawl's newest posts, appearing one after
+                        # another in the same order, mark the previous download boundary.
+                        # A watermark post seen alone or out of order (e.g. unsaved and
+                        # saved again) doesn't count.
+                        rank = watermark_rank.get(post.shortcode)
+                        if rank is not None and last_rank is not None and rank == last_rank + 1:
+                            confirmations += 1
+                        else:
+                            confirmations = 1 if rank is not None else 0
+                        last_rank = rank
+
+                        if not full_resync and confirmations_needed and confirmations >= confirmations_needed:
+                            newer = checked - 1 - watermark[rank]["position"]
+                            print(f"  Reached last sync's newest posts ({max(newer, 0)} saved since) — caught up!")
+                            caught_up = True
+                            break
+
+                        # Early stop fallback: if we've seen many consecutive known posts,
+                        # we've caught up to the previous download boundary
+                        if not full_resync and is_incremental and consecutive_known >= EARLY_STOP_THRESHOLD:
+                            print(f"  Seen {EARLY_STOP_THRESHOLD} consecutive known posts — caught up!")
+                            caught_up = True
+                            break
+
+                        continue
+
+                    # Reset consecutive counters when we find a new post
+                    consecutive_known = 0
+                    confirmations = 0
+                    last_rank = None
+                    existing_shortcodes.add(post.shortcode)
+
+                    queued += 1
+                    with progress:
+                        in_flight += 1
+                        if resumable:
+                            pending[checked - 1] = (saved_posts.freeze(), skipped)
+                    print(f"[new {queued}] Downloading post from @{post.owner_username}")
+                    print(f"    URL: https://www.instagram.com/p/{post.shortcode}/")
+                    work_queue.put((queued, checked - 1, post))
+                interrupted = stopped
+            finally:
+                if interrupted:
+                    # Drop queued work so the workers stop after their current post
+                    while True:
+                        try:
+                            job = work_queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if job:
+                            existing_shortcodes.discard(job[2].shortcode)
+                for _ in pool:
+                    work_queue.put(None)
+                for thread in pool:
+                    thread.join()
+                if self.media_fetcher:
+                    self.media_fetcher.close()
+                    self.media_fetcher = None
+                if resumable and interrupted and checked:
+                    self._write_crawl_checkpoint(checkpoint_file, *checkpoint_state())
+                    print(f"\n  Saved crawl checkpoint — continue with --resume")
+                elif checkpoint_file.exists():
+                    checkpoint_file.unlink()
+
+                self.metrics.count("posts_checked", checked - started_at)
+                self.metrics.count("posts_known", skipped)
+                self.metrics.count("posts_downloaded", len(new_posts))
+                self.metrics.count("posts_failed", failed)
+                self.metrics.count("pages_fetched", self.rate_controller.requests_by_type.get(
+                    SAVED_POSTS_QUERY_HASH, 0) - pages_before)
+                self.metrics.count("api_requests", self.rate_controller.requests - requests_before)
+                self.metrics.count("api_backoffs", self.rate_controller.backoffs - backoffs_before)
+
+            if stopped:
+                print(f"  Stopped {self.username}'s crawl after {checked} posts")
+                return
 
-                except Exception as e:
-                    print(f"    ✗ Error downloading post: {str(e)}\n")
-                    continue
+            # Only a crawl that started at the newest post and reached the previous
+            # boundary (or the end) may move the watermark; after a limited run the
+            # posts between its last download and the old boundary are still missing.
+            # Neither may a crawl with failed downloads: the next run stops at the new
+            # watermark, above the failed posts, while the old one still lies below them.
+            if started_at == 0 and head and (caught_up or not reached_limit):
+                if failed:
+                    print(f"  Keeping the previous sync watermark so the {failed} failed "
+                          f"post{'s' if failed != 1 else ''} are retried next run")
+                else:
+                    self._write_sync_watermark(watermark_file, head, run_started)
 
             print(f"\n{'='*50}")
             if is_incremental:
                 print(f"✓ Sync complete!")
-                print(f"  New posts downloaded: {len(new_posts)}")
+                print(f"  New posts downloaded: {downloaded_before + len(new_posts)}")
                 print(f"  Already had: {skipped}")
                 print(f"  Posts checked: {checked}")
+                if caught_up and confirmations_needed and confirmations >= confirmations_needed:
+                    # What the consecutive-known-posts rule would still have fetched
+                    threshold_checked = checked + EARLY_STOP_THRESHOLD - consecutive_known
+                    pages_saved = (-(-threshold_checked // SAVED_PAGE_SIZE)
+                                   - -(-checked // SAVED_PAGE_SIZE))
+                    print(f"  API pages saved by watermark: {pages_saved}")
             else:
                 print(f"✓ Download complete!")
-                print(f"  Total posts downloaded: {len(new_posts)}")
+                print(f"  Total posts downloaded: {downloaded_before + len(new_posts)}")
+            if failed:
+                print(f"  Failed downloads: {failed}")
             print(f"  Output directory: {output_dir}/")
+            print(f"  Requests: {self.rate_controller.summary()}")
             print(f"{'='*50}")
 
-        except instaloader.exceptions.LoginRequiredException:
+        except instaloader.exceptions.LoginRequiredException as e:
+            self.metrics.error("crawl", e)
             print("Error: Login required. Please login first.")
+        except instaloader.exceptions.ConnectionException as e:
+            self.metrics.error("crawl", e)
+            print(f"Error fetching saved posts: {str(e)}")
+            if self.rate_controller.backoffs:
+                print(f"  Instagram kept throttling after {self.rate_controller.summary()}.")
+                print("  Try again later, or lower --account-rate.")
         except Exception as e:
+            self.metrics.error("crawl", e)
             print(f"Error fetching saved posts: {str(e)}")
 
 
+def process_account(scraper, username, args, limit):
+    """Crawl one logged-in account, then build its thumbnails, index and duplicates."""
+    output_dir = f"saved_posts/{username}"
+    if args.metadata_first:
+        new_posts, media_downloaded = crawl_metadata_first(scraper, output_dir, args, limit, resume=args.resume)
+        if not new_posts and not media_downloaded:
+            build_account_indexes(scraper, output_dir, args)
+        return
+    with scraper.metrics.phase("crawl"):
+        scraper.get_saved_posts(limit=limit, full_resync=args.full_resync, output_dir=output_dir,
+                                workers=args.workers, async_media=args.async_media,
+                                max_per_host=args.max_per_host, host_limits=args.host_limits, resume=args.resume)
+    if scraper.stop_event is not None and scraper.stop_event.is_set():
+        return
+    build_account_indexes(scraper, output_dir, args)
+
+
+def crawl_metadata_first(scraper, output_dir, args, limit, resume=False, known_shortcodes=None):
+    """
+    Crawl one logged-in account saving only post JSON, with media queued in the
+    account's persistent media queue and downloaded newest first by background
+    workers from the start of the crawl. The index is built as soon as the crawl
+    ends and updated while media lands; thumbnails and duplicates follow once
+    the queue is drained.
+
+    Returns:
+        (new posts, media files downloaded)
+    """
+    metrics = scraper.metrics
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    media_queue = MediaQueue(Path(output_dir) / MEDIA_QUEUE)
+    if len(media_queue):
+        print(f"  {len(media_queue)} media files queued by an earlier run")
+    # Index builds from the download thread and this one must not overlap
+    index_lock = threading.Lock()
+
+    def update_index():
+        with index_lock:
+            build_account_indexes(scraper, output_dir, args, index_only=True)
+
+    media_queue.feeding = True
+    downloader = threading.Thread(
+        target=scraper.download_queued_media, args=(output_dir, media_queue),
+        kwargs={"workers": args.workers, "async_media": args.async_media, "max_per_host": args.max_per_host,
+                "host_limits": args.host_limits, "on_progress": update_index},
+        daemon=True,
+    )
+    media_before = metrics.counters.get("media_downloaded", 0)
+    downloader.start()
+    try:
+        with metrics.phase("crawl"):
+            scraper.get_saved_posts(limit=limit, full_resync=args.full_resync, output_dir=output_dir,
+                                    workers=args.workers, resume=resume, known_shortcodes=known_shortcodes,
+                                    media_queue=media_queue)
+    finally:
+        media_queue.stop_feeding()
+    new_posts = metrics.counters.get("posts_downloaded", 0)
+    if new_posts:
+        with index_lock:
+            build_account_indexes(scraper, output_dir, args, index_only=True)
+        print(f"\n✓ Index ready; {len(media_queue)} media files still downloading")
+
+    with metrics.phase("media"):
+        downloader.join()
+    media_downloaded = metrics.counters.get("media_downloaded", 0) - media_before
+    metrics.count("media_pending", len(media_queue))
+    if new_posts or media_downloaded:
+        build_account_indexes(scraper, output_dir, args)
+    return new_posts, media_downloaded
+
+
+def build_account_indexes(scraper, output_dir, args, index_only=False):
+    """
+    Build an account's thumbnails, index and duplicates as requested on the
+    command line; with index_only, just update the index.
+    """
+    metrics = scraper.metrics
+    if args.thumbnails and not index_only:
+        with metrics.phase("thumbnails"):
+            scraper.build_thumbnails(output_dir=output_dir)
+    with metrics.phase("index"):
+        scraper.build_index(output_dir=output_dir, rebuild=args.rebuild_index and not index_only,
+                            workers=args.index_workers, shard_size=args.index_shards,
+                            sqlite_db=args.index_db, facets=args.index_facets, columnar=args.index_columnar)
+    if args.duplicates and not index_only:
+        with metrics.phase("duplicates"):
+            scraper.build_duplicates(output_dir=output_dir)
+
+
+def write_run_reports(runs, args):
+    """Write each run's JSON report, and the Prometheus textfile if requested."""
+    for metrics in runs:
+        account_dir = Path("saved_posts") / metrics.account if metrics.account else Path("saved_posts")
+        metrics.write_report(account_dir / RUN_REPORT)
+    if args.prometheus:
+        write_prometheus(args.prometheus, runs)
+
+
+def run_account(scraper, username, args):
+    """Crawl one logged-in account, then rebuild its index and sync."""
+    if args.limit is None and not args.full_resync and not args.resume:
+        limit_input = input("\nEnter max number of new posts to download (press Enter for all): ")
+        limit = int(limit_input) if limit_input.strip() else None
+    else:
+        limit = args.limit
+
+    process_account(scraper, username, args, limit)
+    scraper.update_accounts_list()
+    if not args.no_sync:
+        with scraper.metrics.phase("sync"):
+            scraper.sync_to_cloud(full=args.sync_full)
+    write_run_reports([scraper.metrics], args)
+
+
+def run_all_accounts(args):
+    """
+    Crawl every account with a saved session, without prompting. Accounts are
+    crawled concurrently, each indexed as soon as its crawl finishes; the
+    accounts list and cloud sync run once at the end.
+    """
+    session_files = sorted(f for f in os.listdir('.') if f.startswith('.session-'))
+    if not session_files:
+        print("Error: No .session-* files found. Log in interactively first.")
+        return False
+
+    usernames = [sf.replace('.session-', '') for sf in session_files]
+    print(f"Crawling {len(usernames)} accounts: {', '.join(usernames)}\n")
+
+    profile_dir = PROFILE_DIR if args.profile else None
+    runs = {username: RunMetrics(account=username, profile_dir=profile_dir) for username in usernames}
+    # Set on Ctrl-C: running crawls save their checkpoints and return, queued ones never start
+    stop = threading.Event()
+
+    def crawl(session_file, username):
+        if stop.is_set():
+            return False
+        scraper = InstagramSavedPostsScraper(username=username, session_file=session_file,
+                                             requests_per_minute=args.account_rate, metrics=runs[username],
+                                             stop_event=stop)
+        if not scraper.login():
+            runs[username].error("login", "could not load session")
+            return False
+        process_account(scraper, username, args, args.limit)
+        return not stop.is_set()
+
+    results = {}
+    pool = ThreadPoolExecutor(max_workers=max(1, args.parallel_accounts))
+    futures = {pool.submit(crawl, sf, username): username
+               for sf, username in zip(session_files, usernames)}
+    try:
+        for future, username in futures.items():
+            try:
+                results[username] = future.result()
+            except Exception as e:
+                print(f"✗ {username}: {e}")
+                results[username] = False
+    except KeyboardInterrupt:
+        print("\nStopping: waiting for running crawls to save their checkpoints...")
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+        raise
+    finally:
+        pool.shutdown(wait=True)
+
+    finish_accounts(list(runs.values()), args)
+
+    print(f"\n{'='*50}")
+    for username, ok in results.items():
+        print(f"  {'✓' if ok else '✗'} {username}")
+    print(f"{'='*50}")
+    return all(results.values())
+
+
+def verify_accounts(args):
+    """
+    Verify the media of every account, re-download broken posts of accounts
+    with a saved session, then rebuild their indexes and sync once.
+    Returns False if any account still has broken posts.
+    """
+    base = Path("saved_posts")
+    usernames = sorted(d.name for d in base.iterdir() if d.is_dir()) if base.exists() else []
+    if not usernames:
+        print("Error: No accounts in saved_posts/ to verify")
+        return False
+
+    profile_dir = PROFILE_DIR if args.profile else None
+    runs = []
+    all_intact = True
+    for username in usernames:
+        output_dir = f"saved_posts/{username}"
+        session_file = f".session-{username}"
+        metrics = RunMetrics(account=username, profile_dir=profile_dir)
+        runs.append(metrics)
+        scraper = InstagramSavedPostsScraper(username=username,
+                                             session_file=session_file if os.path.exists(session_file) else None,
+                                             requests_per_minute=args.account_rate, metrics=metrics)
+        print(f"\nVerifying {output_dir}/...")
+        with metrics.phase("verify"):
+            broken = scraper.verify_media(output_dir, deep=args.verify_deep)
+        if broken:
+            if scraper.session_file and scraper.login():
+                with metrics.phase("refetch"):
+                    if scraper.refetch_posts(output_dir, broken):
+                        # Only the re-downloaded files need checking again
+                        broken = scraper.verify_media(output_dir)
+            else:
+                print(f"  No session for {username}, so broken posts were not re-downloaded")
+        all_intact = all_intact and not broken
+        build_account_indexes(scraper, output_dir, args)
+
+    finish_accounts(runs, args)
+    return all_intact
+
+
+def migrate_accounts(args):
+    """Move every account to the layout given by --layout, rebuild their indexes and sync once."""
+    base = Path("saved_posts")
+    usernames = sorted(d.name for d in base.iterdir() if d.is_dir()) if base.exists() else []
+    if not usernames:
+        print("Error: No accounts in saved_posts/ to migrate")
+        return False
+
+    profile_dir = PROFILE_DIR if args.profile else None
+    runs = []
+    for username in usernames:
+        output_dir = f"saved_posts/{username}"
+        metrics = RunMetrics(account=username, profile_dir=profile_dir)
+        runs.append(metrics)
+        scraper = InstagramSavedPostsScraper(username=username, metrics=metrics)
+        print(f"\nMoving {output_dir}/ to the {args.layout} layout...")
+        with metrics.phase("migrate"):
+            metrics.count("files_moved", scraper.migrate_layout(output_dir, args.layout))
+        build_account_indexes(scraper, output_dir, args)
+
+    finish_accounts(runs, args)
+    return True
+
+
+def finish_accounts(runs, args):
+    """
+    Account-independent work after processing accounts: the accounts list, the
+    cloud sync and the reports. Returns the metrics of the sync.
+    """
+    sync_metrics = RunMetrics(profile_dir=PROFILE_DIR if args.profile else None)
+    scraper = InstagramSavedPostsScraper(metrics=sync_metrics)
+    try:
+        scraper.update_accounts_list()
+        if not args.no_sync:
+            with sync_metrics.phase("sync"):
+                scraper.sync_to_cloud(full=args.sync_full)
+    finally:
+        write_run_reports([*runs, sync_metrics], args)
+    return sync_metrics
+
+
+def _terminate(signum, frame):
+    # Unwind like Ctrl-C, so an interrupted crawl still saves its checkpoint
+    raise KeyboardInterrupt
+
+
+class SyncDaemon:
+    def __init__(self, args):
+        """
+        Initialize the daemon
+
+        Args:
+            args: Parsed command line arguments (crawl, index, sync and daemon options)
+        """
+        self.args = args
+        self.interval = max(args.interval, 0) * 60
+        self.jitter = min(max(args.jitter, 0.0), 0.9)
+        # username -> {"scraper", "shortcodes", "logged_in", "status"}; scrapers stay
+        # logged in and shortcode sets stay in memory between polls
+        self.accounts = {}
+        self.started = datetime.now().isoformat(timespec='seconds')
+        self.state = "starting"
+        self.polls = 0
+        self.failed_polls = 0
+        self.last_poll = None
+        self.next_poll = None
+        self.sync_pending = False
+        self.errors = deque(maxlen=DAEMON_RECENT_ERRORS)
+        self._lock = threading.Lock()
+
+    def run(self):
+        """
+        Poll every account with a saved session until interrupted. Accounts are
+        polled one after another on this thread, so Ctrl-C or SIGTERM stops a
+        crawl cleanly and the next start resumes it from its checkpoint.
+        """
+        server = None
+        if self.args.status_port:
+            server = StatusServer(self.status, port=self.args.status_port)
+            server.start()
+            print(f"Status endpoint: {server.url}/status (health check: {server.url}/health)")
+        signal.signal(signal.SIGTERM, _terminate)
+        try:
+            while True:
+                self.poll()
+                delay = self.next_delay()
+                next_poll = datetime.fromtimestamp(time.time() + delay)
+                with self._lock:
+                    self.state = "idle"
+                    self.next_poll = next_poll.isoformat(timespec='seconds')
+                print(f"\nNext poll at {next_poll:%H:%M:%S} (in {delay / 60:.1f} min)")
+                time.sleep(delay)
+        finally:
+            if server:
+                server.stop()
+
+    def next_delay(self):
+        """Seconds until the next poll: the interval, stretched after failed polls, with jitter."""
+        backoff = min(2 ** self.failed_polls, DAEMON_MAX_BACKOFF)
+        return self.interval * backoff * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _discover_accounts(self):
+        """Pick up accounts whose session file appeared since the last poll."""
+        for session_file in sorted(f for f in os.listdir('.') if f.startswith('.session-')):
+            username = session_file.replace('.session-', '')
+            if username in self.accounts:
+                continue
+            scraper = InstagramSavedPostsScraper(username=username, session_file=session_file,
+                                                 requests_per_minute=self.args.account_rate)
+            with self._lock:
+                self.accounts[username] = {
+                    "scraper": scraper,
+                    "shortcodes": None,
+                    "logged_in": False,
+                    "status": {"lastPoll": None, "newPosts": 0, "totalNewPosts": 0, "knownPosts": None,
+                               "consecutiveFailures": 0, "lastError": None,
+                               "backlog": {"failedDownloads": 0, "crawlCheckpoint": False, "indexPending": False,
+                                           "queuedMedia": 0}},
+                }
+
+    def poll(self):
+        """Crawl every account once; index and sync only what received new posts."""
+        self._discover_accounts()
+        started = datetime.now().isoformat(timespec='seconds')
+        print(f"\n{'='*50}\nPoll {self.polls + 1} at {started} ({len(self.accounts)} accounts)\n{'='*50}")
+        with self._lock:
+            self.state = "polling"
+            self.next_poll = None
+
+        profile_dir = PROFILE_DIR if self.args.profile else None
+        runs = []
+        new_posts = 0
+        for username, account in self.accounts.items():
+            metrics = RunMetrics(account=username, profile_dir=profile_dir)
+            runs.append(metrics)
+            new_posts += self._poll_account(username, account, metrics)
+
+        synced = False
+        sync_errors = []
+        if new_posts or self.sync_pending:
+            with self._lock:
+                self.state = "syncing"
+                self.sync_pending = True
+            try:
+                sync_metrics = finish_accounts(runs, self.args)
+            except Exception as e:
+                print(f"✗ Sync failed: {e}")
+                sync_errors.append({"phase": "sync", "type": type(e).__name__, "message": str(e),
+                                    "time": datetime.now().isoformat(timespec='seconds')})
+            else:
+                runs.append(sync_metrics)
+                synced = not (sync_metrics.error_count or sync_metrics.counters.get("sync_failed"))
+            # A failed sync is retried on the next poll even if nothing new arrives by then
+            self.sync_pending = not synced
+        else:
+            print("\nNo new posts — index and cloud copy left as they are")
+            write_run_reports(runs, self.args)
+
+        failed = any(run.error_count for run in runs) or self.sync_pending
+        with self._lock:
+            for run in runs:
+                for error in run.errors:
+                    self.errors.append({"account": run.account, **error})
+            for error in sync_errors:
+                self.errors.append({"account": None, **error})
+            self.polls += 1
+            self.failed_polls = self.failed_polls + 1 if failed else 0
+            self.last_poll = {
+                "started": started,
+                "finished": datetime.now().isoformat(timespec='seconds'),
+                "newPosts": new_posts,
+                "errors": sum(run.error_count for run in runs),
+                "synced": synced,
+            }
+
+    def _poll_account(self, username, account, metrics):
+        """Crawl one account with its warm session and shortcode set. Returns the number of new posts."""
+        scraper = account["scraper"]
+        scraper.metrics = metrics
+        output_dir = f"saved_posts/{username}"
+        status = account["status"]
+        backlog = dict(status["backlog"])
+        new_posts = 0
+        try:
+            if not account["logged_in"]:
+                # Also reloads a session file refreshed by an interactive login
+                account["logged_in"] = scraper.login()
+                if not account["logged_in"]:
+                    metrics.error("login", "could not load session")
+                    return 0
+            if account["shortcodes"] is None:
+                with metrics.phase("crawl"):
+                    account["shortcodes"] = scraper._load_existing_shortcodes(output_dir)
+            if self.args.metadata_first:
+                # Indexes itself as posts and media arrive; also retries media left queued
+                new_posts, _ = crawl_metadata_first(scraper, output_dir, self.args, self.args.limit,
+                                                    resume=True, known_shortcodes=account["shortcodes"])
+            else:
+                with metrics.phase("crawl"):
+                    scraper.get_saved_posts(output_dir=output_dir, limit=self.args.limit,
+                                            workers=self.args.workers, async_media=self.args.async_media,
+                                            max_per_host=self.args.max_per_host,
+                                            host_limits=self.args.host_limits, resume=True,
+                                            known_shortcodes=account["shortcodes"])
+                new_posts = metrics.counters.get("posts_downloaded", 0)
+            backlog["indexPending"] = backlog["indexPending"] or (new_posts > 0 and not self.args.metadata_first)
+            if backlog["indexPending"]:
+                build_account_indexes(scraper, output_dir, self.args)
+                backlog["indexPending"] = False
+        except Exception as e:
+            print(f"✗ {username}: {e}")
+        finally:
+            if any(error["type"] == "LoginRequiredException" for error in metrics.errors):
+                account["logged_in"] = False
+            backlog["failedDownloads"] = metrics.counters.get("posts_failed", 0)
+            backlog["queuedMedia"] = metrics.counters.get("media_pending", 0)
+            backlog["crawlCheckpoint"] = (Path(output_dir) / CRAWL_CHECKPOINT).exists()
+            with self._lock:
+                account["status"] = {
+                    "lastPoll": metrics.started,
+                    "newPosts": new_posts,
+                    "totalNewPosts": status["totalNewPosts"] + new_posts,
+                    "knownPosts": len(account["shortcodes"]) if account["shortcodes"] is not None else None,
+                    "rate": round(scraper.rate_controller.rate, 1),
+                    "consecutiveFailures": status["consecutiveFailures"] + 1 if metrics.error_count else 0,
+                    "lastError": metrics.errors[-1] if metrics.errors else status["lastError"],
+                    "backlog": backlog,
+                }
+        return new_posts
+
+    def status(self):
+        """Snapshot of the daemon's state for the status endpoint."""
+        with self._lock:
+            accounts = {username: account["status"] for username, account in self.accounts.items()}
+            problems = [f"{username}: {status['consecutiveFailures']} failed polls in a row"
+                        for username, status in accounts.items()
+                        if status["consecutiveFailures"] >= DAEMON_UNHEALTHY_FAILURES]
+            if self.polls and not accounts:
+                problems.append("no accounts with a saved session")
+            return {
+                "healthy": not problems,
+                "problems": problems,
+                "state": self.state,
+                "started": self.started,
+                "polls": self.polls,
+                "lastPoll": self.last_poll,
+                "nextPoll": self.next_poll,
+                "backlog": {
+                    "syncPending": self.sync_pending,
+                    "failedDownloads": sum(s["backlog"]["failedDownloads"] for s in accounts.values()),
+                    "queuedMedia": sum(s["backlog"]["queuedMedia"] for s in accounts.values()),
+                    "crawlCheckpoints": [u for u, s in accounts.items() if s["backlog"]["crawlCheckpoint"]],
+                    "indexPending": [u for u, s in accounts.items() if s["backlog"]["indexPending"]],
+                },
+                "accounts": accounts,
+                "errors": list(self.errors),
+            }
+
+
 def main():
     """Main function"""
     import argparse
 
+    def host_limit(value):
+        host, _, limit = value.partition("=")
+        if not host or not limit.isdigit() or int(limit) < 1:
+            raise ValueError(value)
+        return host, int(limit)
+
     parser = argparse.ArgumentParser(description="Instagram Saved Posts Scraper")
     parser.add_argument("--full-resync", action="store_true",
                         help="Check all saved posts instead of stopping early at known posts")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted crawl from its last checkpoint")
     parser.add_argument("--limit", type=int, default=None,
                         help="Maximum number of new posts to download")
+    parser.add_argument("--workers", type=int, default=DEFAULT_DOWNLOAD_WORKERS,
+                        help=f"Number of parallel media downloads (default: {DEFAULT_DOWNLOAD_WORKERS})")
+    parser.add_argument("--async-media", action="store_true",
+                        help="Download media over a pooled asyncio HTTP client (requires aiohttp)")
+    parser.add_argument("--max-per-host", type=int, default=MEDIA_MAX_PER_HOST,
+                        help=f"Concurrent media transfers per host with --async-media (default: {MEDIA_MAX_PER_HOST})")
+    parser.add_argument("--host-limit", type=host_limit, action="append", dest="host_limits", metavar="HOST=N",
+                        help="Concurrent media transfers to one host with --async-media, overriding "
+                             "--max-per-host (repeatable)")
+    parser.add_argument("--metadata-first", action="store_true",
+                        help="Save only post JSON while crawling and index right away; media goes into a "
+                             "persistent queue that background workers download newest first")
     parser.add_argument("--pull", action="store_true",
                         help="Pull from cloud storage to local (no crawl)")
+    parser.add_argument("--verify", action="store_true",
+                        help="Check local media for truncated or corrupt files, re-download broken posts, "
+                             "then rebuild the index (no crawl)")
+    parser.add_argument("--verify-deep", action="store_true",
+                        help="With --verify, re-check and re-hash every file, not just new or changed ones")
+    parser.add_argument("--layout", choices=LAYOUTS, default=None,
+                        help="Move every account's posts to this on-disk layout (bucketed: <YYYY>/<MM>/ "
+                             "subdirectories), rebuild the indexes and sync; new downloads follow it (no crawl)")
     parser.add_argument("--no-sync", action="store_true",
                         help="Skip cloud sync after crawling")
+    parser.add_argument("--sync-full", action="store_true",
+                        help="Check every object on SYNC_TARGET against the sync manifest and re-upload "
+                             "anything missing remotely (done automatically when a remote index changed)")
+    parser.add_argument("--rebuild-index", action="store_true",
+                        help="Re-parse every post file instead of updating posts-index.json incrementally")
+    parser.add_argument("--index-shards", type=int, default=None, metavar="SIZE",
+                        help="Also write posts-index/ as newest-first pages of SIZE posts, precompressed")
+    parser.add_argument("--index-db", action="store_true",
+                        help="Also write posts-index.db (SQLite with full-text search, see index_db.py)")
+    parser.add_argument("--index-columnar", action="store_true",
+                        help="Also write posts-index.col (compact columnar index for server-side queries, "
+                             "see index_columnar.py)")
+    parser.add_argument("--index-facets", action="store_true",
+                        help="Also write posts-facets/ (hashtag, owner, location and month indexes)")
+    parser.add_argument("--thumbnails", action="store_true",
+                        help="Generate WebP thumbnails before building the index (requires Pillow)")
+    parser.add_argument("--duplicates", action="store_true",
+                        help="Precompute duplicates.json with perceptual image hashes (requires Pillow)")
+    parser.add_argument("--index-workers", type=int, default=1,
+                        help="Number of processes used to parse post files when building the index")
+    parser.add_argument("--all-accounts", action="store_true",
+                        help="Crawl every account with a .session-* file without prompting, then sync once")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Stay running: keep every saved session logged in, poll the saved feeds on a "
+                             "jittered schedule and index and sync only when new posts arrive")
+    parser.add_argument("--interval", type=float, default=DAEMON_INTERVAL, metavar="MINUTES",
+                        help=f"Minutes between polls with --daemon (default: {DAEMON_INTERVAL})")
+    parser.add_argument("--jitter", type=float, default=DAEMON_JITTER, metavar="FRACTION",
+                        help=f"Random spread of the poll interval, as a fraction of it (default: {DAEMON_JITTER})")
+    parser.add_argument("--status-port", type=int, default=DAEMON_STATUS_PORT, metavar="PORT",
+                        help=f"Local port of the --daemon status endpoint, 0 to disable (default: {DAEMON_STATUS_PORT})")
+    parser.add_argument("--parallel-accounts", type=int, default=DEFAULT_PARALLEL_ACCOUNTS,
+                        help=f"Accounts crawled at once with --all-accounts (default: {DEFAULT_PARALLEL_ACCOUNTS})")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"Run each phase under cProfile and save the stats to {PROFILE_DIR}/")
+    parser.add_argument("--prometheus", metavar="FILE", default=None,
+                        help="Also write run metrics as a Prometheus textfile (node_exporter textfile collector)")
+    parser.add_argument("--account-rate", type=int, default=None, metavar="RPM",
+                        help=f"Highest Instagram API requests per minute per account; the rate adapts "
+                             f"below this when throttled (default: {MAX_RATE})")
     args = parser.parse_args()
+    args.host_limits = dict(args.host_limits or [])
 
     print("="*50)
     print("Instagram Saved Posts Scraper")
@@ -453,7 +2723,7 @@ def main():
     # Migration check: warn if posts exist in old flat layout
     base = Path("saved_posts")
     if base.exists():
-        old_files = [f for f in base.glob("*.json") if f.name not in ("accounts.json",)]
+        old_files = [f for f in base.glob("*.json") if f.name != "accounts.json" and not f.name.startswith(".")]
         if old_files:
             print("⚠  Found posts in saved_posts/ root (old layout).")
             print("   Multi-account support stores posts in saved_posts/<username>/")
@@ -469,6 +2739,29 @@ def main():
         scraper.sync_from_cloud()
         return
 
+    # Migration mode: move every account to another on-disk layout, and exit
+    if args.layout:
+        if not migrate_accounts(args):
+            sys.exit(1)
+        return
+
+    # Verify mode: check local media, re-download what's broken, and exit
+    if args.verify:
+        if not verify_accounts(args):
+            sys.exit(1)
+        return
+
+    # Batch mode: every saved session, no prompts
+    if args.all_accounts:
+        if not run_all_accounts(args):
+            sys.exit(1)
+        return
+
+    # Daemon mode: poll every saved session until stopped
+    if args.daemon:
+        SyncDaemon(args).run()
+        return
+
     # Check for existing session files
     session_files = [f for f in os.listdir('.') if f.startswith('.session-')]
 
@@ -485,20 +2778,11 @@ def main():
                 session_file = session_files[session_idx]
                 username = session_file.replace('.session-', '')
 
-                scraper = InstagramSavedPostsScraper(username=username, session_file=session_file)
+                scraper = InstagramSavedPostsScraper(username=username, session_file=session_file,
+                                                     requests_per_minute=args.account_rate,
+                                                     metrics=RunMetrics(username, PROFILE_DIR if args.profile else None))
                 if scraper.login():
-                    if args.limit is None and not args.full_resync:
-                        limit_input = input("\nEnter max number of new posts to download (press Enter for all): ")
-                        limit = int(limit_input) if limit_input.strip() else None
-                    else:
-                        limit = args.limit
-
-                    output_dir = f"saved_posts/{username}"
-                    scraper.get_saved_posts(limit=limit, full_resync=args.full_resync, output_dir=output_dir)
-                    scraper.build_index(output_dir=output_dir)
-                    scraper.update_accounts_list()
-                    if not args.no_sync:
-                        scraper.sync_to_cloud()
+                    run_account(scraper, username, args)
                 return
 
     # New login
@@ -508,21 +2792,11 @@ def main():
     from getpass import getpass
     password = getpass("Password: ")
 
-    scraper = InstagramSavedPostsScraper(username=username)
+    scraper = InstagramSavedPostsScraper(username=username, requests_per_minute=args.account_rate,
+                                         metrics=RunMetrics(username, PROFILE_DIR if args.profile else None))
 
     if scraper.login(username, password):
-        if args.limit is None and not args.full_resync:
-            limit_input = input("\nEnter max number of new posts to download (press Enter for all): ")
-            limit = int(limit_input) if limit_input.strip() else None
-        else:
-            limit = args.limit
-
-        output_dir = f"saved_posts/{username}"
-        scraper.get_saved_posts(limit=limit, full_resync=args.full_resync, output_dir=output_dir)
-        scraper.build_index(output_dir=output_dir)
-        scraper.update_accounts_list()
-        if not args.no_sync:
-            scraper.sync_to_cloud()
+        run_account(scraper, username, args)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Async media transfer engine for the saved posts scraper.
+
+Downloads images and videos over one pooled aiohttp session that lives on a
+background event loop, so connections are reused across posts and all items
+of a carousel are fetched concurrently. Bodies are streamed to a temporary
+file in chunks and renamed into place once complete, so an interrupted
+transfer never leaves a truncated media file behind.
+"""
+
+import asyncio
+import os
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit
+
+
+class MediaFetcher:
+    def __init__(self, max_connections=32, max_per_host=8, host_limits=None,
+                 chunk_size=256 * 1024, timeout=120, retries=3, retry_backoff=1, user_agent=None):
+        """
+        Initialize the media fetcher
+
+        Args:
+            max_connections: Total number of pooled connections
+            max_per_host: Concurrent transfers allowed per host
+            host_limits: Optional dict of hostname -> concurrent transfers, overriding max_per_host
+            chunk_size: Bytes read per chunk while streaming a body to disk
+            timeout: Total seconds allowed for a single transfer
+            retries: Attempts per file before giving up
+            retry_backoff: Base retry delay in seconds; attempt n is followed by a wait of retry_backoff * 2**n
+            user_agent: User-Agent header sent with every request
+        """
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.host_limits = dict(host_limits or {})
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.user_agent = user_agent
+
+        self.files_downloaded = 0
+        self.bytes_downloaded = 0
+
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._host_semaphores = {}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def start(self):
+        """Start the background event loop and open the pooled HTTP session."""
+        import aiohttp  # noqa: F401 -- fail early if the optional dependency is missing
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._open(), self._loop).result()
+
+    def close(self):
+        """Close the HTTP session and stop the background event loop."""
+        if not self._loop:
+            return
+        asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+
+    async def _open(self):
+        import aiohttp
+
+        # Per-host limits are enforced by semaphores in fetch(); the pool just needs room for the largest
+        per_host = max([self.max_per_host, *self.host_limits.values()])
+        connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=per_host)
+        headers = {'User-Agent': self.user_agent} if self.user_agent else None
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+
+    def download(self, jobs):
+        """
+        Download a batch of files and block until all of them are done.
+        Safe to call from any thread while the fetcher is started.
+
+        Args:
+            jobs: Iterable of (url, path, mtime) tuples; mtime may be None
+
+        Returns:
+            Number of files actually transferred (existing files are skipped)
+
+        Raises:
+            The first transfer error, after every job in the batch has finished
+        """
+        return asyncio.run_coroutine_threadsafe(self.fetch_all(jobs), self._loop).result()
+
+    async def fetch_all(self, jobs):
+        """Fetch all jobs concurrently. See download()."""
+        results = await asyncio.gather(*(self.fetch(*job) for job in jobs), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return sum(results)
+
+    async def fetch(self, url, path, mtime=None):
+        """
+        Stream one URL to path via a temporary file, retrying transient errors.
+        Returns True if the file was downloaded, False if it already existed.
+        """
+        import aiohttp
+
+        path = Path(path)
+        if path.exists():
+            return False
+
+        host = urlsplit(url).hostname or ""
+        if host not in self._host_semaphores:
+            self._host_semaphores[host] = asyncio.Semaphore(self.host_limits.get(host, self.max_per_host))
+
+        tmp_path = path.with_name(path.name + ".part")
+        for attempt in range(1, self.retries + 1):
+            try:
+                async with self._host_semaphores[host]:
+                    async with self._session.get(url) as resp:
+                        resp.raise_for_status()
+                        size = 0
+                        with open(tmp_path, 'wb') as f:
+                            async for chunk in resp.content.iter_chunked(self.chunk_size):
+                                f.write(chunk)
+                                size += len(chunk)
+                os.replace(tmp_path, path)
+                if mtime is not None:
+                    os.utime(path, (mtime.timestamp(), mtime.timestamp()))
+                self.files_downloaded += 1
+                self.bytes_downloaded += size
+                return True
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if tmp_path.exists():
+                    tmp_path.unlink()
+                status = getattr(e, 'status', None)
+                if attempt == self.retries or (status is not None and 400 <= status < 500 and status != 429):
+                    raise
+                await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+            except BaseException:
+                if tmp_path.exists():
+                    tmp_path.unlink()
+                raise
+        return False
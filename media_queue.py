@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Persistent queue of media files still to be downloaded.
+
+A metadata-first crawl (insta_scraper.py --metadata-first) saves only each
+post's JSON and queues its media here, so the index is usable long before
+every image and video is on disk. Download workers claim queued files newest
+post first; a failed transfer goes back into the queue with an exponential
+backoff.
+
+The queue is an append-only JSON Lines log in the account directory
+(.media-queue.jsonl), keyed by filename: later lines replace earlier ones and
+a {"file": ..., "done": true} line removes a file. Retry times are wall-clock,
+so a restarted run picks up where the last one stopped, backoffs included.
+The log is compacted when it is loaded and when a drain finishes.
+"""
+
+import heapq
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+
+MEDIA_QUEUE = ".media-queue.jsonl"
+
+# Seconds before the first retry of a failed transfer; doubles with every failure
+RETRY_BACKOFF = 30
+MAX_RETRY_BACKOFF = 6 * 3600
+
+
+class MediaQueue:
+    def __init__(self, path, backoff=RETRY_BACKOFF, max_backoff=MAX_RETRY_BACKOFF):
+        """
+        Initialize the media queue
+
+        Args:
+            path: The queue's JSON Lines file
+            backoff: Seconds before the first retry of a failed transfer
+            max_backoff: Longest wait before a retry, in seconds
+        """
+        self.path = Path(path)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # While a crawl is still queueing files, an empty queue isn't finished yet
+        self.feeding = False
+
+        self._items = {}  # filename -> record
+        self._ready = []  # heap of (-taken, filename)
+        self._delayed = []  # heap of (retryAt, filename)
+        self._claimed = set()
+        self._cond = threading.Condition()
+        self._load()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+    def _load(self):
+        lines = 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        record = json.loads(line)
+                        name = record["file"]
+                    except (json.JSONDecodeError, KeyError, TypeError):
+                        continue  # a torn final line from an interrupted append
+                    if record.get("done"):
+                        self._items.pop(name, None)
+                    else:
+                        self._items[name] = record
+        except OSError:
+            return
+        for name, record in self._items.items():
+            self._schedule(name, record)
+        if lines > len(self._items):
+            self.compact()
+
+    def _schedule(self, name, record):
+        if record.get("retryAt", 0) > time.time():
+            heapq.heappush(self._delayed, (record["retryAt"], name))
+        else:
+            heapq.heappush(self._ready, (-record["taken"], name))
+
+    def _append(self, records):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+
+    def compact(self):
+        """Atomically rewrite the log with one line per queued file."""
+        with self._cond:
+            tmp_file = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                for name in sorted(self._items):
+                    f.write(json.dumps(self._items[name]) + "\n")
+            os.replace(tmp_file, self.path)
+
+    def files(self):
+        """Filenames currently queued."""
+        with self._cond:
+            return set(self._items)
+
+    def add(self, jobs):
+        """
+        Queue media files, replacing any queued entry for the same file.
+
+        Args:
+            jobs: Iterable of dicts with the file's name ("file"), its "url", the
+                post's "shortcode" (to refresh expired URLs) and the post's Unix
+                timestamp ("taken"), which orders the queue newest first
+        """
+        records = [{"file": job["file"], "url": job["url"], "shortcode": job["shortcode"],
+                    "taken": job["taken"], "attempts": 0, "retryAt": 0, "error": None} for job in jobs]
+        if not records:
+            return
+        with self._cond:
+            self._append(records)
+            for record in records:
+                self._items[record["file"]] = record
+                self._schedule(record["file"], record)
+            self._cond.notify_all()
+
+    def update_urls(self, urls):
+        """Replace the URLs of queued files, e.g. after their signed CDN URLs expired (filename -> url)."""
+        with self._cond:
+            records = []
+            for name, url in urls.items():
+                if name in self._items:
+                    self._items[name] = {**self._items[name], "url": url}
+                    records.append(self._items[name])
+            self._append(records)
+
+    def stop_feeding(self):
+        """Mark the end of queueing, so workers stop once nothing is left to claim."""
+        with self._cond:
+            self.feeding = False
+            self._cond.notify_all()
+
+    def claim(self, max_wait=60):
+        """
+        Take the newest ready file, waiting for one if necessary.
+
+        Returns None once the queue has no file ready and none due for a retry
+        within max_wait seconds, no transfer is still in flight and nothing more
+        is being queued. Files further out stay queued for a later run.
+        """
+        with self._cond:
+            while True:
+                now = time.time()
+                while self._delayed and self._delayed[0][0] <= now:
+                    _, name = heapq.heappop(self._delayed)
+                    if name in self._items and name not in self._claimed:
+                        heapq.heappush(self._ready, (-self._items[name]["taken"], name))
+                while self._ready:
+                    _, name = heapq.heappop(self._ready)
+                    record = self._items.get(name)
+                    # Skip heap entries left behind by completed, claimed or rescheduled files
+                    if record is None or name in self._claimed or record.get("retryAt", 0) > now:
+                        continue
+                    self._claimed.add(name)
+                    return dict(record)
+                next_retry = self._delayed[0][0] - now if self._delayed else None
+                if not self.feeding and not self._claimed and (next_retry is None or next_retry > max_wait):
+                    return None
+                self._cond.wait(next_retry if next_retry is not None and next_retry <= max_wait else max_wait)
+
+    def complete(self, record):
+        """Remove a claimed file from the queue."""
+        name = record["file"]
+        with self._cond:
+            self._append([{"file": name, "done": True}])
+            self._items.pop(name, None)
+            self._claimed.discard(name)
+            self._cond.notify_all()
+
+    def release(self, record):
+        """Put a claimed file back as ready, e.g. to retry it right away with a refreshed URL."""
+        name = record["file"]
+        with self._cond:
+            self._claimed.discard(name)
+            if name in self._items:
+                heapq.heappush(self._ready, (-self._items[name]["taken"], name))
+            self._cond.notify_all()
+
+    def fail(self, record, error):
+        """Put a claimed file back with an exponential backoff. Returns the seconds until its retry."""
+        name = record["file"]
+        with self._cond:
+            self._claimed.discard(name)
+            current = self._items.get(name)
+            if current is None:
+                self._cond.notify_all()
+                return 0
+            attempts = current.get("attempts", 0) + 1
+            delay = min(self.max_backoff, self.backoff * 2 ** (attempts - 1))
+            current = {**current, "attempts": attempts, "retryAt": round(time.time() + delay, 3), "error": str(error)}
+            self._items[name] = current
+            self._append([current])
+            heapq.heappush(self._delayed, (current["retryAt"], name))
+            self._cond.notify_all()
+            return delay
+
+    def stats(self):
+        """Counts of queued files: total, waiting for a retry and in flight."""
+        with self._cond:
+            now = time.time()
+            return {
+                "queued": len(self._items),
+                "retrying": sum(1 for record in self._items.values() if record.get("retryAt", 0) > now),
+                "inFlight": len(self._claimed),
+            }
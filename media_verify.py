@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Integrity checks for downloaded media.
+
+An interrupted download or a partial pull leaves files that exist but are cut
+short. verify_file() catches those without decoding any pixels:
+
+  .jpg   Marker segments are walked from SOI to the first scan, and the file
+         must end with an EOI marker
+  .mp4   Top-level boxes must tile the file exactly, start with ftyp and
+         include moov and mdat
+  .json  Must parse as a post and names the media files the post should have
+
+The checks read only headers and the tail of a file; the content hash that
+verify_file() also returns lets later runs skip unchanged files and notice
+files whose contents changed behind an unchanged size and mtime.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+
+
+# Bytes at the end of a JPEG searched for its EOI marker (encoders may pad after it)
+JPEG_TAIL = 4096
+
+# Start-of-frame markers that carry image dimensions (C4, C8 and CC are not frames)
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Markers without a length field
+JPEG_STANDALONE_MARKERS = frozenset([0x01, *range(0xD0, 0xD9)])
+
+
+def check_jpeg(f, size):
+    """Return (status, detail) for an open JPEG file of the given size."""
+    if f.read(2) != b"\xff\xd8":
+        return "corrupt", "not a JPEG (no start-of-image marker)"
+
+    pos = 2
+    frame = None
+    while True:
+        f.seek(pos)
+        marker = f.read(2)
+        if len(marker) < 2:
+            return "truncated", f"ends inside the header at byte {pos}"
+        if marker[0] != 0xFF:
+            return "corrupt", f"bad marker at byte {pos}"
+        if marker[1] == 0xFF:
+            pos += 1  # fill byte
+            continue
+        if marker[1] in JPEG_STANDALONE_MARKERS:
+            pos += 2
+            continue
+        length = f.read(2)
+        if len(length) < 2:
+            return "truncated", f"ends inside the header at byte {pos}"
+        length = int.from_bytes(length, "big")
+        if length < 2:
+            return "corrupt", f"bad segment length at byte {pos}"
+        if pos + 2 + length > size:
+            return "truncated", f"header segment runs past the end of the file ({size} bytes)"
+        if marker[1] in JPEG_SOF_MARKERS:
+            header = f.read(5)
+            height = int.from_bytes(header[1:3], "big")
+            width = int.from_bytes(header[3:5], "big")
+            if not width or not height:
+                return "corrupt", "frame header has no dimensions"
+            frame = (width, height)
+        pos += 2 + length
+        if marker[1] == 0xDA:
+            break  # start of scan: entropy-coded data follows
+
+    if frame is None:
+        return "corrupt", "no frame header before the image data"
+    # Inside entropy-coded data 0xFF is always followed by 0x00 or a restart
+    # marker, so an FFD9 in the tail can only be the end-of-image marker
+    f.seek(max(pos, size - JPEG_TAIL))
+    if b"\xff\xd9" not in f.read():
+        return "truncated", "no end-of-image marker"
+    return "ok", f"{frame[0]}x{frame[1]}"
+
+
+def check_mp4(f, size):
+    """Return (status, detail) for an open MP4 file of the given size."""
+    pos = 0
+    boxes = []
+    while pos < size:
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8:
+            return "truncated", f"ends inside a box header at byte {pos}"
+        box_size = int.from_bytes(header[:4], "big")
+        box_type = header[4:8].decode("latin-1")
+        header_size = 8
+        if box_size == 1:
+            large = f.read(8)
+            if len(large) < 8:
+                return "truncated", f"ends inside a box header at byte {pos}"
+            box_size = int.from_bytes(large, "big")
+            header_size = 16
+        elif box_size == 0:
+            box_size = size - pos  # box extends to the end of the file
+        if not box_type.isprintable() or box_size < header_size:
+            return "corrupt", f"not an MP4 (bad box at byte {pos})"
+        if pos + box_size > size:
+            return "truncated", f"'{box_type}' box runs past the end of the file ({pos + box_size} > {size} bytes)"
+        boxes.append(box_type)
+        pos += box_size
+
+    if not boxes or boxes[0] != "ftyp":
+        return "corrupt", "not an MP4 (no ftyp box)"
+    # moov often comes last, so a missing one usually means the transfer stopped early
+    for required in ("moov", "mdat"):
+        if required not in boxes:
+            return "truncated", f"no '{required}' box"
+    return "ok", f"{len(boxes)} boxes"
+
+
+def post_media_files(data, base_id):
+    """Media filenames a post JSON file says the post should have."""
+    node = data.get("node", {}) if isinstance(data, dict) else {}
+    if node.get("__typename") == "GraphSidecar":
+        names = []
+        edges = node.get("edge_sidecar_to_children", {}).get("edges", [])
+        for idx, edge in enumerate(edges, 1):
+            names.append(f"{base_id}_{idx}.jpg")
+            if edge.get("node", {}).get("is_video"):
+                names.append(f"{base_id}_{idx}.mp4")
+        return names
+    names = [f"{base_id}.jpg"]
+    if node.get("is_video"):
+        names.append(f"{base_id}.mp4")
+    return names
+
+
+def check_post_json(f, base_id):
+    """Return (status, detail, {shortcode, media}) for an open post JSON file."""
+    try:
+        text = f.read().decode("utf-8")
+        data = json.loads(text)
+    except UnicodeDecodeError as e:
+        return "corrupt", str(e), {}
+    except json.JSONDecodeError as e:
+        # Post JSON is an object, so a complete file ends with its closing brace
+        return "corrupt" if text.rstrip().endswith("}") else "truncated", str(e), {}
+    node = data.get("node") if isinstance(data, dict) else None
+    if not node or not node.get("shortcode"):
+        return "corrupt", "not a post (no node or shortcode)", {}
+    return "ok", "", {"shortcode": node["shortcode"], "media": post_media_files(data, base_id)}
+
+
+def verify_file(path):
+    """
+    Check one media or post JSON file and hash its contents.
+
+    Module-level so it can run in worker processes.
+
+    Returns:
+        Dict with status ("ok", "empty", "truncated", "corrupt" or "unreadable"),
+        a human-readable detail, the SHA-256 of the contents (None if unreadable
+        or empty) and, for valid post JSON files, the shortcode and the expected
+        media filenames
+    """
+    path = Path(path)
+    result = {"status": "ok", "detail": "", "sha256": None}
+    try:
+        size = path.stat().st_size
+        if size == 0:
+            result.update(status="empty", detail="file is empty")
+            return result
+        with open(path, "rb") as f:
+            if path.suffix == ".jpg":
+                result["status"], result["detail"] = check_jpeg(f, size)
+            elif path.suffix == ".mp4":
+                result["status"], result["detail"] = check_mp4(f, size)
+            elif path.suffix == ".json":
+                result["status"], result["detail"], post = check_post_json(f, path.stem)
+                result.update(post)
+            f.seek(0)
+            sha = hashlib.sha256()
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(chunk)
+            result["sha256"] = sha.hexdigest()
+    except OSError as e:
+        result.update(status="unreadable", detail=str(e))
+    return result
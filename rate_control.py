@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Adaptive rate control for Instagram API requests.
+
+AdaptiveRateController plugs into instaloader as its RateController. Requests
+draw from a token bucket refilled at the current rate; the rate grows
+additively while Instagram answers normally and is cut multiplicatively on
+every 429 or "Please wait a few minutes" response (AIMD), followed by an
+exponential backoff. The crawl therefore settles just below the highest rate
+Instagram tolerates instead of sleeping through fixed worst-case windows.
+"""
+
+import re
+import threading
+import time
+from collections import deque
+
+import instaloader
+
+
+DEFAULT_RATE = 20  # requests per minute to start with
+MIN_RATE = 2
+MAX_RATE = 60
+BURST = 5
+
+# Instagram's soft throttle comes back as HTTP 200/400 with this message instead of a 429
+THROTTLE_MESSAGE_RE = re.compile(r'please wait a few minutes', re.IGNORECASE)
+# instaloader's error line for an HTTP 429 ("JSON Query to <path>: 429 Too Many Requests - ..."),
+# which carries the same message but is already reported through handle_429()
+HTTP_429_RE = re.compile(r': 429 ')
+
+
+class AdaptiveRateController(instaloader.RateController):
+    def __init__(self, context, rate=DEFAULT_RATE, min_rate=MIN_RATE, max_rate=MAX_RATE, burst=BURST,
+                 increase=1.0, decrease=0.5, backoff=60, max_backoff=900, log_interval=60):
+        """
+        Initialize the rate controller
+
+        Args:
+            context: The InstaloaderContext this controller belongs to
+            rate: Starting request rate, in requests per minute
+            min_rate: Rate never lowered below this
+            max_rate: Rate never raised above this (the account's request budget)
+            burst: Requests that may be made back-to-back after an idle period
+            increase: Requests per minute added after each minute without throttling
+            decrease: Factor applied to the rate when Instagram throttles
+            backoff: Seconds to pause after the first throttle; doubles while throttling continues
+            max_backoff: Longest pause after a throttle, in seconds
+            log_interval: Seconds between rate log lines (0 to disable)
+        """
+        super().__init__(context)
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.rate = max(self.min_rate, min(rate, max_rate))
+        self.burst = burst
+        self.increase = increase
+        self.decrease = decrease
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.log_interval = log_interval
+
+        self.requests = 0
+        self.requests_by_type = {}
+        self.backoffs = 0
+
+        self._lock = threading.Lock()
+        now = time.monotonic()
+        self._tokens = float(burst)
+        self._refilled_at = now
+        self._last_increase = now
+        self._last_log = now
+        self._consecutive_throttles = 0
+        self._recent = deque()
+
+        # "Please wait" responses raise a plain ConnectionException, which
+        # instaloader reports through context.error() before retrying. A 429
+        # with the same message is followed by handle_429(), so it isn't counted here
+        report_error = context.error
+
+        def error(msg, repeat_at_end=True):
+            if THROTTLE_MESSAGE_RE.search(msg) and not HTTP_429_RE.search(msg):
+                self.throttled()
+            report_error(msg, repeat_at_end=repeat_at_end)
+
+        context.error = error
+
+    def requests_per_minute(self):
+        """Number of requests made in the last 60 seconds."""
+        with self._lock:
+            self._expire(time.monotonic())
+            return len(self._recent)
+
+    def summary(self):
+        """One-line summary of the requests made so far."""
+        return (f"{self.requests} API requests, {self.backoffs} backoffs, "
+                f"final rate {self.rate:.1f} req/min")
+
+    def _expire(self, now):
+        while self._recent and self._recent[0] <= now - 60:
+            self._recent.popleft()
+
+    def _refill(self, now):
+        if now > self._refilled_at:
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate / 60)
+            self._refilled_at = now
+
+    def query_waittime(self, query_type, current_time, untracked_queries=False):
+        """Seconds until the token bucket allows another request."""
+        with self._lock:
+            self._refill(current_time)
+            wait = max(0.0, self._refilled_at - current_time)
+            if self._tokens < 1:
+                wait += (1 - self._tokens) * 60 / self.rate
+            return wait
+
+    def wait_before_query(self, query_type):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now - self._last_increase >= 60:
+                # A full minute without throttling: probe a slightly higher rate
+                self.rate = min(self.max_rate, self.rate + self.increase)
+                self._last_increase = now
+                self._consecutive_throttles = 0
+            # Reserve a token now (the balance may go negative) so concurrent
+            # callers queue up behind each other instead of all waking at once
+            self._tokens -= 1
+            wait = max(0.0, self._refilled_at - now)
+            if self._tokens < 0:
+                wait += -self._tokens * 60 / self.rate
+
+            self.requests += 1
+            self.requests_by_type[query_type] = self.requests_by_type.get(query_type, 0) + 1
+            self._recent.append(now + wait)
+            self._expire(now)
+            log_line = None
+            if self.log_interval and now - self._last_log >= self.log_interval:
+                self._last_log = now
+                log_line = (f"  Rate: {self.rate:.1f} req/min target, {len(self._recent)} requests "
+                            f"in the last minute, {self.backoffs} backoffs so far")
+
+        if log_line:
+            print(log_line)
+        if wait > 15:
+            print(f"  Waiting {round(wait)}s before the next Instagram request")
+        if wait > 0:
+            self.sleep(wait)
+
+    def handle_429(self, query_type):
+        # The retry goes through wait_before_query(), which sleeps out the backoff
+        self.throttled()
+
+    def throttled(self):
+        """Record a throttling response: cut the rate and pause before the next request."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._consecutive_throttles += 1
+            self.backoffs += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            pause = min(self.max_backoff, self.backoff * 2 ** (self._consecutive_throttles - 1))
+            # No tokens accrue during the pause
+            self._tokens = min(self._tokens, 0.0)
+            self._refilled_at = max(self._refilled_at, now + pause)
+            self._last_increase = self._refilled_at
+            rate = self.rate
+        print(f"  ⚠ Instagram is throttling requests — backing off {round(pause)}s, "
+              f"rate lowered to {rate:.1f} req/min")
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Per-phase metrics for scraper runs.
+
+A RunMetrics object collects wall time per pipeline phase (crawl, thumbnails,
+index, duplicates, sync), counters such as pages fetched, posts and bytes
+downloaded, gauges such as the size of the latest index, histograms such as per-post download latency, and errors. It is
+written as a JSON run report and, optionally, as a Prometheus textfile for
+node_exporter's textfile collector. With profiling enabled every phase also
+runs under cProfile and its stats are saved as <phase>.prof; a phase that
+starts while another one is being profiled (nested, or on another account's
+thread) isn't profiled separately, since only one profiler can be active.
+"""
+
+import cProfile
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 30, 60, 120)
+
+# Errors kept per run; later ones are only counted
+MAX_ERRORS = 100
+
+PROMETHEUS_PREFIX = "insta_scraper"
+
+# Held while a phase is profiled: Python 3.12+ allows one active profiler per process
+_profiling = threading.Lock()
+
+
+class Histogram:
+    """Cumulative-bucket histogram, as Prometheus expects."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "buckets": {str(bound): n for bound, n in zip(self.buckets, self.counts)},
+        }
+
+
+class RunMetrics:
+    def __init__(self, account=None, profile_dir=None):
+        """
+        Initialize the run metrics
+
+        Args:
+            account: Instagram username the run belongs to (None for account-independent work)
+            profile_dir: If set, run each phase under cProfile and save <phase>.prof here
+        """
+        self.account = account
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        self.started = datetime.now().isoformat(timespec='seconds')
+        self.phases = {}
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.errors = []
+        self.error_count = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        """Time a pipeline phase (and profile it when profiling is enabled)."""
+        profiler = None
+        if self.profile_dir and _profiling.acquire(blocking=False):
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiling tool (e.g. python -m cProfile) is already active
+                profiler = None
+                _profiling.release()
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.error(name, e)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler:
+                profiler.disable()
+                _profiling.release()
+                self.profile_dir.mkdir(parents=True, exist_ok=True)
+                prefix = f"{self.account}-" if self.account else ""
+                profile_file = self.profile_dir / f"{prefix}{name}.prof"
+                profiler.dump_stats(profile_file)
+                print(f"  Profile of {name} saved to {profile_file} (view with: python -m pstats {profile_file})")
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    def count(self, name, n=1):
+        """Add n to a counter."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def set(self, name, value):
+        """Set a gauge to its latest value, e.g. a size measured after each rebuild."""
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name, value):
+        """Record one observation in a histogram, e.g. a latency in seconds."""
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].observe(value)
+
+    def error(self, phase, error):
+        """Record an error raised or reported during a phase."""
+        with self._lock:
+            self.error_count += 1
+            if len(self.errors) < MAX_ERRORS:
+                self.errors.append({
+                    "phase": phase,
+                    "type": type(error).__name__ if isinstance(error, BaseException) else "error",
+                    "message": str(error),
+                    "time": datetime.now().isoformat(timespec='seconds'),
+                })
+
+    def report(self):
+        """Return the run report as a JSON-serializable dict."""
+        with self._lock:
+            crawl_seconds = self.phases.get("crawl")
+            downloaded = self.counters.get("posts_downloaded", 0)
+            return {
+                "account": self.account,
+                "started": self.started,
+                "finished": datetime.now().isoformat(timespec='seconds'),
+                "phases": {name: round(seconds, 3) for name, seconds in self.phases.items()},
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "postsPerSecond": round(downloaded / crawl_seconds, 3) if crawl_seconds else None,
+                "histograms": {name: h.to_dict() for name, h in self.histograms.items()},
+                "errorCount": self.error_count,
+                "errors": list(self.errors),
+            }
+
+    def write_report(self, path):
+        """Atomically write the JSON run report."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+
+def _labels(**labels):
+    pairs = [f'{key}="{value}"' for key, value in labels.items() if value is not None]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def write_prometheus(path, runs):
+    """
+    Atomically write the metrics of one or more runs as a Prometheus textfile.
+    Every sample carries an account label, so several accounts share one file.
+    """
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        if not samples:
+            return
+        lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} {kind}")
+        for suffix, labels, value in samples:
+            lines.append(f"{PROMETHEUS_PREFIX}_{name}{suffix}{labels} {value}")
+
+    now = time.time()
+    metric("last_run_timestamp_seconds", "gauge", "Unix time the run report was written",
+           [("", _labels(account=run.account), round(now)) for run in runs])
+    metric("phase_seconds", "gauge", "Wall time per pipeline phase of the last run",
+           [("", _labels(account=run.account, phase=phase), round(seconds, 3))
+            for run in runs for phase, seconds in sorted(run.phases.items())])
+    metric("errors", "gauge", "Errors during the last run",
+           [("", _labels(account=run.account), run.error_count) for run in runs])
+
+    counter_names = sorted({name for run in runs for name in run.counters})
+    for name in counter_names:
+        metric(re.sub(r'[^a-zA-Z0-9_]', '_', name), "gauge", f"{name.replace('_', ' ').capitalize()} in the last run",
+               [("", _labels(account=run.account), run.counters[name]) for run in runs if name in run.counters])
+
+    gauge_names = sorted({name for run in runs for name in run.gauges})
+    for name in gauge_names:
+        metric(re.sub(r'[^a-zA-Z0-9_]', '_', name), "gauge",
+               f"{name.replace('_', ' ').capitalize()} at the end of the last run",
+               [("", _labels(account=run.account), run.gauges[name]) for run in runs if name in run.gauges])
+
+    histogram_names = sorted({name for run in runs for name in run.histograms})
+    for name in histogram_names:
+        samples = []
+        for run in runs:
+            histogram = run.histograms.get(name)
+            if not histogram:
+                continue
+            for bound, n in zip(histogram.buckets, histogram.counts):
+                samples.append(("_bucket", _labels(account=run.account, le=bound), n))
+            samples.append(("_bucket", _labels(account=run.account, le="+Inf"), histogram.count))
+            samples.append(("_sum", _labels(account=run.account), round(histogram.sum, 3)))
+            samples.append(("_count", _labels(account=run.account), histogram.count))
+        metric(re.sub(r'[^a-zA-Z0-9_]', '_', name), "histogram", f"{name.replace('_', ' ').capitalize()} in the last run",
+               samples)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
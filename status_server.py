@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Local HTTP status endpoint for the scraper daemon (insta_scraper.py --daemon).
+
+  GET /status   The daemon's state as JSON: last poll, backlog, recent errors
+                and per-account details
+  GET /health   {"status": "ok"} with HTTP 200, or the problems found with
+                HTTP 503, for uptime checks and service managers
+
+The endpoint has no authentication, so it listens on localhost unless told
+otherwise.
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StatusServer:
+    def __init__(self, get_status, host="127.0.0.1", port=0):
+        """
+        Initialize the status server
+
+        Args:
+            get_status: Callable returning the status as a JSON-serializable dict;
+                its "healthy" and "problems" keys drive /health
+            host: Interface to listen on
+            port: Port to listen on (0 picks a free one)
+        """
+        self.get_status = get_status
+        handler = type("Handler", (_Handler,), {"status_server": self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+        self._thread = None
+
+    def start(self):
+        """Serve requests on a background thread."""
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self._thread.join()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    status_server = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body):
+        body = json.dumps(body, ensure_ascii=False, indent=2).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path not in ("", "/status", "/health"):
+            self._send(404, {"error": f"no {path}; try /status or /health"})
+            return
+        status = self.status_server.get_status()
+        if path == "/health":
+            if status.get("healthy"):
+                self._send(200, {"status": "ok"})
+            else:
+                self._send(503, {"status": "unhealthy", "problems": status.get("problems", [])})
+            return
+        self._send(200, status)